@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Benchmark compressed transfers between the client and the cloud node.
+
+A feed of hashed indicators is uploaded through add-indicators and downloaded
+again through get-indicators, once with compression and once without. Bytes
+on the wire and latency are recorded for both directions. The local emulator
+runs at loopback speed, so the transfer time over a slower link is estimated
+from the bytes on the wire as well.
+
+Usage::
+
+    $ python benchmarks/compression.py --size 100000 --link-mbps 20
+"""
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def generate_hashes(size):
+    """Build hashed indicators like a private submission would send."""
+    return [hashlib.md5(('indicator-%d.example.com' % idx).encode('utf-8'))
+            .hexdigest() for idx in range(size)]
+
+
+def transfer(step, client, func, link_mbps):
+    """Run a transfer and summarise the client's request metrics."""
+    client.metrics.reset()
+    start = clock()
+    func()
+    elapsed = clock() - start
+    counters = client.metrics.counters
+    wire = (counters.get('request.bytes_sent', 0) +
+            counters.get('request.bytes_received', 0))
+    return {'step': step, 'seconds': round(elapsed, 6),
+            'requests': counters.get('request.count', 0),
+            'bytes_sent': counters.get('request.bytes_sent', 0),
+            'bytes_received': counters.get('request.bytes_received', 0),
+            'link_seconds': round(elapsed + wire * 8.0 /
+                                  (link_mbps * 1000000), 6)}
+
+
+def run_mode(compressed, indicators, args):
+    """Upload and download the feed with compression on or off."""
+    from blockade.aws.emulator import NodeEmulator
+    from blockade.libs.indicators import IndicatorClient
+
+    emulator = NodeEmulator(latency=args.latency)
+    try:
+        url = emulator.start()
+        admin = emulator.add_admin('bench@localhost')
+        kwargs = dict()
+        if not compressed:
+            kwargs['compression_size'] = None
+        client = IndicatorClient(admin['email'], admin['api_key'],
+                                 server=url, **kwargs)
+        client.set_debug(False)
+        if not compressed:
+            client.headers['Accept-Encoding'] = 'identity'
+
+        def upload():
+            for batch in client.batcher.batches(indicators):
+                start = clock()
+                client._send_data('POST', 'admin', 'add-indicators',
+                                  {'indicators': batch, 'tags': list()})
+                client.batcher.record(clock() - start)
+
+        def download():
+            response = client._get('', 'get-indicators')
+            if response['indicatorCount'] != len(indicators):
+                raise Exception("Downloaded %d of %d indicators"
+                                % (response['indicatorCount'],
+                                   len(indicators)))
+
+        steps = [transfer('upload', client, upload, args.link_mbps),
+                 transfer('download', client, download, args.link_mbps)]
+    finally:
+        emulator.stop()
+    return {'compressed': compressed, 'steps': steps}
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description="Compressed transfer benchmark")
+    parser.add_argument('--size', type=int, default=100000,
+                        help='Indicators to transfer')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of latency added by the emulated node')
+    parser.add_argument('--link-mbps', type=float, default=20.0,
+                        help='Link speed used to estimate transfer times')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    indicators = generate_hashes(args.size)
+    results = {'benchmark': 'compression', 'time': int(time.time()),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': vars(args), 'runs': list()}
+    for compressed in (False, True):
+        run = run_mode(compressed, indicators, args)
+        results['runs'].append(run)
+        for step in run['steps']:
+            print("%-12s %-8s %12d bytes %9.3fs %9.3fs@%gMbps" % (
+                'gzip' if compressed else 'identity', step['step'],
+                step['bytes_sent'] + step['bytes_received'],
+                step['seconds'], step['link_seconds'], args.link_mbps))
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Benchmark how long the command line entry points take to import.
+
+Every entry point is imported in a fresh interpreter, several times, and the
+fastest and median wall times are kept. The heavy dependencies found in
+``sys.modules`` after the import are listed, so a module that starts pulling
+boto3 or requests at import time again shows up in the results.
+
+Usage::
+
+    $ python benchmarks/import_time.py --repeat 10 --output imports.json
+"""
+from __future__ import print_function
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['blockade.cli.client', 'blockade.cli.config',
+           'blockade.cli.aws_serverless']
+HEAVY = ['boto3', 'botocore', 'requests', 'tldextract', 'gevent',
+         'grequests']
+
+PROBE = """
+import json, sys, time
+clock = getattr(time, 'perf_counter', time.time)
+start = clock()
+__import__(%r)
+elapsed = clock() - start
+print(json.dumps({'seconds': elapsed,
+                  'loaded': sorted(x for x in %r if x in sys.modules)}))
+"""
+
+
+def probe(module):
+    """Import a module in a new interpreter and report what it loaded."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [x for x in [env.get('PYTHONPATH')] if x])
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE % (module, HEAVY)], env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def measure(module, repeat):
+    """Import a module several times and summarise the timings."""
+    runs = [probe(module) for _ in range(repeat)]
+    timings = sorted(x['seconds'] for x in runs)
+    return {'module': module, 'repeat': repeat,
+            'min_seconds': round(timings[0], 6),
+            'median_seconds': round(timings[len(timings) // 2], 6),
+            'heavy_modules': runs[-1]['loaded']}
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description="Import time benchmark")
+    parser.add_argument('--modules', nargs='+', default=MODULES,
+                        help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Imports per module')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    results = {'benchmark': 'import_time', 'time': int(time.time()),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': vars(args), 'runs': list()}
+    for module in args.modules:
+        run = measure(module, args.repeat)
+        results['runs'].append(run)
+        print("%-30s min %8.4fs median %8.4fs loads %s" % (
+            module, run['min_seconds'], run['median_seconds'],
+            ', '.join(run['heavy_modules']) or '-'))
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
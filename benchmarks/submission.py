@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""Benchmark each stage of the indicator submission pipeline.
+
+Synthetic feeds are pushed through the same steps as
+``IndicatorClient.add_indicators``: cleaning, whitelisting, hashing, cache
+pruning, batching and sending to a local emulated cloud node. Each stage is
+timed separately and the results are written as JSON so runs can be compared
+across releases.
+
+Usage::
+
+    $ python benchmarks/submission.py --sizes 10000 100000 --output out.json
+"""
+from __future__ import print_function
+
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def generate_feed(size, rng, whitelist):
+    """Build a synthetic feed with URLs, duplicates and whitelisted hits."""
+    feed = list()
+    for idx in range(size):
+        roll = rng.random()
+        if roll < 0.05 and whitelist:
+            feed.append('https://%s/' % rng.choice(whitelist))
+        elif roll < 0.15 and feed:
+            feed.append(rng.choice(feed))
+        else:
+            host = 'host%d.bad%d.%s' % (idx, rng.randint(0, 9999),
+                                        rng.choice(['com', 'net', 'org']))
+            feed.append('http://%s/path/%d.php' % (host, rng.randint(0, 99)))
+    return feed
+
+
+def setup_home(home, whitelist, cached):
+    """Write whitelist and cache files where the library expects them."""
+    config_path = os.path.join(home, '.config', 'blockade')
+    os.makedirs(config_path)
+    for name in ['alexa.txt', 'cisco.txt']:
+        with open(os.path.join(config_path, name), 'w') as handle:
+            handle.write('\n'.join(whitelist) + '\n')
+    with open(os.path.join(config_path, 'cache.txt'), 'w') as handle:
+        handle.write('\n'.join(cached) + '\n')
+
+
+class StageTimer(object):
+
+    """Record the duration and memory peak of each pipeline stage."""
+
+    def __init__(self, trace_memory=False):
+        """Setup the timer."""
+        self.trace_memory = trace_memory and tracemalloc is not None
+        self.stages = list()
+
+    def run(self, name, func, *args):
+        """Run a stage and record its statistics."""
+        if self.trace_memory:
+            tracemalloc.start()
+        start = clock()
+        result = func(*args)
+        elapsed = clock() - start
+        stage = {'stage': name, 'seconds': round(elapsed, 6)}
+        if self.trace_memory:
+            stage['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if args and hasattr(args[0], '__len__'):
+            stage['items_in'] = len(args[0])
+        if hasattr(result, '__len__'):
+            stage['items_out'] = len(result)
+        self.stages.append(stage)
+        return result
+
+
+def md5_digests(values):
+    """Hash values the way add_indicators does before pruning."""
+    from blockade.common.utils import digest_values
+    return digest_values(values, keep_hashed=True)['md5']
+
+
+def make_batches(values):
+    """Slice values into payloads with a batcher that gets no feedback."""
+    from blockade.common.batching import AdaptiveBatcher
+    return list(AdaptiveBatcher().batches(values))
+
+
+def send_batches(client, values, limit=None):
+    """Send values to the node the way add_indicators does.
+
+    Batches are sized by the client's adaptive batcher, which is fed the
+    latency of every round trip.
+    """
+    written = 0
+    for idx, batch in enumerate(client.batcher.batches(values)):
+        if limit is not None and idx >= limit:
+            break
+        start = clock()
+        response = client._send_data('POST', 'admin', 'add-indicators',
+                                     {'indicators': batch, 'tags': list()})
+        if not response.get('success'):
+            raise Exception("Batch rejected: %s" % response)
+        client.batcher.record(clock() - start)
+        written += response['writeCount']
+    return [None] * written
+
+
+def run_size(size, args):
+    """Benchmark the pipeline for a single feed size."""
+    from blockade.aws.emulator import NodeEmulator
+    from blockade.common.utils import (check_whitelist, clean_indicators,
+                                       hash_values, prune_cached)
+    from blockade.libs.indicators import IndicatorClient
+
+    rng = random.Random(args.seed)
+    whitelist = ['top%d.example%d.com' % (i, i % 97)
+                 for i in range(args.whitelist_size)]
+    feed = generate_feed(size, rng, whitelist)
+    cached = hash_values(clean_indicators(rng.sample(
+        feed, min(args.cache_size, len(feed)))))
+
+    home = tempfile.mkdtemp(prefix='blockade-bench-')
+    previous_home = os.environ.get('HOME')
+    os.environ['HOME'] = home
+    emulator = NodeEmulator()
+    try:
+        setup_home(home, whitelist, cached)
+        timer = StageTimer(trace_memory=args.trace_memory)
+        cleaned = timer.run('clean_indicators', clean_indicators, feed)
+        allowed = timer.run('check_whitelist', check_whitelist, cleaned)
+        hashed = timer.run('digest_values', md5_digests, allowed)
+        pruned = timer.run('prune_cached', prune_cached, allowed, hashed)
+        batches = timer.run('batching', make_batches, pruned)
+        if not args.skip_send:
+            url = emulator.start()
+            admin = emulator.add_admin('bench@localhost')
+            client = IndicatorClient(admin['email'], admin['api_key'],
+                                     server=url)
+            client.set_debug(False)
+            timer.run('send', send_batches, client, pruned, args.send_limit)
+    finally:
+        emulator.stop()
+        if previous_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = previous_home
+        shutil.rmtree(home)
+
+    total = sum(x['seconds'] for x in timer.stages)
+    return {'size': size, 'initial_batches': len(batches),
+            'total_seconds': round(total, 6), 'stages': timer.stages}
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = ArgumentParser(description="Indicator submission benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Feed sizes to benchmark')
+    parser.add_argument('--whitelist-size', type=int, default=10000,
+                        help='Domains in each synthetic whitelist')
+    parser.add_argument('--cache-size', type=int, default=10000,
+                        help='Feed entries pre-loaded into the cache')
+    parser.add_argument('--send-limit', type=int, default=None,
+                        help='Maximum batches sent to the emulated node')
+    parser.add_argument('--skip-send', action='store_true',
+                        help='Do not benchmark the network stage')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the memory peak of every stage '
+                             '(slows the stages down)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed for the synthetic feed')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    results = {'benchmark': 'submission', 'time': int(time.time()),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': vars(args), 'runs': list()}
+    for size in args.sizes:
+        run = run_size(size, args)
+        results['runs'].append(run)
+        for stage in run['stages']:
+            print("%9d %-18s %10.3fs" % (size, stage['stage'],
+                                         stage['seconds']))
+    if resource:
+        results['max_rss_kb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 """Abstraction over the Blockade.io admin API."""
 import json
-import requests
+import logging
+import time
 from blockade.config import Config
+from blockade.common.compression import MINIMUM_COMPRESSION_SIZE, compress
+from blockade.common.metrics import MetricsRecorder
+from blockade.common.retry import RetryPolicy
+from blockade.common.tracing import RequestTrace
 from blockade.common.utils import get_logger
 
 
@@ -12,10 +17,15 @@ class Client(object):
 
     DEFAULT_SERVER = 'api.blockade.io'
     TIMEOUT = 30
+    # POST endpoints that can safely be retried after an ambiguous failure.
+    IDEMPOTENT_ENDPOINTS = ()
+    # Statuses of a node that does not inflate gzipped request bodies.
+    COMPRESSION_REJECTED = (400, 415)
 
     def __init__(self, email, api_key, server=DEFAULT_SERVER,
                  http_proxy=None, https_proxy=None, verify=True, headers=None,
-                 debug=False):
+                 debug=False, metrics=None, hooks=None, retry=None,
+                 timeout=TIMEOUT, compression_size=MINIMUM_COMPRESSION_SIZE):
         """Initial loading of the client.
 
         :param str email: Email of the blockade user
@@ -23,8 +33,23 @@ class Client(object):
         :param str server: Hostname for the API
         :param str http_proxy: HTTP proxy to use (optional)
         :param str https_proxy: HTTPS proxy to use (optional)
+        :param metrics: Metrics sink receiving request and stage metrics
+                        (optional)
+        :param list hooks: RequestHook instances observing every request
+                           (optional)
+        :param retry: RetryPolicy for failed requests (optional)
+        :param float timeout: Seconds to wait for each request
+        :param int compression_size: Request bodies of at least this many
+                                     bytes are sent gzipped, None disables
+                                     compression. Nodes rejecting gzipped
+                                     bodies get them uncompressed instead.
         """
         self.logger = get_logger('blockade-request')
+        self.metrics = MetricsRecorder(metrics)
+        self.hooks = list(hooks or [])
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self.compression_size = compression_size
         if server.endswith('/'):
             server = server.rstrip('/')
         self.api_base = server
@@ -34,6 +59,7 @@ class Client(object):
         self.api_key = api_key
         self.headers = {
             'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
             'Content-Type': 'application/json',
         }
         self.proxies = {}
@@ -48,8 +74,11 @@ class Client(object):
             self.verify = False
 
     @classmethod
-    def from_config(cls):
-        """Method to return back a loaded instance."""
+    def from_config(cls, **kwargs):
+        """Method to return back a loaded instance.
+
+        :param kwargs: Additional arguments passed to the client
+        """
         config = Config()
         client = cls(
             email=config.get('email'),
@@ -57,9 +86,17 @@ class Client(object):
             server=config.get('api_server'),
             http_proxy=config.get('http_proxy'),
             https_proxy=config.get('https_proxy'),
+            **kwargs
         )
         return client
 
+    def add_hook(self, hook):
+        """Register a hook observing every request.
+
+        :param hook: RequestHook instance
+        """
+        self.hooks.append(hook)
+
     def set_debug(self, status):
         """Control the logging state."""
         if status:
@@ -119,17 +156,22 @@ class Client(object):
         """
         api_url = self._endpoint(endpoint, action, *url_args)
         kwargs = {'headers': self.headers, 'params': url_params,
-                  'timeout': Client.TIMEOUT, 'verify': self.verify}
+                  'timeout': self.timeout, 'verify': self.verify}
         if self.proxies:
             kwargs['proxies'] = self.proxies
-        self.logger.debug("Requesting: %s, %s" % (api_url, str(kwargs)))
-        response = requests.get(api_url, **kwargs)
+        label = self._label(endpoint, action, *url_args)
+        response = self._request('GET', api_url, label, 0, **kwargs)
         return self._json(response)
 
     def _send_data(self, method, endpoint, action,
                    data, *url_args, **url_params):
         """Submit to API Endpoint - for DELETE, PUT, POST methods.
 
+        Large bodies are gzipped, API Gateway inflates them before they
+        reach the Lambda. Nodes set up without compression reject them, the
+        body is then sent again uncompressed and compression is turned off
+        for the rest of the session.
+
         :param str method: Method to use for the request
         :param str endpoint: Endpoint
         :param str action: Endpoint Action
@@ -140,14 +182,124 @@ class Client(object):
         """
         api_url = self._endpoint(endpoint, action, *url_args)
         data.update({'email': self.email, 'api_key': self.api_key})
-        data = json.dumps(data)
+        data = json.dumps(data).encode('utf-8')
+        label = self._label(endpoint, action, *url_args)
         kwargs = {'headers': self.headers, 'params': url_params,
-                  'verify': self.verify, 'data': data}
+                  'timeout': self.timeout, 'verify': self.verify,
+                  'data': data}
         if self.proxies:
             kwargs['proxies'] = self.proxies
-        self.logger.debug("Requesting: %s %s, %s" % (method, api_url,
-                                                     str(kwargs)))
-        response = requests.request(method, api_url, **kwargs)
-        self.logger.debug("Response: %d, %s" % (response.status_code,
-                                                response.content))
+        if (self.compression_size is not None and
+                len(data) >= self.compression_size):
+            headers = dict(self.headers)
+            headers['Content-Encoding'] = 'gzip'
+            compressed = dict(kwargs, headers=headers, data=compress(data))
+            response = self._request(method, api_url, label,
+                                     len(compressed['data']), **compressed)
+            if response.status_code not in self.COMPRESSION_REJECTED:
+                return self._json(response)
+            self.logger.debug("Node rejected a gzipped body with status %d, "
+                              "sending uncompressed bodies from now on",
+                              response.status_code)
+            self.metrics.incr('request.compression_rejected')
+            self.compression_size = None
+        response = self._request(method, api_url, label, len(data), **kwargs)
         return self._json(response)
+
+    def _label(self, endpoint, action, *url_args):
+        """Return the endpoint path used to label traces and logs."""
+        return "/".join(x for x in (endpoint, action) + url_args if x)
+
+    def _request(self, method, api_url, label, size, **kwargs):
+        """Perform a request, retrying transient failures.
+
+        :param str method: Method to use for the request
+        :param str api_url: Full URL for the request
+        :param str label: Endpoint path, e.g. admin/add-indicators
+        :param int size: Size of the request body in bytes
+        :param kwargs: Arguments passed to requests
+        :return: Response from the server
+        """
+        import requests
+        idempotent = self.retry.is_idempotent(method, label,
+                                              self.IDEMPOTENT_ENDPOINTS)
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(method, api_url, label, size,
+                                         **kwargs)
+            except requests.exceptions.RequestException as e:
+                if not self.retry.retry_error(attempt, e, idempotent):
+                    raise
+                reason = e.__class__.__name__
+            else:
+                if not self.retry.retry_response(attempt, response,
+                                                 idempotent):
+                    return response
+                reason = "status %d" % response.status_code
+            delay = self.retry.delay(attempt)
+            self.logger.debug("Retrying %s %s after %s in %.2fs", method,
+                              label, reason, delay)
+            self.metrics.incr('request.retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def _attempt(self, method, api_url, label, size, **kwargs):
+        """Perform a single request, recording its metrics and running hooks.
+
+        The request body holds the API key, so only its size is logged.
+
+        :param str method: Method to use for the request
+        :param str api_url: Full URL for the request
+        :param str label: Endpoint path, e.g. admin/add-indicators
+        :param int size: Size of the request body in bytes
+        :param kwargs: Arguments passed to requests
+        :return: Response from the server
+        """
+        import requests
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug("Requesting: %s %s, %d bytes, params %s",
+                              method, api_url, size, kwargs.get('params'))
+        trace = None
+        if self.hooks:
+            trace = RequestTrace(method, label, size)
+            for hook in self.hooks:
+                hook.before_request(trace)
+        start = time.time()
+        response = None
+        try:
+            response = requests.request(method, api_url, **kwargs)
+        finally:
+            latency = time.time() - start
+            self.metrics.observe('request.latency', latency)
+            self.metrics.incr('request.count')
+            self.metrics.incr('request.bytes_sent', size)
+            received = None
+            if response is None:
+                self.metrics.incr('request.errors')
+            else:
+                received = self._received(response)
+                self.metrics.incr('request.bytes_received', received)
+                if response.status_code == 429:
+                    self.metrics.incr('request.throttled')
+            if trace:
+                trace.latency = latency
+                if response is not None:
+                    trace.status = response.status_code
+                    trace.bytes_received = received
+                for hook in self.hooks:
+                    hook.after_response(trace)
+        if debug:
+            self.logger.debug("Response: %d, %d bytes (%s) in %.3fs",
+                              response.status_code, received,
+                              response.headers.get('Content-Encoding',
+                                                   'identity'), latency)
+        return response
+
+    def _received(self, response):
+        """Size of a response body on the wire, before decompression."""
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit():
+            return int(length)
+        return len(response.content)
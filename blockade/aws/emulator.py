@@ -0,0 +1,677 @@
+"""Local stand-in for a Blockade cloud node.
+
+The emulator hosts the Lambda handlers from ``lambda-scripts`` behind a small
+WSGI server that routes requests the same way the API Gateway deployment does.
+DynamoDB tables and S3 buckets are replaced by in-memory fakes, so the full
+client pipeline can be exercised offline with configurable latency,
+throttling and compression.
+"""
+import bisect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import types
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from blockade.aws.packaging import SCRIPTS_PATH, SHARED_MODULES
+from blockade.common.compression import (accepted_encoding, compress,
+                                         decompress)
+from blockade.cli.aws_serverless import (API_COMPRESSION_SIZE,
+                                         API_GATEWAY_RESOURCES,
+                                         API_GATEWAY_RESOURCE_SCHEMA,
+                                         DYNAMODB_SCHEMAS, LAMBDA_SCHEMA)
+
+try:
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+except ImportError:
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+
+STAGE_NAME = 'prod'
+HTTP_STATUS = {200: '200 OK', 400: '400 Bad Request', 403: '403 Forbidden',
+               415: '415 Unsupported Media Type',
+               429: '429 Too Many Requests', 500: '500 Internal Server Error'}
+_LOAD_LOCK = threading.Lock()
+COMPARISONS = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b,
+               '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+               '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+EXISTS_FILTER = re.compile(
+    r'^(attribute_(?:not_)?exists)\(\s*([^\s()]+)\s*\)$')
+COMPARISON_FILTER = re.compile(r'^([^\s()<>=]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)$')
+FILTER_TOKEN = re.compile(r'attribute_(?:not_)?exists\(\s*[^\s()]+\s*\)|'
+                          r'[^\s()<>=]+\s*(?:<>|<=|>=|=|<|>)\s*:\w+|'
+                          r'\(|\)|\bAND\b|\bOR\b|\bNOT\b')
+
+
+def _parse_filter(tokens, pos):
+    """Parse an OR of ANDs of conditions, from tokens[pos]."""
+    def factor(pos):
+        if tokens[pos] == 'NOT':
+            node, pos = factor(pos + 1)
+            return ('NOT', node), pos
+        if tokens[pos] == '(':
+            node, pos = _parse_filter(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos] != ')':
+                raise ValueError("Unbalanced parentheses in filter")
+            return node, pos + 1
+        return ('COND', tokens[pos]), pos + 1
+
+    def term(pos):
+        node, pos = factor(pos)
+        while pos < len(tokens) and tokens[pos] == 'AND':
+            right, pos = factor(pos + 1)
+            node = ('AND', node, right)
+        return node, pos
+
+    node, pos = term(pos)
+    while pos < len(tokens) and tokens[pos] == 'OR':
+        right, pos = term(pos + 1)
+        node = ('OR', node, right)
+    return node, pos
+
+
+def _check_condition(condition, item, names, values):
+    match = EXISTS_FILTER.match(condition)
+    if match:
+        present = names.get(match.group(2), match.group(2)) in item
+        return present == (match.group(1) == 'attribute_exists')
+    match = COMPARISON_FILTER.match(condition)
+    if not match:
+        raise ValueError("Unsupported filter: %s" % condition)
+    name, operator, placeholder = match.groups()
+    name = names.get(name, name)
+    if name not in item:
+        return False
+    return COMPARISONS[operator](item[name], values[placeholder])
+
+
+def evaluate_filter(expression, item, names=None, values=None):
+    """Evaluate a DynamoDB filter expression against an item.
+
+    Only comparisons of an attribute with a placeholder, attribute_exists
+    and attribute_not_exists, combined with AND, OR, NOT and parentheses,
+    are understood.
+
+    :param str expression: FilterExpression string
+    :param dict item: Item to test
+    :param dict names: ExpressionAttributeNames
+    :param dict values: ExpressionAttributeValues
+    :return: Boolean
+    """
+    names = names or dict()
+    values = values or dict()
+    tokens = FILTER_TOKEN.findall(expression)
+    tree, pos = _parse_filter(tokens, 0)
+    if pos != len(tokens):
+        raise ValueError("Unsupported filter: %s" % expression)
+
+    def evaluate(node):
+        if node[0] == 'COND':
+            return _check_condition(node[1], item, names, values)
+        if node[0] == 'NOT':
+            return not evaluate(node[1])
+        if node[0] == 'AND':
+            return evaluate(node[1]) and evaluate(node[2])
+        return evaluate(node[1]) or evaluate(node[2])
+
+    return evaluate(tree)
+
+
+class FakeTable(object):
+
+    """In-memory DynamoDB table exposing the subset of the API we use."""
+
+    def __init__(self, name, key_schema):
+        """Setup the table.
+
+        :param str name: Table name
+        :param list key_schema: DynamoDB KeySchema for the table
+        """
+        self.name = name
+        self.key_names = [x['AttributeName'] for x in key_schema]
+        self.items = OrderedDict()
+        self.partitions = dict()
+        self.lock = threading.RLock()
+
+    def _key(self, item):
+        return tuple(item[x] for x in self.key_names)
+
+    def get_item(self, Key, **kwargs):
+        """Get a single item by its primary key."""
+        with self.lock:
+            item = self.items.get(self._key(Key))
+        if item is None:
+            return {}
+        return {'Item': dict(item)}
+
+    def put_item(self, Item, **kwargs):
+        """Store an item, replacing any item with the same key."""
+        key = self._key(Item)
+        with self.lock:
+            self.items[key] = dict(Item)
+            self.partitions.setdefault(key[0], OrderedDict())[key] = True
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        """Delete an item by its primary key."""
+        key = self._key(Key)
+        with self.lock:
+            self.items.pop(key, None)
+            partition = self.partitions.get(key[0], dict())
+            partition.pop(key, None)
+            if not partition:
+                self.partitions.pop(key[0], None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, **kwargs):
+        """Update an item in place, creating it if needed.
+
+        Only ADD and SET clauses with placeholder values are understood,
+        e.g. ``ADD hits :count SET lastSeen = :now``.
+        """
+        names = ExpressionAttributeNames or dict()
+        actions = re.findall(r'\b(ADD|SET)\s+(.+?)(?=\s+(?:ADD|SET)\s+|$)',
+                             UpdateExpression.strip())
+        key = self._key(Key)
+        with self.lock:
+            item = dict(self.items.get(key, Key))
+            for action, clauses in actions:
+                for clause in clauses.split(','):
+                    name, value = re.split(r'\s*=\s*|\s+', clause.strip(), 1)
+                    name = names.get(name, name)
+                    value = ExpressionAttributeValues[value]
+                    if action == 'ADD':
+                        value = item.get(name, 0) + value
+                    item[name] = value
+            self.items[key] = item
+            self.partitions.setdefault(key[0], OrderedDict())[key] = True
+        return {}
+
+    def scan(self, Limit=None, ExclusiveStartKey=None, FilterExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             Segment=None, TotalSegments=None, **kwargs):
+        """Scan the table, paginating with Limit and ExclusiveStartKey.
+
+        Items are read in key order, so a scan resumes correctly after its
+        last item was deleted. With TotalSegments, items are split between
+        segments by hash key. Like DynamoDB, the filter is applied after
+        Limit items were read.
+        """
+        with self.lock:
+            keys = sorted(self.items.keys())
+            if TotalSegments:
+                keys = [x for x in keys if zlib.crc32(
+                    repr(x[0]).encode('utf-8')) % TotalSegments == Segment]
+            start = 0
+            if ExclusiveStartKey:
+                start = bisect.bisect_right(keys,
+                                            self._key(ExclusiveStartKey))
+            end = len(keys)
+            if Limit:
+                end = min(end, start + Limit)
+            scanned = [dict(self.items[k]) for k in keys[start:end]]
+        items = scanned
+        if FilterExpression:
+            items = [x for x in scanned if evaluate_filter(
+                FilterExpression, x, ExpressionAttributeNames,
+                ExpressionAttributeValues)]
+        response = {'Items': items, 'Count': len(items),
+                    'ScannedCount': len(scanned)}
+        if end < len(keys):
+            last = scanned[-1]
+            response['LastEvaluatedKey'] = dict((x, last[x])
+                                                for x in self.key_names)
+        return response
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues,
+              ExpressionAttributeNames=None, Limit=None,
+              ExclusiveStartKey=None, FilterExpression=None, **kwargs):
+        """Query the items sharing a hash key, in range key order.
+
+        Only equality on the hash key is understood, e.g. ``#i = :value``.
+        Like DynamoDB, the filter is applied after Limit items were read.
+        """
+        match = re.match(r'^\s*(\S+)\s*=\s*(:\w+)\s*$',
+                         KeyConditionExpression)
+        if not match:
+            raise ValueError("Unsupported key condition: %s"
+                             % KeyConditionExpression)
+        name, placeholder = match.groups()
+        names = ExpressionAttributeNames or dict()
+        name = names.get(name, name)
+        if name != self.key_names[0]:
+            raise ValueError("Queries must use the hash key %s"
+                             % self.key_names[0])
+        value = ExpressionAttributeValues[placeholder]
+        with self.lock:
+            keys = sorted(self.partitions.get(value, dict()))
+            start = 0
+            if ExclusiveStartKey:
+                start = bisect.bisect_right(keys,
+                                            self._key(ExclusiveStartKey))
+            end = len(keys)
+            if Limit:
+                end = min(end, start + Limit)
+            scanned = [dict(self.items[x]) for x in keys[start:end]]
+        items = scanned
+        if FilterExpression:
+            items = [x for x in scanned if evaluate_filter(
+                FilterExpression, x, names, ExpressionAttributeValues)]
+        response = {'Items': items, 'Count': len(items),
+                    'ScannedCount': len(scanned)}
+        if end < len(keys):
+            last = scanned[-1]
+            response['LastEvaluatedKey'] = dict((x, last[x])
+                                                for x in self.key_names)
+        return response
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        """Return a context manager that writes straight to the table."""
+        return FakeBatchWriter(self)
+
+
+class FakeBatchWriter(object):
+
+    """Batch writer applying every operation immediately."""
+
+    def __init__(self, table):
+        """Setup the writer."""
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        """Store an item."""
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        """Delete an item."""
+        self.table.delete_item(Key=Key)
+
+
+class FakeBucket(object):
+
+    """In-memory S3 bucket."""
+
+    def __init__(self, name):
+        """Setup the bucket."""
+        self.name = name
+        self.objects = OrderedDict()
+        self.lock = threading.Lock()
+
+    def put_object(self, Key, Body=b'', **kwargs):
+        """Store an object, reading file-like bodies."""
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        with self.lock:
+            self.objects[Key] = Body
+        return {'Key': Key}
+
+    def delete_objects(self, Delete, **kwargs):
+        """Delete up to 1000 objects at once."""
+        if len(Delete['Objects']) > 1000:
+            raise ValueError("Can't delete more than 1000 objects at once")
+        deleted = list()
+        with self.lock:
+            for obj in Delete['Objects']:
+                self.objects.pop(obj['Key'], None)
+                deleted.append({'Key': obj['Key']})
+        if Delete.get('Quiet'):
+            return {}
+        return {'Deleted': deleted}
+
+
+class FakeResource(object):
+
+    """Stand-in for boto3 service resources."""
+
+    def __init__(self, store, service):
+        """Setup the resource for a service."""
+        self.store = store
+        self.service = service
+
+    def Table(self, name):
+        """Get a DynamoDB table."""
+        return self.store.table(name)
+
+    def Bucket(self, name):
+        """Get an S3 bucket."""
+        return self.store.bucket(name)
+
+
+class FakeStore(object):
+
+    """Container for every fake table and bucket of an emulated node."""
+
+    def __init__(self, schemas=DYNAMODB_SCHEMAS):
+        """Setup the store.
+
+        :param dict schemas: DynamoDB schemas keyed by table name
+        """
+        self.schemas = schemas
+        self.tables = dict()
+        self.buckets = dict()
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        """Get or create a table."""
+        with self.lock:
+            if name not in self.tables:
+                schema = self.schemas[name]['KeySchema']
+                self.tables[name] = FakeTable(name, schema)
+            return self.tables[name]
+
+    def bucket(self, name):
+        """Get or create a bucket."""
+        with self.lock:
+            if name not in self.buckets:
+                self.buckets[name] = FakeBucket(name)
+            return self.buckets[name]
+
+    def boto3(self):
+        """Build a module that replaces boto3 inside the handlers."""
+        store = self
+
+        class Session(object):
+            def resource(self, service, **kwargs):
+                return FakeResource(store, service)
+
+            def client(self, service, **kwargs):
+                return FakeResource(store, service)
+
+        module = types.ModuleType('boto3')
+        module.session = types.ModuleType('boto3.session')
+        module.session.Session = Session
+        module.resource = Session().resource
+        module.client = Session().client
+        return module
+
+
+class LambdaEnvironment(object):
+
+    """Stand-in for the os module exposing a per-function environment."""
+
+    def __init__(self, variables):
+        """Setup the environment."""
+        self.environ = dict(os.environ)
+        self.environ.update(variables)
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+
+def _load_source(name, path):
+    """Load a module from a file path."""
+    try:
+        from importlib.util import module_from_spec, spec_from_file_location
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler(label, store, scripts_path=SCRIPTS_PATH):
+    """Load a Lambda handler bound to the fake store.
+
+    Every function gets its own copy of the shared runtime modules and its
+    own environment, as it would inside Lambda.
+
+    :param str label: Lambda function name, e.g. Blockade-Get-Indicators
+    :param store: FakeStore the handler reads and writes
+    :param str scripts_path: Directory holding the Lambda scripts
+    :return: Loaded handler module
+    """
+    variables = LAMBDA_SCHEMA[label]['Environment']['Variables']
+    env = LambdaEnvironment(variables)
+    names = ['boto3'] + SHARED_MODULES
+    with _LOAD_LOCK:
+        saved = dict((x, sys.modules.get(x)) for x in names)
+        sys.modules['boto3'] = store.boto3()
+        try:
+            for name in SHARED_MODULES:
+                path = os.path.join(scripts_path, '%s.py' % name)
+                shared = _load_source(name, path)
+                shared.os = env
+                sys.modules[name] = shared
+            path = os.path.join(scripts_path, '%s.py' % label)
+            module = _load_source('emulated_%s' % label.replace('-', '_'),
+                                  path)
+            module.os = env
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = value
+    return module
+
+
+def render_template(template, body, params, source_ip):
+    """Apply an API Gateway request mapping template.
+
+    Only the variables used by the Blockade deployment are understood. An
+    empty template passes the request body through untouched.
+
+    :param str template: Mapping template
+    :param str body: Raw request body
+    :param dict params: Query string parameters
+    :param str source_ip: Address of the caller
+    :return: Event passed to the Lambda handler
+    """
+    if not template:
+        if not body:
+            return dict()
+        return json.loads(body)
+    rendered = template.replace("$input.json('$')", body or '{}')
+    rendered = rendered.replace('$context.identity.sourceIp', source_ip)
+    rendered = re.sub(r"\$input\.params\('([^']+)'\)",
+                      lambda m: params.get(m.group(1), ''), rendered)
+    return json.loads(rendered)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        if value % 1 == 0:
+            return int(value)
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(repr(value))
+
+
+class NodeEmulator(object):
+
+    """WSGI application emulating the Blockade API Gateway deployment."""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate=None, burst=None,
+                 store=None, compression_size=API_COMPRESSION_SIZE):
+        """Setup the emulator.
+
+        :param float latency: Seconds added to every request
+        :param float jitter: Maximum random seconds added on top of latency
+        :param float rate: Sustained requests per second before throttling
+        :param int burst: Requests allowed in a burst, defaults to the rate
+        :param store: FakeStore to use, a fresh one is created by default
+        :param int compression_size: Minimum size of compressed responses,
+                                     None disables compression like an API
+                                     without minimumCompressionSize
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.burst = burst or (int(rate) if rate else None)
+        self.tokens = self.burst
+        self.refilled = time.time()
+        self.throttle_lock = threading.Lock()
+        self.store = store or FakeStore()
+        self.compression_size = compression_size
+        self.routes = dict()
+        self.stats = {'requests': 0, 'throttled': 0}
+        for label in API_GATEWAY_RESOURCES:
+            schema = API_GATEWAY_RESOURCE_SCHEMA[label]
+            path = schema['resource']['path']
+            if schema['admin']:
+                path = 'admin/' + path
+            self.routes[path] = {'label': label,
+                                 'method': schema['resource']['method'],
+                                 'template': schema['request']['template'],
+                                 'module': load_handler(label, self.store)}
+        self.server = None
+        self.thread = None
+
+    def _throttled(self):
+        """Apply a token bucket in front of the handlers."""
+        if not self.rate:
+            return False
+        with self.throttle_lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self.refilled) * self.rate)
+            self.refilled = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+        return False
+
+    def invoke(self, method, path, body='', params=None, source_ip=''):
+        """Route a request to its handler the way API Gateway would.
+
+        :param str method: HTTP method
+        :param str path: Request path, with or without the stage prefix
+        :param str body: Raw request body
+        :param dict params: Query string parameters
+        :param str source_ip: Address of the caller
+        :return: Tuple of HTTP status and response object
+        """
+        self.stats['requests'] += 1
+        parts = [x for x in path.split('/') if x]
+        if parts and parts[0] == STAGE_NAME:
+            parts = parts[1:]
+        route = self.routes.get('/'.join(parts))
+        if not route or route['method'] != method:
+            return 403, {'message': 'Missing Authentication Token'}
+        if self._throttled():
+            self.stats['throttled'] += 1
+            return 429, {'message': 'Too Many Requests'}
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        try:
+            event = render_template(
+                route['template'].get('application/json', ''), body,
+                params or dict(), source_ip)
+        except ValueError:
+            return 400, {'message': 'Could not parse request body'}
+        try:
+            return 200, route['module'].lambda_handler(event, None)
+        except Exception as e:
+            return 200, {'errorMessage': str(e),
+                         'errorType': e.__class__.__name__,
+                         'stackTrace': traceback.format_exc().splitlines()}
+
+    def add_admin(self, email, name=''):
+        """Create an admin user the same way the node bootstrap does.
+
+        :param str email: Email of the admin
+        :param str name: Name of the admin
+        :return: User object including the generated API key
+        """
+        params = {'user_email': email, 'user_name': name,
+                  'user_role': 'admin'}
+        status, response = self.invoke('POST', 'admin/add-user',
+                                        json.dumps(params))
+        return response
+
+    def __call__(self, environ, start_response):
+        """Serve a WSGI request."""
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length) if length else b''
+        params = dict((k, v[0]) for k, v in
+                      parse_qs(environ.get('QUERY_STRING', '')).items())
+        encoding = environ.get('HTTP_CONTENT_ENCODING', 'identity')
+        try:
+            if self.compression_size is None and encoding != 'identity':
+                raise ValueError("Compression is not enabled")
+            body = decompress(body, encoding).decode('utf-8')
+        except (ValueError, zlib.error):
+            status, response = 415, {'message': 'Unsupported Media Type'}
+        else:
+            status, response = self.invoke(
+                environ['REQUEST_METHOD'], environ.get('PATH_INFO', '/'),
+                body, params, environ.get('REMOTE_ADDR', ''))
+        data = json.dumps(response, default=_json_default).encode('utf-8')
+        headers = [('Content-Type', 'application/json')]
+        encoding = accepted_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if (encoding and self.compression_size is not None and
+                len(data) >= self.compression_size):
+            data = compress(data, encoding)
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(len(data))))
+        status_line = HTTP_STATUS.get(status, '%d Error' % status)
+        start_response(status_line, headers)
+        return [data]
+
+    @property
+    def url(self):
+        """Base URL of the running emulator, ready for the client config."""
+        if not self.server:
+            return None
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d/%s/" % (host, port, STAGE_NAME)
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve the emulator from a background thread.
+
+        :param str host: Interface to bind
+        :param int port: Port to bind, 0 picks a free port
+        :return: Base URL of the emulated node
+        """
+        self.server = make_server(host, port, self,
+                                  server_class=ThreadingWSGIServer,
+                                  handler_class=QuietRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop a server started with start()."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+        self.server, self.thread = None, None
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+
+    """WSGI server handling every request in its own thread."""
+
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    """Request handler that does not log every request to stderr."""
+
+    def log_message(self, format, *args):
+        pass
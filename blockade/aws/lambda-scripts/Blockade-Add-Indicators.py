@@ -4,6 +4,10 @@ import datetime
 import hashlib
 import os
 import logging
+from blockade_runtime import clamp_ttl, expires_at
+
+MAX_TAGS = 20
+MAX_TAG_LENGTH = 64
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -28,15 +32,59 @@ def check_role(user):
     return True
 
 
+def clean_tags(tags):
+    """Normalise the tags of a submission.
+
+    :param tags: List of tags, or a comma-separated string
+    :return: Sorted list of distinct lowercase tags
+    """
+    if hasattr(tags, 'split'):
+        tags = tags.split(',')
+    cleaned = set()
+    for tag in tags or list():
+        if not hasattr(tag, 'strip'):
+            raise ValueError("Tags must be strings")
+        tag = tag.strip().lower()
+        if tag:
+            cleaned.add(tag)
+    if len(cleaned) > MAX_TAGS:
+        raise ValueError("Too many tags, send at most {}".format(MAX_TAGS))
+    if any(len(x) > MAX_TAG_LENGTH for x in cleaned):
+        msg = "Tags must be at most {} characters".format(MAX_TAG_LENGTH)
+        raise ValueError(msg)
+    return sorted(cleaned)
+
+
+def flush_cache():
+    """Drop the responses cached by the API stage, if it caches any."""
+    rest_api_id = os.environ.get('rest_api_id')
+    if not rest_api_id:
+        return False
+    try:
+        boto3.client('apigateway').flush_stage_cache(
+            restApiId=rest_api_id, stageName=os.environ.get('stage', 'prod'))
+    except Exception as e:
+        logger.error(str(e))
+        return False
+    return True
+
+
 def lambda_handler(event, context):
-    """Main handler."""
+    """Main handler.
+
+    The stage cache is flushed after every write, unless deferFlush is set.
+    Clients sending many batches defer it and, when the response says a
+    flush is pending, send a single flushCache request without indicators
+    once they are done.
+    """
     email = event.get('email', None)
     api_key = event.get('api_key', None)
     if not (api_key or email):
         msg = "Missing authentication parameters in your request"
         return {'success': False, 'message': msg}
     indicators = list(set(event.get('indicators', list())))
-    if len(indicators) == 0:
+    flush_only = bool(event.get('flushCache')) and len(indicators) == 0
+    if len(indicators) == 0 and not flush_only:
         return {'success': False, 'message': "No indicators sent in"}
     user = check_api_key(email, api_key)
     if not user:
@@ -44,20 +92,59 @@ def lambda_handler(event, context):
     role = check_role(user)
     if not role:
         return {'success': False, 'message': "Account not approved to contribute."}
+    if flush_only:
+        flushed = flush_cache()
+        return {'success': True, 'flushed': flushed, 'writeCount': 0,
+                'message': "Flushed the stage cache" if flushed else
+                "No stage cache to flush"}
+    expires = expires_at(clamp_ttl(event.get('ttlDays')))
+    try:
+        tags = clean_tags(event.get('tags'))
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     table = boto3.resource("dynamodb").Table(os.environ['database'])
+    written = list()
     with table.batch_writer(overwrite_by_pkeys=['indicator']) as batch:
         for item in indicators:
             if item == "":
                 continue
             if len(item) != 32:
-                item = hashlib.md5(item).hexdigest()
+                item = hashlib.md5(item.encode('utf-8')).hexdigest()
+            record = {'indicator': item, 'creator': user.get('email'),
+                      'datetime': current_time}
+            if tags:
+                record['tags'] = tags
+            if expires:
+                record['expires'] = expires
             try:
-                batch.put_item(Item={'indicator': item,
-                                     'creator': user.get('email'),
-                                     'datetime': current_time})
+                batch.put_item(Item=record)
+                written.append(item)
             except Exception as e:
                 logger.error(str(e))
 
+    if tags:
+        # Inverted index, so get-indicators can list a tag without a scan
+        index = boto3.resource("dynamodb").Table(os.environ['tags'])
+        with index.batch_writer(overwrite_by_pkeys=['tag', 'indicator']) \
+                as batch:
+            for tag in tags:
+                for item in written:
+                    entry = {'tag': tag, 'indicator': item,
+                             'creator': user.get('email'),
+                             'datetime': current_time}
+                    if expires:
+                        entry['expires'] = expires
+                    batch.put_item(Item=entry)
+
     msg = "Wrote {} indicators".format(len(indicators))
-    return {'success': True, 'message': msg, 'writeCount': len(indicators)}
+    output = {'success': True, 'message': msg, 'writeCount': len(indicators)}
+    if expires:
+        output['expires'] = expires
+    if written:
+        if not event.get('deferFlush'):
+            # Consumers polling get-indicators must see the new indicators
+            flush_cache()
+        elif os.environ.get('rest_api_id'):
+            output['flushPending'] = True
+    return output
@@ -1,35 +1,22 @@
 """Get indicators from the DynamoDB instance."""
-import boto3
+import blockade_runtime
 import hashlib
-import os
 import random
+from blockade_runtime import get_table
 
 
 def check_auth(args, role=None):
-    """Check the user authentication."""
-    users = boto3.resource("dynamodb").Table(os.environ['people'])
-    response = users.scan()
+    """Check the user authentication, allowing the first user through."""
+    users = get_table('people')
+    response = users.scan(Limit=1)
     if response['Count'] == 0:
         return {'success': True, 'message': None, 'init': True}
-    if not (args.get('email', None) and args.get('api_key', None)):
-        mesg = "Invalid request: `email` and `api_key` are required"
-        return {'success': False, 'message': mesg}
-    user = users.get_item(Key={'email': args.get('email')})
-    if 'Item' not in user:
-        return {'success': False, 'message': 'User does not exist.'}
-    user = user['Item']
-    if user['api_key'] != args['api_key']:
-        return {'success': False, 'message': 'API key was invalid.'}
-    if role:
-        if user['role'] not in role:
-            mesg = 'User is not authorized to make this change.'
-            return {'success': False, 'message': mesg}
-    return {'success': True, 'message': None, 'user': user}
+    return blockade_runtime.check_auth(args, role=role)
 
 
 def lambda_handler(event, context):
     """Main handler."""
-    users = boto3.resource("dynamodb").Table(os.environ['people'])
+    users = get_table('people')
     auth = check_auth(event, role=["admin"])
     if not auth['success']:
         return auth
@@ -44,7 +31,7 @@ def lambda_handler(event, context):
     user_name = event.get('user_name', '')
     seed = random.randint(100000000, 999999999)
     hash_key = "{}{}".format(user_email, seed)
-    api_key = hashlib.sha256(hash_key).hexdigest()
+    api_key = hashlib.sha256(hash_key.encode('utf-8')).hexdigest()
     if auth.get('init', False):
         user_role = 'admin'
     else:
@@ -53,5 +40,3 @@ def lambda_handler(event, context):
            'role': user_role}
     response = users.put_item(Item=obj)
     return obj
-
-
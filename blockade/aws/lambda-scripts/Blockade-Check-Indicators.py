@@ -0,0 +1,81 @@
+"""Check which indicators are already stored in the DynamoDB instance."""
+import boto3
+import hashlib
+import os
+import threading
+import time
+from blockade_runtime import check_auth
+
+MAX_INDICATORS = 1000
+WORKERS = 16
+
+
+def is_stored(table, value, now):
+    """Whether any creator stored an indicator that did not expire.
+
+    The table is keyed by indicator and creator, so the query reads one
+    item of the hash key at a time and stops at the first one alive. Items
+    whose TTL passed are skipped, so they are sent again and renewed.
+    """
+    kwargs = {'KeyConditionExpression': '#i = :value',
+              'ExpressionAttributeNames': {'#i': 'indicator'},
+              'ExpressionAttributeValues': {':value': value},
+              'ProjectionExpression': '#i, expires',
+              'Limit': 1}
+    while True:
+        result = table.query(**kwargs)
+        if any(x.get('expires', now + 1) > now
+               for x in result.get('Items', list())):
+            return True
+        if not result.get('LastEvaluatedKey'):
+            return False
+        kwargs['ExclusiveStartKey'] = result['LastEvaluatedKey']
+
+
+def find_existing(values, found, errors, lock):
+    """Query the table for each value, collecting those that are stored."""
+    try:
+        session = boto3.session.Session()
+        table = session.resource("dynamodb").Table(os.environ['database'])
+        now = time.time()
+        for value in values:
+            if is_stored(table, value, now):
+                with lock:
+                    found.append(value)
+    except Exception as e:
+        with lock:
+            errors.append(str(e))
+
+
+def lambda_handler(event, context):
+    """Main handler."""
+    auth = check_auth(event, role=["admin", "researcher"])
+    if not auth['success']:
+        return auth
+    indicators = list()
+    for item in set(event.get('indicators', list())):
+        if item == "":
+            continue
+        if len(item) != 32:
+            item = hashlib.md5(item.encode('utf-8')).hexdigest()
+        indicators.append(item)
+    if len(indicators) == 0:
+        return {'success': False, 'message': "No indicators sent in"}
+    if len(indicators) > MAX_INDICATORS:
+        msg = "Too many indicators, send at most {}".format(MAX_INDICATORS)
+        return {'success': False, 'message': msg}
+
+    found, errors, lock = list(), list(), threading.Lock()
+    threads = list()
+    for idx in range(min(WORKERS, len(indicators))):
+        thread = threading.Thread(target=find_existing,
+                                  args=(indicators[idx::WORKERS], found,
+                                        errors, lock))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        return {'success': False, 'message': errors[0]}
+    return {'success': True, 'existing': found, 'existingCount': len(found),
+            'checkedCount': len(indicators)}
@@ -0,0 +1,125 @@
+"""Delete the events stored in the DynamoDB instance and S3."""
+import boto3
+import os
+import threading
+import time
+from blockade_runtime import check_auth, decode_key, encode_key, object_key
+
+DEFAULT_SEGMENTS = 8
+MAX_SEGMENTS = 32
+PAGE_SIZE = 500
+# API Gateway gives up on an integration after 29 seconds, so each call
+# stops scanning after this long and hands back a continuation token.
+TIME_BUDGET = 20
+S3_BATCH = 1000
+DONE = 'done'
+KEY_NAMES = ['indicatorMatch', 'event']
+
+
+def delete_objects(bucket, keys):
+    """Delete S3 objects, 1000 per request."""
+    errors = 0
+    for idx in range(0, len(keys), S3_BATCH):
+        batch = [{'Key': x} for x in keys[idx:idx + S3_BATCH]]
+        response = bucket.delete_objects(Delete={'Objects': batch,
+                                                 'Quiet': True})
+        errors += len(response.get('Errors', list()))
+    return errors
+
+
+def flush_segment(segment, state, deadline, with_objects, totals, lock):
+    """Delete the events of one scan segment until it ends or time is up.
+
+    Every worker uses its own session, boto3 resources are not thread-safe.
+    """
+    session = boto3.session.Session()
+    table = session.resource("dynamodb").Table(os.environ['database'])
+    bucket = session.resource('s3').Bucket(os.environ['s3_bucket'])
+    kwargs = {'Segment': segment, 'TotalSegments': len(state['segments']),
+              'Limit': PAGE_SIZE, 'ProjectionExpression': '#i, #e',
+              'ExpressionAttributeNames': {'#i': 'indicatorMatch',
+                                           '#e': 'event'}}
+    if with_objects:
+        kwargs['ProjectionExpression'] += (', sourceIp, analysisTime, '
+                                           'metadata.#t, metadata.#m')
+        kwargs['ExpressionAttributeNames'].update({'#t': 'type',
+                                                   '#m': 'method'})
+    start = state['segments'][segment]
+    try:
+        while time.time() < deadline:
+            if start:
+                kwargs['ExclusiveStartKey'] = start
+            results = table.scan(**kwargs)
+            items = results.get('Items', list())
+            with table.batch_writer() as batch:
+                for item in items:
+                    batch.delete_item(Key=dict((x, item[x])
+                                               for x in KEY_NAMES))
+            errors = 0
+            if with_objects and items:
+                errors = delete_objects(bucket, [object_key(x)
+                                                 for x in items])
+            with lock:
+                totals['deleted'] += len(items)
+                if with_objects:
+                    totals['objectsDeleted'] += len(items) - errors
+                    totals['objectErrors'] += errors
+            start = results.get('LastEvaluatedKey')
+            if not start:
+                start = DONE
+                break
+    except Exception as e:
+        with lock:
+            totals['errors'].append(str(e))
+    state['segments'][segment] = start
+
+
+def lambda_handler(event, context):
+    """Main handler.
+
+    Segments of the table are scanned and deleted in parallel. When the
+    time budget runs out, the response holds a continuation token to send
+    back to carry on where every segment stopped.
+    """
+    auth = check_auth(event, role=["admin"])
+    if not auth['success']:
+        return auth
+    try:
+        state = decode_key(event.get('continuation'))
+        segments = int(event.get('segments') or DEFAULT_SEGMENTS)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': "Invalid continuation token"}
+    if not state:
+        segments = max(1, min(segments, MAX_SEGMENTS))
+        state = {'segments': [None] * segments}
+    with_objects = bool(event.get('deleteObjects', False))
+    deadline = time.time() + TIME_BUDGET
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() / 1000.0 - 5
+        deadline = min(deadline, time.time() + remaining)
+
+    totals = {'deleted': 0, 'objectsDeleted': 0, 'objectErrors': 0,
+              'errors': list()}
+    lock = threading.Lock()
+    threads = list()
+    for segment, start in enumerate(state['segments']):
+        if start == DONE:
+            continue
+        thread = threading.Thread(target=flush_segment,
+                                  args=(segment, state, deadline,
+                                        with_objects, totals, lock))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    output = {'success': not totals['errors'], 'deleted': totals['deleted'],
+              'done': all(x == DONE for x in state['segments'])}
+    if with_objects:
+        output['objectsDeleted'] = totals['objectsDeleted']
+        output['objectErrors'] = totals['objectErrors']
+    if totals['errors']:
+        output['message'] = totals['errors'][0]
+    if not output['done']:
+        output['continuation'] = encode_key(state)
+    return output
@@ -0,0 +1,92 @@
+"""Get event counters from the DynamoDB instance."""
+import boto3
+import datetime
+import os
+import threading
+from blockade_runtime import STATS_DAYS, check_auth, plain, stat_key
+from collections import Counter
+
+DIMENSIONS = ['indicator', 'ip', 'method', 'day', 'hour']
+MAX_DAYS = STATS_DAYS
+WORKERS = 16
+
+
+def read_counters(table, stat, counts):
+    """Add the counters stored under a hash key to counts."""
+    kwargs = {'KeyConditionExpression': '#s = :stat',
+              'ExpressionAttributeNames': {'#s': 'stat', '#g': 'group'},
+              'ExpressionAttributeValues': {':stat': stat},
+              'ProjectionExpression': '#g, hits'}
+    while True:
+        results = table.query(**kwargs)
+        for item in results.get('Items', list()):
+            counts[item['group']] += plain(item.get('hits', 0))
+        if not results.get('LastEvaluatedKey'):
+            break
+        kwargs['ExclusiveStartKey'] = results['LastEvaluatedKey']
+
+
+def read_days(stats, counts, errors, lock):
+    """Sum the counters of several days into counts.
+
+    Every worker uses its own session, boto3 resources are not thread-safe.
+    """
+    try:
+        session = boto3.session.Session()
+        table = session.resource("dynamodb").Table(os.environ['database'])
+        partial = Counter()
+        for stat in stats:
+            read_counters(table, stat, partial)
+        with lock:
+            counts.update(partial)
+    except Exception as e:
+        with lock:
+            errors.append(str(e))
+
+
+def lambda_handler(event, context):
+    """Main handler.
+
+    Sums the counters of a dimension over the last days, reading one item
+    per group and day instead of every event. The days are read in
+    parallel.
+    """
+    auth = check_auth(event, role=["admin"])
+    if not auth['success']:
+        return auth
+    dimension = event.get('dimension') or 'indicator'
+    if dimension not in DIMENSIONS:
+        msg = "Invalid dimension, use one of {}".format(', '.join(DIMENSIONS))
+        return {'success': False, 'message': msg}
+    try:
+        days = int(event.get('days') or 7)
+        top = int(event.get('top') or 0)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': "Invalid days or top"}
+    if not 0 < days <= MAX_DAYS:
+        msg = "Days must be between 1 and {}".format(MAX_DAYS)
+        return {'success': False, 'message': msg}
+
+    today = datetime.datetime.utcnow().date()
+    stats = [stat_key(dimension,
+                      (today - datetime.timedelta(days=x)).isoformat())
+             for x in range(days)]
+    counts, errors, lock = Counter(), list(), threading.Lock()
+    threads = list()
+    for idx in range(min(WORKERS, len(stats))):
+        thread = threading.Thread(target=read_days,
+                                  args=(stats[idx::WORKERS], counts, errors,
+                                        lock))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        return {'success': False, 'message': errors[0]}
+    groups = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+    if top > 0:
+        groups = groups[:top]
+    return {'success': True, 'dimension': dimension, 'days': days,
+            'since': (today - datetime.timedelta(days=days - 1)).isoformat(),
+            'stats': [{'group': k, 'hits': v} for k, v in groups],
+            'groupCount': len(counts), 'hits': sum(counts.values())}
@@ -1,37 +1,43 @@
 """Get events from the DynamoDB instance."""
-import boto3
-import os
-
-
-def check_auth(args, role=None):
-    """Check the user authentication."""
-    users = boto3.resource("dynamodb").Table(os.environ['people'])
-    if not (args.get('email', None) and args.get('api_key', None)):
-        mesg = "Invalid request: `email` and `api_key` are required"
-        return {'success': False, 'message': mesg}
-    user = users.get_item(Key={'email': args.get('email')})
-    if 'Item' not in user:
-        return {'success': False, 'message': 'User does not exist.'}
-    user = user['Item']
-    if user['api_key'] != args['api_key']:
-        return {'success': False, 'message': 'API key was invalid.'}
-    if role:
-        if user['role'] not in role:
-            mesg = 'User is not authorized to make this change.'
-            return {'success': False, 'message': mesg}
-    return {'success': True, 'message': None, 'user': user}
+from blockade_runtime import (check_auth, decode_key, encode_key, get_table,
+                              live_filter, plain)
 
 
 def lambda_handler(event, context):
-    """Main handler."""
+    """Main handler.
+
+    Returns one page of the table. When more events are left, the response
+    holds a lastKey to send back for the next page. With since, only events
+    stored after that time are returned, along with events from older
+    releases that were stored without a time.
+    """
     auth = check_auth(event, role=["admin"])
     if not auth['success']:
         return auth
 
-    table = boto3.resource("dynamodb").Table(os.environ['database'])
-    results = table.scan()
+    table = get_table('database')
+    expression, values = live_filter()
+    kwargs = {'FilterExpression': expression,
+              'ExpressionAttributeValues': values}
+    try:
+        limit = int(event.get('limit') or 0)
+        start = decode_key(event.get('lastKey'))
+        since = int(event.get('since') or 0)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': "Invalid pagination parameters"}
+    if limit > 0:
+        kwargs['Limit'] = limit
+    if start:
+        kwargs['ExclusiveStartKey'] = start
+    if since > 0:
+        kwargs['FilterExpression'] += (' AND (attribute_not_exists(storedAt)'
+                                       ' OR storedAt > :since)')
+        kwargs['ExpressionAttributeValues'][':since'] = since
+    results = table.scan(**kwargs)
     output = {'success': True, 'events': list(), 'eventsCount': 0}
     for item in results.get('Items', list()):
-        output['events'].append(item)
+        output['events'].append(plain(item))
     output['eventsCount'] = len(output['events'])
+    if results.get('LastEvaluatedKey'):
+        output['lastKey'] = encode_key(results['LastEvaluatedKey'])
     return output
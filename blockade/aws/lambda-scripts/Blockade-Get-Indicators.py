@@ -1,12 +1,39 @@
 """Get indicators from the DynamoDB instance."""
-import boto3
-import os
+import time
+
+from blockade_runtime import decode_key, encode_key, get_table, live_filter
 
 
 def lambda_handler(event, context):
-    """Main handler."""
-    table = boto3.resource("dynamodb").Table(os.environ['database'])
-    results = table.scan()
+    """Main handler.
+
+    Returns one page of the table. When more indicators are left, the
+    response holds a lastKey to send back for the next page. With a tag,
+    the page comes from the tag index instead of a scan of every indicator.
+    With until, only the indicators still kept at that time are returned.
+    """
+    tag = (event.get('tag') or '').strip().lower()
+    try:
+        limit = int(event.get('limit') or 0)
+        start = decode_key(event.get('lastKey'))
+        until = int(event.get('until') or 0)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': "Invalid pagination parameters"}
+    expression, values = live_filter(max(until, int(time.time())))
+    kwargs = {'ProjectionExpression': 'indicator',
+              'FilterExpression': expression,
+              'ExpressionAttributeValues': values}
+    if limit > 0:
+        kwargs['Limit'] = limit
+    if start:
+        kwargs['ExclusiveStartKey'] = start
+    if tag:
+        values[':tag'] = tag
+        kwargs['KeyConditionExpression'] = '#t = :tag'
+        kwargs['ExpressionAttributeNames'] = {'#t': 'tag'}
+        results = get_table('tags').query(**kwargs)
+    else:
+        results = get_table('database').scan(**kwargs)
     output = {'success': True, 'indicators': list(), 'indicatorCount': 0}
     for item in results.get('Items', list()):
         indicator = item.get('indicator', None)
@@ -15,4 +42,6 @@ def lambda_handler(event, context):
         output['indicators'].append(indicator)
     output['indicators'] = list(set(output['indicators']))
     output['indicatorCount'] = len(output['indicators'])
+    if results.get('LastEvaluatedKey'):
+        output['lastKey'] = encode_key(results['LastEvaluatedKey'])
     return output
@@ -4,6 +4,10 @@ import json
 import hashlib
 import logging
 import os
+import time
+from blockade_runtime import (STATS_DAYS, clamp_ttl, expires_at, object_key,
+                              stat_key)
+from collections import Counter
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,24 +21,54 @@ def convert_keys_to_string(dictionary):
         for k, v in dictionary.items())
 
 
-def process_events(events, source_ip):
+def count_event(counts, event):
+    """Count an event in every dimension of its day."""
+    stored = time.gmtime(event['storedAt'])
+    day = time.strftime('%Y-%m-%d', stored)
+    groups = {'indicator': event['indicatorMatch'],
+              'ip': event['sourceIp'],
+              'method': event['metadata']['method'].lower(),
+              'day': day, 'hour': time.strftime('%H', stored)}
+    for dimension, group in groups.items():
+        if group:
+            counts[(stat_key(dimension, day), group)] += 1
+
+
+def update_stats(counts):
+    """Add the counts of a request to the counters, one update per group.
+
+    ADD is applied atomically by DynamoDB, so concurrent requests never
+    lose an increment. Counters expire once they can no longer be read.
+    """
+    table = boto3.resource("dynamodb").Table(os.environ['stats'])
+    expires = expires_at(STATS_DAYS + 1)
+    for (stat, group), count in counts.items():
+        table.update_item(
+            Key={'stat': stat, 'group': group},
+            UpdateExpression='ADD hits :count SET expires = :expires',
+            ExpressionAttributeValues={':count': count,
+                                       ':expires': expires}
+        )
+
+
+def process_events(events, source_ip, ttl_days=None):
     """Process all the events for logging and S3."""
     s3 = boto3.resource('s3')
     table = boto3.resource("dynamodb").Table(os.environ['database'])
+    counts = Counter()
+    expires = expires_at(clamp_ttl(ttl_days))
     with table.batch_writer() as batch:
         for idx, event in enumerate(events):
             event = convert_keys_to_string(event)
             event['sourceIp'] = source_ip
-            event['event'] = hashlib.sha256(str(event)).hexdigest()
-            metadata = event['metadata']
+            digest = hashlib.sha256(str(event).encode('utf-8'))
+            event['event'] = digest.hexdigest()
+            event['storedAt'] = int(time.time())
+            if expires:
+                event['expires'] = expires
             timestamp = str(event['metadata']['timeStamp'])
             event['metadata']['timeStamp'] = timestamp
-            kwargs = {'match': event['indicatorMatch'],
-                      'type': metadata['type'],
-                      'method': metadata['method'].lower(),
-                      'time': event['analysisTime'], 'ip': source_ip}
-            file_struct = '{match}_{type}_{method}_{ip}_{time}.json'
-            file_name = file_struct.format(**kwargs)
+            file_name = object_key(event)
             key_path = '/tmp/%s' % file_name
             output = json.dumps(event, indent=4, sort_keys=True)
             open(key_path, "w").write(output)
@@ -43,6 +77,8 @@ def process_events(events, source_ip):
                                                           Body=data)
             logger.info("EVENT: %s" % str(event))
             batch.put_item(Item=event)
+            count_event(counts, event)
+    update_stats(counts)
     return True
 
 
@@ -53,6 +89,6 @@ def lambda_handler(event, context):
     source_ip = str(event.get('source_ip', ''))
     if len(events) == 0:
         return {'success': False, 'message': "No events sent in"}
-    status = process_events(events, source_ip)
+    status = process_events(events, source_ip, body.get('ttlDays'))
     msg = "Wrote {} events to the cloud".format(len(events))
     return {'success': True, 'message': msg}
@@ -0,0 +1,112 @@
+"""Shared runtime helpers packaged alongside every Blockade Lambda."""
+import base64
+import boto3
+import json
+import os
+import time
+from decimal import Decimal
+
+# Days of event counters kept, and readable through Get-Event-Stats.
+STATS_DAYS = 90
+
+
+def get_table(env_key):
+    """Get the DynamoDB table named by an environment variable."""
+    return boto3.resource("dynamodb").Table(os.environ[env_key])
+
+
+def check_auth(args, role=None):
+    """Check the user authentication."""
+    users = get_table('people')
+    if not (args.get('email', None) and args.get('api_key', None)):
+        mesg = "Invalid request: `email` and `api_key` are required"
+        return {'success': False, 'message': mesg}
+    user = users.get_item(Key={'email': args.get('email')})
+    if 'Item' not in user:
+        return {'success': False, 'message': 'User does not exist.'}
+    user = user['Item']
+    if user['api_key'] != args['api_key']:
+        return {'success': False, 'message': 'API key was invalid.'}
+    if role:
+        if user['role'] not in role:
+            mesg = 'User is not authorized to make this change.'
+            return {'success': False, 'message': mesg}
+    return {'success': True, 'message': None, 'user': user}
+
+
+def expires_at(days, now=None):
+    """Expiry time for the TTL attribute of new items.
+
+    :param days: Days the items are kept, 0 or None keeps them forever
+    :return: Seconds since the epoch, or None when they never expire
+    """
+    days = int(days or 0)
+    if days <= 0:
+        return None
+    return int(now or time.time()) + days * 86400
+
+
+def clamp_ttl(requested):
+    """Days new items are kept, a request may only shorten the node's TTL.
+
+    :param requested: Days asked for by the request, if any
+    :return: Days from the ttl_days setting, or fewer when requested
+    """
+    days = int(os.environ.get('ttl_days') or 0)
+    try:
+        requested = int(requested or 0)
+    except (TypeError, ValueError):
+        return days
+    if requested > 0 and (days <= 0 or requested < days):
+        return requested
+    return days
+
+
+def live_filter(now=None):
+    """Scan filter skipping items whose TTL passed but are not deleted yet.
+
+    DynamoDB removes expired items within a couple of days, not instantly.
+
+    :return: Tuple of the filter expression and its values
+    """
+    return ('(attribute_not_exists(expires) OR expires > :now)',
+            {':now': int(now or time.time())})
+
+
+def object_key(event):
+    """Name of the S3 object holding a stored event."""
+    metadata = event['metadata']
+    return '{match}_{type}_{method}_{ip}_{time}.json'.format(
+        match=event['indicatorMatch'], type=metadata['type'],
+        method=metadata['method'].lower(), ip=event.get('sourceIp', ''),
+        time=event['analysisTime'])
+
+
+def stat_key(dimension, day):
+    """Hash key of the event counters of a dimension for a UTC day."""
+    return '%s#%s' % (dimension, day)
+
+
+def decode_key(value):
+    """Decode the continuation token sent back by the client."""
+    if not value:
+        return None
+    padded = value + '=' * (-len(value) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def encode_key(key):
+    """Encode a LastEvaluatedKey so it can travel in a query string."""
+    data = json.dumps(key, sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def plain(value):
+    """Convert the Decimal numbers returned by DynamoDB for JSON output."""
+    if isinstance(value, dict):
+        return dict((k, plain(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [plain(x) for x in value]
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
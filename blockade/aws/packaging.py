@@ -0,0 +1,98 @@
+"""Build the Lambda deployment packages from the lambda-scripts sources."""
+import glob
+import hashlib
+import io
+import os
+import re
+import zipfile
+
+AWS_PATH = os.path.dirname(os.path.realpath(__file__))
+SCRIPTS_PATH = os.path.join(AWS_PATH, 'lambda-scripts')
+ZIPS_PATH = os.path.join(AWS_PATH, 'lambda-zips')
+SHARED_MODULES = ['blockade_runtime']
+# Fixed metadata so identical sources always produce identical archives.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o644
+
+
+def list_handlers(scripts_path=SCRIPTS_PATH):
+    """List the Lambda handler names available in the scripts directory.
+
+    :param str scripts_path: Directory holding the Lambda scripts
+    :return: Sorted list of handler names
+    """
+    pattern = os.path.join(scripts_path, 'Blockade-*.py')
+    return sorted(os.path.basename(x)[:-3] for x in glob.glob(pattern))
+
+
+def package_members(name, scripts_path=SCRIPTS_PATH):
+    """List the files that make up the package of a handler.
+
+    Shared runtime modules are only included when the handler imports them.
+
+    :param str name: Handler name, e.g. Blockade-Get-Indicators
+    :param str scripts_path: Directory holding the Lambda scripts
+    :return: Sorted list of file names
+    """
+    with open(os.path.join(scripts_path, '%s.py' % name), 'r') as handle:
+        source = handle.read()
+    members = ['%s.py' % name]
+    for module in SHARED_MODULES:
+        if re.search(r'^\s*(from|import)\s+%s\b' % module, source, re.M):
+            members.append('%s.py' % module)
+    return sorted(members)
+
+
+def build_package(name, scripts_path=SCRIPTS_PATH):
+    """Build a deterministic deployment package for a single handler.
+
+    Only the handler and the shared runtime modules it uses are included.
+    Entries are written in a stable order with fixed timestamps and
+    permissions, so the output is byte-identical for identical input.
+
+    :param str name: Handler name, e.g. Blockade-Get-Indicators
+    :param str scripts_path: Directory holding the Lambda scripts
+    :return: Zip archive content as bytes
+    """
+    members = package_members(name, scripts_path)
+    buf = io.BytesIO()
+    archive = zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED)
+    for member in members:
+        with open(os.path.join(scripts_path, member), 'rb') as handle:
+            data = handle.read()
+        info = zipfile.ZipInfo(member, date_time=ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.create_system = 3
+        info.external_attr = ZIP_FILE_MODE << 16
+        archive.writestr(info, data)
+    archive.close()
+    return buf.getvalue()
+
+
+def build_packages(names=None, scripts_path=SCRIPTS_PATH,
+                   output_path=ZIPS_PATH, check=False):
+    """Build the deployment packages for every handler.
+
+    :param list names: Handler names to build, defaults to all handlers
+    :param str scripts_path: Directory holding the Lambda scripts
+    :param str output_path: Directory to write the packages into
+    :param bool check: Compare against existing packages instead of writing
+    :return: List of dicts describing each package
+    """
+    if not names:
+        names = list_handlers(scripts_path)
+    results = list()
+    for name in names:
+        data = build_package(name, scripts_path)
+        file_path = os.path.join(output_path, '%s.zip' % name)
+        current = None
+        if os.path.isfile(file_path):
+            with open(file_path, 'rb') as handle:
+                current = handle.read()
+        if not check and current != data:
+            with open(file_path, 'wb') as handle:
+                handle.write(data)
+        results.append({'name': name, 'path': file_path, 'size': len(data),
+                        'sha256': hashlib.sha256(data).hexdigest(),
+                        'changed': current != data})
+    return results
@@ -1,13 +1,13 @@
 """Automatically setup the AWS infrastructure needed for Blockade.io."""
-import boto3
 import json
 import logging
 import os
 import random
-import requests
 import sys
 import time
 from argparse import ArgumentParser
+from functools import partial
+from blockade.aws.packaging import build_packages
 from builtins import input
 
 logger = logging.getLogger("BLOCKADE_SERVERLESS")
@@ -30,8 +30,36 @@ S3_BUCKET = '-'.join([S3_BUCKET_NAME, S3_BUCKET_ID])
 ANALYST_TOOLBENCH = "https://github.com/blockadeio/analyst_toolbench"
 CLOUD_NODE_DOCS = "https://github.com/blockadeio/cloud_node"
 API_GATEWAY = 'Blockade_API'
+# Gzip responses at least this large and accept gzipped/deflated requests.
+API_COMPRESSION_SIZE = 1024
+API_STAGE = 'prod'
+# Seconds GET responses are cached by the stage, 0 disables the cache.
+API_CACHE_TTL = 0
+API_CACHE_MAX_TTL = 3600
+API_CACHE_SIZES = ['0.5', '1.6', '6.1', '13.5', '28.4', '58.2', '118', '237']
+API_CACHE_SIZE = '0.5'
 SUPPORTED_REGIONS = ['us-west-1', 'us-west-2', 'us-east-1', 'us-east-2']
-DYNAMODB_TABLES = ['blockade_users', 'blockade_events', 'blockade_indicators']
+DYNAMODB_TABLES = ['blockade_users', 'blockade_events', 'blockade_indicators',
+                   'blockade_event_stats', 'blockade_tags']
+# Items of these tables are deleted by DynamoDB once their TTL passes.
+TTL_ATTRIBUTE = 'expires'
+DYNAMODB_TTL_TABLES = ['blockade_events', 'blockade_indicators',
+                       'blockade_event_stats', 'blockade_tags']
+# Default days events and indicators are kept, 0 keeps them forever.
+EVENT_TTL_DAYS = 90
+INDICATOR_TTL_DAYS = 0
+S3_LIFECYCLE_RULE = 'blockade-expire-events'
+# Concurrent delete_objects requests used to empty the bucket on teardown.
+S3_DELETE_WORKERS = 8
+S3_PROGRESS_INTERVAL = 5
+# Concurrent IAM calls made while bootstrapping the user, role and group.
+IAM_WORKERS = 8
+# Seconds to wait for a new role to propagate before creating functions.
+ROLE_READY_TIMEOUT = 60
+# Seconds to wait for an update of a Lambda function to be applied.
+FUNCTION_UPDATE_TIMEOUT = 120
+# Concurrent deletions made per service when tearing the node down.
+TEARDOWN_WORKERS = 8
 DYNAMODB_SCHEMAS = {
     'blockade_users': {
         'KeySchema': [{
@@ -74,11 +102,44 @@ DYNAMODB_SCHEMAS = {
             'AttributeName': 'creator',
             'AttributeType': 'S'
         }]
+    },
+    'blockade_event_stats': {
+        'KeySchema': [{
+            'AttributeName': 'stat',
+            'KeyType': 'HASH'
+        }, {
+            'AttributeName': 'group',
+            'KeyType': 'RANGE'
+        }],
+        'AttributeDefinitions': [{
+            'AttributeName': 'stat',
+            'AttributeType': 'S'
+        }, {
+            'AttributeName': 'group',
+            'AttributeType': 'S'
+        }]
+    },
+    'blockade_tags': {
+        'KeySchema': [{
+            'AttributeName': 'tag',
+            'KeyType': 'HASH'
+        }, {
+            'AttributeName': 'indicator',
+            'KeyType': 'RANGE'
+        }],
+        'AttributeDefinitions': [{
+            'AttributeName': 'tag',
+            'AttributeType': 'S'
+        }, {
+            'AttributeName': 'indicator',
+            'AttributeType': 'S'
+        }]
     }
 }
 LAMBDA_FUNCTIONS = ['Blockade-Get-Indicators', 'Blockade-Add-Indicators',
                     'Blockade-Store-Events', 'Blockade-Add-User',
-                    'Blockade-Get-Events']
+                    'Blockade-Get-Events', 'Blockade-Check-Indicators',
+                    'Blockade-Get-Event-Stats', 'Blockade-Flush-Events']
 LAMBDA_SCHEMA = {
     'Blockade-Get-Indicators': {
         'FunctionName': 'Blockade-Get-Indicators',
@@ -86,7 +147,8 @@ LAMBDA_SCHEMA = {
         'Handler': 'Blockade-Get-Indicators.lambda_handler',
         'Environment': {
             'Variables': {
-                'database': 'blockade_indicators'
+                'database': 'blockade_indicators',
+                'tags': 'blockade_tags'
             }
         }
     },
@@ -97,7 +159,11 @@ LAMBDA_SCHEMA = {
         'Environment': {
             'Variables': {
                 'database': 'blockade_indicators',
-                'people': 'blockade_users'
+                'people': 'blockade_users',
+                'tags': 'blockade_tags',
+                'ttl_days': str(INDICATOR_TTL_DAYS),
+                'rest_api_id': '',
+                'stage': API_STAGE
             }
         }
     },
@@ -108,7 +174,9 @@ LAMBDA_SCHEMA = {
         'Environment': {
             'Variables': {
                 'database': 'blockade_events',
-                's3_bucket': S3_BUCKET
+                'stats': 'blockade_event_stats',
+                's3_bucket': S3_BUCKET,
+                'ttl_days': str(EVENT_TTL_DAYS)
             }
         }
     },
@@ -132,11 +200,53 @@ LAMBDA_SCHEMA = {
                 'database': 'blockade_events'
             }
         }
+    },
+    'Blockade-Check-Indicators': {
+        'FunctionName': 'Blockade-Check-Indicators',
+        'Description': 'Check which indicators are in the Blockade database',
+        'Handler': 'Blockade-Check-Indicators.lambda_handler',
+        'Timeout': 10,
+        'MemorySize': 256,
+        'Environment': {
+            'Variables': {
+                'people': 'blockade_users',
+                'database': 'blockade_indicators'
+            }
+        }
+    },
+    'Blockade-Get-Event-Stats': {
+        'FunctionName': 'Blockade-Get-Event-Stats',
+        'Description': 'Get event counters from the Blockade database',
+        'Handler': 'Blockade-Get-Event-Stats.lambda_handler',
+        # Up to 90 days of counters are read, under API Gateway's 29s limit
+        'Timeout': 25,
+        'MemorySize': 256,
+        'Environment': {
+            'Variables': {
+                'people': 'blockade_users',
+                'database': 'blockade_event_stats'
+            }
+        }
+    },
+    'Blockade-Flush-Events': {
+        'FunctionName': 'Blockade-Flush-Events',
+        'Description': 'Delete events from the Blockade database and bucket',
+        'Handler': 'Blockade-Flush-Events.lambda_handler',
+        'Timeout': 60,
+        'MemorySize': 512,
+        'Environment': {
+            'Variables': {
+                'people': 'blockade_users',
+                'database': 'blockade_events',
+                's3_bucket': S3_BUCKET
+            }
+        }
     }
 }
 API_GATEWAY_RESOURCES = ['Blockade-Get-Indicators', 'Blockade-Store-Events',
                          'Blockade-Add-Indicators', 'Blockade-Add-User',
-                         'Blockade-Get-Events']
+                         'Blockade-Get-Events', 'Blockade-Check-Indicators',
+                         'Blockade-Get-Event-Stats', 'Blockade-Flush-Events']
 API_GATEWAY_RESOURCE_SCHEMA = {
     'Blockade-Get-Indicators': {
         'admin': False,
@@ -144,9 +254,11 @@ API_GATEWAY_RESOURCE_SCHEMA = {
             'path': 'get-indicators',
             'method': 'GET'
         },
+        # Query string parameters the cached responses are keyed on
+        'cache': ['limit', 'lastKey', 'tag', 'until'],
         'request': {
             'template': {
-                'application/json': ''
+                'application/json': '{"limit": "$input.params(\'limit\')", "lastKey": "$input.params(\'lastKey\')", "tag": "$input.params(\'tag\')", "until": "$input.params(\'until\')"}'
             }
         },
         'response': {
@@ -222,6 +334,57 @@ API_GATEWAY_RESOURCE_SCHEMA = {
                 'application/json': ''
             }
         }
+    },
+    'Blockade-Check-Indicators': {
+        'admin': True,
+        'resource': {
+            'path': 'check-indicators',
+            'method': 'POST'
+        },
+        'request': {
+            'template': {
+                'application/json': ''
+            }
+        },
+        'response': {
+            'template': {
+                'application/json': ''
+            }
+        }
+    },
+    'Blockade-Get-Event-Stats': {
+        'admin': True,
+        'resource': {
+            'path': 'get-event-stats',
+            'method': 'POST'
+        },
+        'request': {
+            'template': {
+                'application/json': ''
+            }
+        },
+        'response': {
+            'template': {
+                'application/json': ''
+            }
+        }
+    },
+    'Blockade-Flush-Events': {
+        'admin': True,
+        'resource': {
+            'path': 'flush-events',
+            'method': 'DELETE'
+        },
+        'request': {
+            'template': {
+                'application/json': ''
+            }
+        },
+        'response': {
+            'template': {
+                'application/json': ''
+            }
+        }
     }
 }
 
@@ -302,7 +465,9 @@ POLICIES = {
                 ],\
                 "Resource": [\
                     "arn:aws:dynamodb:*:*:table/blockade_events",\
+                    "arn:aws:dynamodb:*:*:table/blockade_event_stats",\
                     "arn:aws:dynamodb:*:*:table/blockade_indicators",\
+                    "arn:aws:dynamodb:*:*:table/blockade_tags",\
                     "arn:aws:dynamodb:*:*:table/blockade_users"\
                 ]\
             },\
@@ -386,149 +551,239 @@ POLICIES = {
 }
 
 
-def generate_handler():
-    """Create the Blockade user and give them permissions."""
-    logger.debug("[#] Setting up user, group and permissions")
-    client = boto3.client("iam", region_name=PRIMARY_REGION)
-
-    # Create the user
+def build_lambda_packages(check=False):
+    """Rebuild the Lambda deployment packages from their scripts."""
+    logger.debug("[#] Building Lambda deployment packages")
+    results = build_packages(check=check)
+    for item in results:
+        status = "stale" if item['changed'] else "current"
+        if not check and item['changed']:
+            status = "rebuilt"
+        logger.info("[#] %s: %d bytes, sha256 %s (%s)"
+                    % (item['name'], item['size'], item['sha256'][:12], status))
+    stale = [x['name'] for x in results if x['changed']]
+    if check and stale:
+        raise Exception("Lambda packages out of date: %s" % ', '.join(stale))
+    logger.info("[#] Built %d Lambda packages, %d bytes total"
+                % (len(results), sum(x['size'] for x in results)))
+
+    return results
+
+
+def run_concurrently(calls, workers=IAM_WORKERS):
+    """Run independent calls on a thread pool.
+
+    :param list calls: Callables taking no argument
+    :param int workers: Calls running at once
+    :return: List of the results, in the order of the calls
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if not calls:
+        return list()
+    with ThreadPoolExecutor(max_workers=min(workers, len(calls))) as pool:
+        futures = [pool.submit(x) for x in calls]
+        return [x.result() for x in futures]
+
+
+def policy_arns(account_id):
+    """ARNs of the policies given to the Blockade role and group."""
+    arns = dict((label, 'arn:aws:iam::{id}:policy/{policy}'.format(
+        id=account_id, policy=label)) for label in BLOCKADE_POLICIES)
+    arns['PushToCloud'] = "arn:aws:iam::aws:policy/service-role/AmazonAPIGatewayPushToCloudWatchLogs"
+    arns['APIGatewayAdmin'] = "arn:aws:iam::aws:policy/AmazonAPIGatewayAdministrator"
+    return arns
+
+
+def attached_policies(client, operation, **kwargs):
+    """ARNs of the managed policies attached to a role or a group."""
+    paginator = client.get_paginator(operation)
+    return set(x['PolicyArn'] for page in paginator.paginate(**kwargs)
+               for x in page.get('AttachedPolicies', list()))
+
+
+def create_entity(client, kind, name, operation, **kwargs):
+    """Create an IAM entity, doing nothing if it already exists."""
     try:
-        response = client.create_user(
-            UserName=BLOCKADE_USER
-        )
+        logger.debug("[#] Creating %s %s" % (name, kind))
+        getattr(client, operation)(**kwargs)
+        logger.info("[#] %s %s successfully created" % (name, kind))
     except client.exceptions.EntityAlreadyExistsException:
-        logger.debug("[!] Blockade user already exists")
-    logger.info("[#] %s user successfully created" % (BLOCKADE_USER))
+        logger.debug("[!] Blockade %s %s already exists" % (kind, name))
 
-    # Create the role
-    try:
-        logger.debug("[#] Creating %s role" % (BLOCKADE_ROLE))
-        response = client.create_role(
-            RoleName=BLOCKADE_ROLE,
-            AssumeRolePolicyDocument=BLOCKADE_ROLE_POLICY,
-            Description="Allow a user to manage the administration of Blockade."
-        )
-    except client.exceptions.EntityAlreadyExistsException:
-        logger.debug("[!] Blockade role already exists")
-    logger.info("[#] %s role successfully created" % (BLOCKADE_ROLE))
 
-    # Create the group
-    try:
-        logger.debug("[#] Creating %s group" % (BLOCKADE_GROUP))
-        response = client.create_group(
-            GroupName=BLOCKADE_GROUP,
-        )
-    except client.exceptions.EntityAlreadyExistsException:
-        logger.debug("[!] Blockade group already exists")
-    logger.info("[#] %s group successfully created" % (BLOCKADE_GROUP))
+def wait_for_role(client, timeout=ROLE_READY_TIMEOUT):
+    """Wait until Lambda can be given the Blockade role.
 
-    # Generate all policy items
-    logger.debug("[#] Creating Blockade IAM policies")
-    for label in BLOCKADE_POLICIES:
-        logger.debug("[#] Creating %s policy" % (label))
+    IAM is eventually consistent: the role has to be visible and to carry
+    its trust policy for Lambda before functions can be created with it.
+    The role is polled directly, older botocore releases have no IAM role
+    waiter.
+
+    :param client: IAM client
+    :param int timeout: Seconds to wait at most
+    :return: True once the role is ready, False on timeout
+    """
+    def ready():
         try:
-            response = client.create_policy(
-                PolicyName=label,
-                PolicyDocument=POLICIES[label],
-                Description="Generated policy from Blockade bootstrap tool"
-            )
-        except client.exceptions.EntityAlreadyExistsException:
-            logger.debug("[!] Blockade policy %s already exists" % (label))
-        logger.info("[#] Blockade %s policy successfully created" % (label))
-    logger.info("[#] Blockade policies successfully created")
+            role = client.get_role(RoleName=BLOCKADE_ROLE)['Role']
+        except client.exceptions.NoSuchEntityException:
+            return False
+        document = role.get('AssumeRolePolicyDocument', dict())
+        services = list()
+        for statement in document.get('Statement', list()):
+            service = statement.get('Principal', dict()).get('Service', [])
+            if hasattr(service, 'split'):
+                service = [service]
+            services.extend(service)
+        return 'lambda.amazonaws.com' in services
+
+    if wait_until(ready, timeout):
+        logger.debug("[#] %s role is ready" % (BLOCKADE_ROLE))
+        return True
+    logger.warning("[!] %s role still not ready after %d seconds"
+                   % (BLOCKADE_ROLE, timeout))
+    return False
+
+
+def wait_for_policy(client, arn, timeout=ROLE_READY_TIMEOUT):
+    """Wait until a new policy is visible, so it can be attached."""
+    def visible():
+        try:
+            client.get_policy(PolicyArn=arn)
+        except client.exceptions.NoSuchEntityException:
+            return False
+        return True
+
+    if not wait_until(visible, timeout):
+        raise Exception("Policy %s still missing after %d seconds"
+                        % (arn, timeout))
+
 
-    # Attach policies to all entity types
+def generate_handler():
+    """Create the Blockade user and give them permissions.
+
+    The user, role, group and policies are created concurrently, then every
+    policy not attached yet is attached in one more concurrent round.
+    """
+    import boto3
+    logger.debug("[#] Setting up user, group and permissions")
+    client = boto3.client("iam", region_name=PRIMARY_REGION)
     iam = boto3.resource('iam')
     account_id = iam.CurrentUser().arn.split(':')[4]
+    arns = policy_arns(account_id)
+
+    calls = [
+        partial(create_entity, client, 'user', BLOCKADE_USER, 'create_user',
+                UserName=BLOCKADE_USER),
+        partial(create_entity, client, 'role', BLOCKADE_ROLE, 'create_role',
+                RoleName=BLOCKADE_ROLE,
+                AssumeRolePolicyDocument=BLOCKADE_ROLE_POLICY,
+                Description="Allow a user to manage the administration of "
+                            "Blockade."),
+        partial(create_entity, client, 'group', BLOCKADE_GROUP,
+                'create_group', GroupName=BLOCKADE_GROUP)
+    ]
+    for label in BLOCKADE_POLICIES:
+        calls.append(partial(create_entity, client, 'policy', label,
+                             'create_policy', PolicyName=label,
+                             PolicyDocument=POLICIES[label],
+                             Description="Generated policy from Blockade "
+                                         "bootstrap tool"))
+    run_concurrently(calls)
+    logger.info("[#] Blockade policies successfully created")
+
+    # Attach policies to all entity types, skipping those already attached
+    run_concurrently([partial(wait_for_policy, client, arns[label])
+                      for label in BLOCKADE_POLICIES])
+    role_policies, group_policies = run_concurrently([
+        partial(attached_policies, client, 'list_attached_role_policies',
+                RoleName=BLOCKADE_ROLE),
+        partial(attached_policies, client, 'list_attached_group_policies',
+                GroupName=BLOCKADE_GROUP)
+    ])
+    calls = [partial(client.add_user_to_group, GroupName=BLOCKADE_GROUP,
+                     UserName=BLOCKADE_USER)]
     for label in BLOCKADE_POLICIES + ['PushToCloud', 'APIGatewayAdmin']:
-        logger.debug("[#] Attaching %s policy" % (label))
-        arn = 'arn:aws:iam::{id}:policy/{policy}'.format(id=account_id, policy=label)
-        if label == 'PushToCloud':
-            arn = "arn:aws:iam::aws:policy/service-role/AmazonAPIGatewayPushToCloudWatchLogs"
-        if label == 'APIGatewayAdmin':
-            arn = "arn:aws:iam::aws:policy/AmazonAPIGatewayAdministrator"
-        client.attach_role_policy(RoleName=BLOCKADE_ROLE, PolicyArn=arn)
-        client.attach_group_policy(GroupName=BLOCKADE_GROUP, PolicyArn=arn)
+        if arns[label] not in role_policies:
+            logger.debug("[#] Attaching %s policy to the role" % (label))
+            calls.append(partial(client.attach_role_policy,
+                                 RoleName=BLOCKADE_ROLE,
+                                 PolicyArn=arns[label]))
+        if arns[label] not in group_policies:
+            logger.debug("[#] Attaching %s policy to the group" % (label))
+            calls.append(partial(client.attach_group_policy,
+                                 GroupName=BLOCKADE_GROUP,
+                                 PolicyArn=arns[label]))
+    run_concurrently(calls)
     logger.info("[#] Blockade policies successfully attached")
-
-    logger.debug("[#] Adding %s to %s group" % (BLOCKADE_USER, BLOCKADE_GROUP))
-    response = client.add_user_to_group(
-        GroupName=BLOCKADE_GROUP,
-        UserName=BLOCKADE_USER
-    )
     logger.info("[#] %s user is part of %s group" % (BLOCKADE_USER, BLOCKADE_GROUP))
 
+    wait_for_role(client)
+
     return True
 
 
 def remove_handler():
-    """Remove the user, group and policies for Blockade."""
+    """Remove the user, group and policies for Blockade.
+
+    Policies are detached and the user leaves the group concurrently, then
+    the now unreferenced entities are deleted concurrently.
+    """
+    import boto3
     logger.debug("[#] Removing user, group and permissions for Blockade")
     client = boto3.client("iam", region_name=PRIMARY_REGION)
+    missing = client.exceptions.NoSuchEntityException
 
     iam = boto3.resource('iam')
     account_id = iam.CurrentUser().arn.split(':')[4]
+    arns = policy_arns(account_id)
 
-    try:
-        logger.debug("[#] Removing %s from %s group" % (BLOCKADE_USER, BLOCKADE_GROUP))
-        response = client.remove_user_from_group(
-            GroupName=BLOCKADE_GROUP,
-            UserName=BLOCKADE_USER
-        )
-    except client.exceptions.NoSuchEntityException:
-        logger.debug("[!] Blockade user already removed from group")
-
-    for label in BLOCKADE_POLICIES + ['PushToCloud', 'APIGatewayAdmin']:
-        logger.debug("[#] Removing %s policy" % (label))
-        arn = 'arn:aws:iam::{id}:policy/{policy}'.format(id=account_id,
-                                                         policy=label)
-        if label == 'PushToCloud':
-            arn = "arn:aws:iam::aws:policy/service-role/AmazonAPIGatewayPushToCloudWatchLogs"
-        if label == 'APIGatewayAdmin':
-            arn = "arn:aws:iam::aws:policy/AmazonAPIGatewayAdministrator"
-
-        try:
-            response = client.detach_group_policy(
-                GroupName=BLOCKADE_GROUP, PolicyArn=arn)
-        except:
-            pass
-        try:
-            response = client.detach_role_policy(
-                RoleName=BLOCKADE_ROLE, PolicyArn=arn)
-        except:
-            pass
+    def call(message, operation, **kwargs):
         try:
-            response = client.delete_policy(PolicyArn=arn)
-        except Exception as e:
-            print(e)
-            pass
-    logger.debug("[#] Removed all policies")
-
-    try:
-        logger.debug("[#] Deleting %s user" % (BLOCKADE_USER))
-        response = client.delete_user(
-            UserName=BLOCKADE_USER
-        )
-    except client.exceptions.NoSuchEntityException:
-        logger.debug("[!] %s user already deleted" % (BLOCKADE_USER))
-
-    try:
-        logger.debug("[#] Removing %s group" % (BLOCKADE_GROUP))
-        response = client.delete_group(GroupName=BLOCKADE_GROUP)
-    except:
-        logger.debug("[!] Group already removed")
-
-    try:
-        logger.debug("[#] Removing %s role" % (BLOCKADE_ROLE))
-        response = client.delete_role(RoleName=BLOCKADE_ROLE)
-    except:
-        logger.debug("[!] Role already removed")
+            logger.debug("[#] %s" % (message))
+            getattr(client, operation)(**kwargs)
+        except missing:
+            logger.debug("[!] %s: already done" % (message))
+
+    calls = [partial(call, "Removing %s from %s group"
+                     % (BLOCKADE_USER, BLOCKADE_GROUP),
+                     'remove_user_from_group', GroupName=BLOCKADE_GROUP,
+                     UserName=BLOCKADE_USER)]
+    for label in BLOCKADE_POLICIES + ['PushToCloud', 'APIGatewayAdmin']:
+        calls.append(partial(call, "Detaching %s policy from the group"
+                             % (label), 'detach_group_policy',
+                             GroupName=BLOCKADE_GROUP, PolicyArn=arns[label]))
+        calls.append(partial(call, "Detaching %s policy from the role"
+                             % (label), 'detach_role_policy',
+                             RoleName=BLOCKADE_ROLE, PolicyArn=arns[label]))
+    run_concurrently(calls)
+
+    # AWS managed policies are only detached, the Blockade ones are deleted
+    calls = [partial(call, "Removing %s policy" % (label), 'delete_policy',
+                     PolicyArn=arns[label]) for label in BLOCKADE_POLICIES]
+    calls += [
+        partial(call, "Deleting %s user" % (BLOCKADE_USER), 'delete_user',
+                UserName=BLOCKADE_USER),
+        partial(call, "Removing %s group" % (BLOCKADE_GROUP), 'delete_group',
+                GroupName=BLOCKADE_GROUP),
+        partial(call, "Removing %s role" % (BLOCKADE_ROLE), 'delete_role',
+                RoleName=BLOCKADE_ROLE)
+    ]
+    run_concurrently(calls)
+    logger.info("[#] Removed user, group, role and policies")
 
     return True
 
 
-def generate_s3_bucket():
-    """Create the blockade bucket if not already there."""
+def generate_s3_bucket(expire_existing=False):
+    """Create the blockade bucket if not already there.
+
+    :param bool expire_existing: Apply the event TTL to the records of an
+                                 existing bucket too. Off by default, since
+                                 records stored before the TTL existed have
+                                 events kept forever.
+    """
+    import boto3
     logger.debug("[#] Setting up S3 bucket")
     client = boto3.client("s3", region_name=PRIMARY_REGION)
     buckets = client.list_buckets()
@@ -536,7 +791,10 @@ def generate_s3_bucket():
                if x['Name'].startswith(S3_BUCKET)]
     if len(matches) > 0:
         logger.debug("[*] Bucket already exists")
-        return matches.pop()
+        match = matches.pop()
+        if expire_existing:
+            configure_s3_lifecycle(client, match['Name'])
+        return match
 
     response = client.create_bucket(
         Bucket=S3_BUCKET,
@@ -544,13 +802,135 @@ def generate_s3_bucket():
             'LocationConstraint': PRIMARY_REGION
         }
     )
+    configure_s3_lifecycle(client, S3_BUCKET)
     logger.info("[#] Successfully setup the S3 bucket")
 
     return response
 
 
-def remove_s3_bucket():
-    """Remove the Blockade bucket."""
+def configure_s3_lifecycle(client, bucket):
+    """Expire the event records of the bucket along with the events.
+
+    Only the Blockade rule is added, replaced or removed, the other rules
+    of the bucket are kept as they are.
+    """
+    from botocore.exceptions import ClientError
+    days = int(LAMBDA_SCHEMA['Blockade-Store-Events']['Environment']
+               ['Variables']['ttl_days'])
+    try:
+        rules = client.get_bucket_lifecycle_configuration(
+            Bucket=bucket).get('Rules', list())
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchLifecycleConfiguration':
+            raise
+        rules = list()
+    kept = [x for x in rules if x.get('ID') != S3_LIFECYCLE_RULE]
+    if days > 0:
+        logger.debug("[#] Expiring S3 records after %d days" % days)
+        kept.append({
+            'ID': S3_LIFECYCLE_RULE,
+            'Filter': {'Prefix': ''},
+            'Status': 'Enabled',
+            'Expiration': {'Days': days}
+        })
+    else:
+        logger.debug("[#] Keeping S3 records forever")
+        if len(kept) == len(rules):
+            return
+    if not kept:
+        client.delete_bucket_lifecycle(Bucket=bucket)
+        return
+    client.put_bucket_lifecycle_configuration(
+        Bucket=bucket,
+        LifecycleConfiguration={'Rules': kept}
+    )
+
+
+def _bucket_pages(client, bucket):
+    """List every object of a bucket, a page of up to 1000 at a time.
+
+    On a bucket with versioning, every version and delete marker is listed
+    so the bucket can be deleted afterwards.
+    """
+    versioning = client.get_bucket_versioning(Bucket=bucket)
+    if versioning.get('Status') in ('Enabled', 'Suspended'):
+        paginator = client.get_paginator('list_object_versions')
+        for page in paginator.paginate(Bucket=bucket):
+            objects = [{'Key': x['Key'], 'VersionId': x['VersionId']}
+                       for x in (page.get('Versions', list()) +
+                                 page.get('DeleteMarkers', list()))]
+            if objects:
+                yield objects
+        return
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket):
+        objects = [{'Key': x['Key']} for x in page.get('Contents', list())]
+        if objects:
+            yield objects
+
+
+def empty_s3_bucket(client, bucket, workers=S3_DELETE_WORKERS):
+    """Delete every object of a bucket, several pages at a time.
+
+    Pages are listed while earlier ones are being deleted, with at most
+    twice as many pages in flight as workers.
+
+    :param client: boto3 S3 client, which is safe to share between threads
+    :param str bucket: Bucket name
+    :param int workers: Concurrent delete_objects requests
+    :return: Tuple of the objects deleted and the objects that failed
+    """
+    from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
+                                    wait)
+
+    def delete(objects):
+        response = client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': objects, 'Quiet': True}
+        )
+        errors = response.get('Errors', list())
+        for error in errors[:3]:
+            logger.debug("[!] Could not delete %s: %s"
+                         % (error.get('Key'), error.get('Message')))
+        return len(objects) - len(errors), len(errors)
+
+    start = last_report = time.time()
+    deleted, failed = 0, 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = _bucket_pages(client, bucket)
+        while True:
+            for objects in pages:
+                pending.add(executor.submit(delete, objects))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ok, errors = future.result()
+                deleted += ok
+                failed += errors
+            if time.time() - last_report >= S3_PROGRESS_INTERVAL:
+                last_report = time.time()
+                logger.info("[*] Deleted %d objects from %s, %.0f/s"
+                            % (deleted, bucket,
+                               deleted / (last_report - start)))
+    elapsed = max(time.time() - start, 1e-6)
+    logger.info("[#] Deleted %d objects from %s in %.1fs, %.0f/s"
+                % (deleted, bucket, elapsed, deleted / elapsed))
+    if failed:
+        logger.error("[!] %d objects of %s could not be deleted"
+                     % (failed, bucket))
+    return deleted, failed
+
+
+def remove_s3_bucket(workers=S3_DELETE_WORKERS):
+    """Remove the Blockade bucket.
+
+    :param int workers: Concurrent requests used to empty the bucket
+    """
+    import boto3
     logger.debug("[#] Removing S3 bucket")
     client = boto3.client("s3", region_name=PRIMARY_REGION)
     buckets = client.list_buckets()
@@ -560,30 +940,16 @@ def remove_s3_bucket():
         return
     match = matches.pop()['Name']
     try:
-        response = client.list_objects_v2(
-            Bucket=match,
-        )
+        deleted, failed = empty_s3_bucket(client, match, workers)
     except client.exceptions.NoSuchBucket:
         logger.info("[!] S3 bucket already deleted")
         return True
 
-    while response['KeyCount'] > 0:
-        logger.debug('[*] Deleting %d objects from bucket %s'
-                     % (len(response['Contents']), match))
-        response = client.delete_objects(
-            Bucket=match,
-            Delete={
-                'Objects': [{'Key': obj['Key']} for obj in response['Contents']]
-            }
-        )
-        response = client.list_objects_v2(
-            Bucket=match,
-        )
-
     logger.debug('[#] Deleting bucket %s' % match)
     response = client.delete_bucket(
         Bucket=match
     )
+    client.get_waiter('bucket_not_exists').wait(Bucket=match)
     logger.info("[#] Successfully deleted the S3 bucket")
 
     return response
@@ -591,6 +957,7 @@ def remove_s3_bucket():
 
 def generate_dynamodb_tables():
     """Create the Blockade DynamoDB tables."""
+    import boto3
     logger.debug("[#] Setting up DynamoDB tables")
     client = boto3.client('dynamodb', region_name=PRIMARY_REGION)
     existing_tables = client.list_tables()['TableNames']
@@ -612,35 +979,155 @@ def generate_dynamodb_tables():
         response = client.create_table(**kwargs)
         responses.append(response)
         logger.debug("[#] Successfully setup DynamoDB table %s" % (label))
+    enable_dynamodb_ttl(client)
     logger.info("[#] Successfully setup DynamoDB tables")
 
     return responses
 
 
+def enable_dynamodb_ttl(client):
+    """Let DynamoDB delete the expired items of the Blockade tables."""
+    waiter = client.get_waiter('table_exists')
+    for label in DYNAMODB_TTL_TABLES:
+        waiter.wait(TableName=label)
+        status = client.describe_time_to_live(TableName=label)
+        status = status.get('TimeToLiveDescription', dict())
+        if status.get('TimeToLiveStatus') in ('ENABLED', 'ENABLING'):
+            logger.debug("[*] TTL already enabled on %s" % (label))
+            continue
+        client.update_time_to_live(
+            TableName=label,
+            TimeToLiveSpecification={
+                'Enabled': True,
+                'AttributeName': TTL_ATTRIBUTE
+            }
+        )
+        logger.debug("[#] Enabled TTL on DynamoDB table %s" % (label))
+
+
+def set_ttl_days(events=None, indicators=None):
+    """Set the days events and indicators are kept by the node.
+
+    :param int events: Days events and their S3 records are kept
+    :param int indicators: Days indicators are kept
+    """
+    if events is not None:
+        LAMBDA_SCHEMA['Blockade-Store-Events']['Environment']['Variables'][
+            'ttl_days'] = str(max(0, events))
+    if indicators is not None:
+        LAMBDA_SCHEMA['Blockade-Add-Indicators']['Environment']['Variables'][
+            'ttl_days'] = str(max(0, indicators))
+
+
 def remove_dynamodb_tables():
-    """Remove the Blockade DynamoDB tables."""
+    """Remove the Blockade DynamoDB tables.
+
+    Every table is deleted at once and the call returns when all of them
+    are gone.
+    """
+    import boto3
     logger.debug("[#] Removing DynamoDB tables")
     client = boto3.client('dynamodb', region_name=PRIMARY_REGION)
 
-    responses = list()
-    for label in DYNAMODB_TABLES:
+    def remove(label):
         logger.debug("[*] Removing %s table" % (label))
         try:
-            response = client.delete_table(
-                TableName=label
-            )
+            response = client.delete_table(TableName=label)
         except client.exceptions.ResourceNotFoundException:
             logger.info("[!] Table %s already removed" % (label))
-            continue
-        responses.append(response)
+            return None
+        client.get_waiter('table_not_exists').wait(TableName=label)
         logger.debug("[*] Removed %s table" % (label))
+        return response
+
+    responses = run_concurrently([partial(remove, x)
+                                  for x in DYNAMODB_TABLES],
+                                 workers=len(DYNAMODB_TABLES))
     logger.info("[#] Successfully removed DynamoDB tables")
 
-    return responses
+    return [x for x in responses if x is not None]
+
+
+def create_function(client, timeout=ROLE_READY_TIMEOUT, **kwargs):
+    """Create a Lambda function, retrying while its role propagates.
+
+    A role can be visible in IAM a few seconds before Lambda is allowed to
+    assume it, creating a function meanwhile fails with an invalid
+    parameter error.
+    """
+    deadline = time.time() + timeout
+    delay = 1
+    while True:
+        try:
+            return client.create_function(**kwargs)
+        except client.exceptions.InvalidParameterValueException as e:
+            if 'assume' not in str(e) or time.time() + delay > deadline:
+                raise
+            logger.debug("[!] Role not assumable yet, retrying %s in %ds"
+                         % (kwargs['FunctionName'], delay))
+            time.sleep(delay)
+            delay = min(delay * 2, 8)
+
+
+def wait_until(check, timeout, delay=0.5, max_delay=5):
+    """Poll a check with exponential backoff until it passes.
+
+    :param check: Callable returning True once the wait is over
+    :param int timeout: Seconds to wait at most
+    :return: True if the check passed, False on timeout
+    """
+    deadline = time.time() + timeout
+    while True:
+        if check():
+            return True
+        if time.time() + delay > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def wait_for_function(client, label, timeout=FUNCTION_UPDATE_TIMEOUT):
+    """Wait until the last update of a Lambda function is applied.
+
+    Lambda refuses any change to a function while a previous one is in
+    progress.
+    """
+    def updated():
+        config = client.get_function_configuration(FunctionName=label)
+        status = config.get('LastUpdateStatus', 'Successful')
+        if status == 'Failed':
+            raise Exception("Update of %s failed: %s" % (
+                label, config.get('LastUpdateStatusReason')))
+        return status != 'InProgress' and config.get('State') != 'Pending'
+
+    if not wait_until(updated, timeout):
+        raise Exception("Lambda function %s still updating after %d seconds"
+                        % (label, timeout))
+
+
+def update_function(client, code, **kwargs):
+    """Upload the current code and settings of an existing function.
+
+    :param client: Lambda client
+    :param bytes code: Zipped deployment package
+    :param kwargs: Settings of the function, as given to create_function
+    :return: Response of the configuration update
+    """
+    label = kwargs['FunctionName']
+    wait_for_function(client, label)
+    client.update_function_code(FunctionName=label, ZipFile=code,
+                                Publish=True)
+    wait_for_function(client, label)
+    # Apply settings such as the TTLs chosen for this setup
+    response = client.update_function_configuration(**kwargs)
+    wait_for_function(client, label)
+    logger.debug("[#] Updated Lambda function %s" % (label))
+    return response
 
 
 def generate_lambda_functions():
     """Create the Blockade lambda functions."""
+    import boto3
     logger.debug("[#] Setting up the Lambda functions")
     aws_lambda = boto3.client('lambda', region_name=PRIMARY_REGION)
     functions = aws_lambda.list_functions().get('Functions')
@@ -649,27 +1136,30 @@ def generate_lambda_functions():
     iam = boto3.resource('iam')
     account_id = iam.CurrentUser().arn.split(':')[4]
 
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    dir_path = dir_path.replace('/cli', '/aws')
+
     responses = list()
     for label in LAMBDA_FUNCTIONS:
-        if label in existing_funcs:
-            logger.debug("[*] Lambda function %s already exists" % (label))
-            continue
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        dir_path = dir_path.replace('/cli', '/aws')
-
+        with open("{0}/lambda-zips/{1}.zip".format(dir_path, label), 'rb') \
+                as handle:
+            code = handle.read()
         kwargs = {
             'Runtime': 'python2.7',
             'Role': 'arn:aws:iam::{0}:role/{1}'.format(account_id, BLOCKADE_ROLE),
             'Timeout': 3,
-            'MemorySize': 128,
-            'Publish': True,
-            'Code': {
-                'ZipFile': open("{0}/lambda-zips/{1}.zip".format(dir_path, label), 'rb').read()
-            }
+            'MemorySize': 128
         }
         kwargs.update(LAMBDA_SCHEMA[label])
+        if label in existing_funcs:
+            logger.debug("[*] Lambda function %s already exists, updating it"
+                         % (label))
+            response = update_function(aws_lambda, code, **kwargs)
+            responses.append(response)
+            continue
+        kwargs.update({'Publish': True, 'Code': {'ZipFile': code}})
         logger.debug("[#] Setting up the %s Lambda function" % (label))
-        response = aws_lambda.create_function(**kwargs)
+        response = create_function(aws_lambda, **kwargs)
         responses.append(response)
         logger.debug("[#] Successfully setup Lambda function %s" % (label))
     logger.info("[#] Successfully setup Lambda functions")
@@ -679,38 +1169,53 @@ def generate_lambda_functions():
 
 def remove_lambda_functions():
     """Remove the Blockade Lambda functions."""
+    import boto3
     logger.debug("[#] Removing the Lambda functions")
     client = boto3.client('lambda', region_name=PRIMARY_REGION)
 
-    responses = list()
-    for label in LAMBDA_FUNCTIONS:
+    def remove(label):
         try:
-            response = client.delete_function(
-                FunctionName=label,
-            )
+            response = client.delete_function(FunctionName=label)
         except client.exceptions.ResourceNotFoundException:
             logger.info("[!] Function %s already removed" % (label))
-            continue
-        responses.append(response)
+            return None
         logger.debug("[*] Removed %s function" % (label))
+        return response
+
+    responses = run_concurrently([partial(remove, x)
+                                  for x in LAMBDA_FUNCTIONS],
+                                 workers=TEARDOWN_WORKERS)
     logger.info("[#] Successfully removed Lambda functions")
 
-    return responses
+    return [x for x in responses if x is not None]
 
 
 def generate_api_gateway():
     """Create the Blockade API Gateway REST service."""
+    import boto3
     logger.debug("[#] Setting up the API Gateway")
     client = boto3.client('apigateway', region_name=PRIMARY_REGION)
     matches = [x for x in client.get_rest_apis().get('items', list())
                if x['name'] == API_GATEWAY]
     if len(matches) > 0:
         logger.debug("[#] API Gateway already setup")
-        return matches.pop()
+        match = matches.pop()
+        if match.get('minimumCompressionSize') != API_COMPRESSION_SIZE:
+            logger.debug("[#] Enabling API Gateway compression")
+            match = client.update_rest_api(
+                restApiId=match.get('id'),
+                patchOperations=[{
+                    'op': 'replace',
+                    'path': '/minimumCompressionSize',
+                    'value': str(API_COMPRESSION_SIZE)
+                }]
+            )
+        return match
 
     response = client.create_rest_api(
         name=API_GATEWAY,
-        description='REST-API to power the Blockade service'
+        description='REST-API to power the Blockade service',
+        minimumCompressionSize=API_COMPRESSION_SIZE
     )
     logger.info("[#] Successfully setup the API Gateway")
 
@@ -719,6 +1224,7 @@ def generate_api_gateway():
 
 def generate_admin_resource():
     """Create the Blockade admin resource for the REST services."""
+    import boto3
     logger.debug("[#] Setting up the admin resource")
     client = boto3.client('apigateway', region_name=PRIMARY_REGION)
     existing = get_api_gateway_resource("admin")
@@ -741,6 +1247,7 @@ def generate_admin_resource():
 
 def get_api_gateway_resource(name):
     """Get the resource associated with our gateway."""
+    import boto3
     client = boto3.client('apigateway', region_name=PRIMARY_REGION)
     matches = [x for x in client.get_rest_apis().get('items', list())
                if x['name'] == API_GATEWAY]
@@ -754,8 +1261,75 @@ def get_api_gateway_resource(name):
     return resource_id
 
 
-def generate_api_resources():
-    """Generate the Blockade API endpoints."""
+def cache_key_parameters(schema):
+    """Method request parameters the cached responses of a resource vary on.
+    """
+    return ['method.request.querystring.%s' % x
+            for x in schema.get('cache', list())]
+
+
+def configure_stage_cache(client, rest_api_id, ttl=API_CACHE_TTL,
+                          size=API_CACHE_SIZE):
+    """Cache the GET responses of the stage, or stop caching them.
+
+    Add-Indicators is told which stage to flush, so consumers never read
+    a list of indicators older than the last write.
+
+    :param client: API Gateway client
+    :param str rest_api_id: ID of the Blockade REST API
+    :param int ttl: Seconds responses are cached, 0 disables the cache
+    :param str size: Cache size in GB, one of API_CACHE_SIZES
+    """
+    import boto3
+    enabled = 'true' if ttl else 'false'
+    operations = [{'op': 'replace', 'path': '/cacheClusterEnabled',
+                   'value': enabled}]
+    if ttl:
+        operations.append({'op': 'replace', 'path': '/cacheClusterSize',
+                           'value': size})
+    for label in API_GATEWAY_RESOURCES:
+        schema = API_GATEWAY_RESOURCE_SCHEMA[label]
+        if schema['resource']['method'] != 'GET':
+            continue
+        path = schema['resource']['path']
+        if schema['admin']:
+            path = 'admin/' + path
+        path = '/%s/GET/caching' % ('/' + path).replace('/', '~1')
+        operations.append({'op': 'replace', 'path': path + '/enabled',
+                           'value': enabled})
+        if ttl:
+            operations.append({'op': 'replace',
+                               'path': path + '/ttlInSeconds',
+                               'value': str(ttl)})
+    client.update_stage(restApiId=rest_api_id, stageName=API_STAGE,
+                        patchOperations=operations)
+
+    label = 'Blockade-Add-Indicators'
+    variables = LAMBDA_SCHEMA[label]['Environment']['Variables']
+    variables['rest_api_id'] = rest_api_id if ttl else ''
+    variables['stage'] = API_STAGE
+    aws_lambda = boto3.client('lambda', region_name=PRIMARY_REGION)
+    wait_for_function(aws_lambda, label)
+    aws_lambda.update_function_configuration(
+        FunctionName=label,
+        Environment=LAMBDA_SCHEMA[label]['Environment']
+    )
+    if ttl:
+        logger.info("[#] Caching GET responses for %ds in a %sGB cache"
+                    % (ttl, size))
+    else:
+        logger.debug("[#] Stage cache disabled")
+
+
+def generate_api_resources(cache_ttl=API_CACHE_TTL,
+                           cache_size=API_CACHE_SIZE):
+    """Generate the Blockade API endpoints.
+
+    :param int cache_ttl: Seconds GET responses are cached, 0 disables the
+                          cache
+    :param str cache_size: Cache size in GB, one of API_CACHE_SIZES
+    """
+    import boto3
     client = boto3.client('apigateway', region_name=PRIMARY_REGION)
     matches = [x for x in client.get_rest_apis().get('items', list())
                if x['name'] == API_GATEWAY]
@@ -769,6 +1343,27 @@ def generate_api_resources():
         existing = get_api_gateway_resource(schema['resource']['path'])
         if existing:
             logger.debug("[#] API resource %s already created" % (label))
+            keys = cache_key_parameters(schema)
+            if keys:
+                client.update_method(
+                    restApiId=match.get('id'),
+                    resourceId=existing,
+                    httpMethod=schema['resource']['method'],
+                    patchOperations=[{'op': 'add',
+                                      'path': '/requestParameters/' + x,
+                                      'value': 'false'} for x in keys]
+                )
+            client.update_integration(
+                restApiId=match.get('id'),
+                resourceId=existing,
+                httpMethod=schema['resource']['method'],
+                patchOperations=[{
+                    'op': 'replace',
+                    'path': '/requestTemplates/application~1json',
+                    'value': schema['request']['template']['application/json']
+                }] + [{'op': 'add', 'path': '/cacheKeyParameters/' + x}
+                      for x in keys]
+            )
             continue
 
         resource_id = get_api_gateway_resource('/')
@@ -791,7 +1386,9 @@ def generate_api_resources():
             restApiId=match.get('id'),
             resourceId=resource.get('id'),
             httpMethod=schema['resource']['method'],
-            authorizationType='NONE'
+            authorizationType='NONE',
+            requestParameters=dict((x, False)
+                                   for x in cache_key_parameters(schema))
         )
         logger.debug("[#] Created %s method" % (schema['resource']['method']))
 
@@ -806,7 +1403,8 @@ def generate_api_resources():
             integrationHttpMethod='POST',
             uri=uri.format(id=account_id, region=PRIMARY_REGION, func=label),
             requestTemplates=schema['request']['template'],
-            passthroughBehavior='WHEN_NO_TEMPLATES'
+            passthroughBehavior='WHEN_NO_TEMPLATES',
+            cacheKeyParameters=cache_key_parameters(schema)
         )
         logger.debug("[#] Created %s integration" % (label))
 
@@ -851,10 +1449,12 @@ def generate_api_resources():
     logger.debug("[#] Creating production deployment")
     deployment = client.create_deployment(
         restApiId=match.get('id'),
-        stageName='prod'
+        stageName=API_STAGE
     )
-    url = "https://{rest_id}.execute-api.{region}.amazonaws.com/prod/"
-    url = url.format(rest_id=match.get('id'), region=PRIMARY_REGION)
+    configure_stage_cache(client, match.get('id'), cache_ttl, cache_size)
+    url = "https://{rest_id}.execute-api.{region}.amazonaws.com/{stage}/"
+    url = url.format(rest_id=match.get('id'), region=PRIMARY_REGION,
+                     stage=API_STAGE)
     logger.debug("[#] Deployment is accessible: %s" % (url))
 
     return url
@@ -862,6 +1462,7 @@ def generate_api_resources():
 
 def remove_api_gateway():
     """Remove the Blockade REST API service."""
+    import boto3
     logger.debug("[#] Removing API Gateway")
     client = boto3.client('apigateway', region_name=PRIMARY_REGION)
     matches = [x for x in client.get_rest_apis().get('items', list())
@@ -878,8 +1479,46 @@ def remove_api_gateway():
     return response
 
 
+def teardown(s3_workers=S3_DELETE_WORKERS):
+    """Remove every resource of the Blockade node.
+
+    The bucket, tables, functions and API are removed concurrently since
+    none of them depends on another. IAM goes last, once nothing uses the
+    role anymore. A failed step does not stop the others.
+
+    :param int s3_workers: Concurrent requests used to empty the bucket
+    :return: List of (step, seconds, error) tuples
+    """
+    def timed(label, func, *args):
+        start = time.time()
+        error = None
+        try:
+            func(*args)
+        except Exception as e:
+            error = str(e)
+            logger.error("[!] %s failed: %s" % (label, error))
+        return (label, time.time() - start, error)
+
+    start = time.time()
+    steps = run_concurrently([
+        partial(timed, 'S3 bucket', remove_s3_bucket, s3_workers),
+        partial(timed, 'DynamoDB tables', remove_dynamodb_tables),
+        partial(timed, 'Lambda functions', remove_lambda_functions),
+        partial(timed, 'API Gateway', remove_api_gateway)
+    ], workers=4)
+    steps.append(timed('IAM', remove_handler))
+
+    logger.info("[#] Teardown finished in %.1fs" % (time.time() - start))
+    for label, seconds, error in steps:
+        logger.info("[#]   %-17s %6.1fs  %s" % (label, seconds,
+                                                 'failed' if error else 'ok'))
+    return steps
+
+
 def main():
     """Run along little fella."""
+    global PRIMARY_REGION
+    import requests
     parser = ArgumentParser()
     subs = parser.add_subparsers(dest='cmd')
     setup_parser = subs.add_parser('setup')
@@ -891,42 +1530,72 @@ def main():
                               help='Rollback configuration on failure')
     setup_parser.add_argument('--skip-node-setup', action='store_true',
                               help='Rollback configuration on failure')
+    setup_parser.add_argument('--event-ttl-days', type=int,
+                              help='Days events are kept, 0 keeps them '
+                                   'forever, %d by default. Records already '
+                                   'in an existing bucket only expire when '
+                                   'set' % EVENT_TTL_DAYS)
+    setup_parser.add_argument('--indicator-ttl-days', type=int,
+                              default=INDICATOR_TTL_DAYS,
+                              help='Days indicators are kept, 0 keeps them '
+                                   'forever')
+    setup_parser.add_argument('--cache-ttl', type=int, default=API_CACHE_TTL,
+                              help='Seconds GET responses are cached by API '
+                                   'Gateway, 0 disables the cache')
+    setup_parser.add_argument('--cache-size', default=API_CACHE_SIZE,
+                              choices=API_CACHE_SIZES,
+                              help='Size of the API Gateway cache in GB')
     setup_parser = subs.add_parser('teardown')
     setup_parser.add_argument('-r', '--region', default=PRIMARY_REGION,
                               help='AWS region to delete all services')
+    setup_parser.add_argument('--s3-workers', type=int,
+                              default=S3_DELETE_WORKERS,
+                              help='Concurrent requests deleting the objects '
+                                   'of the S3 bucket')
+    setup_parser.add_argument('-d', '--debug', action='store_true',
+                              help='Run in debug mode')
+    setup_parser = subs.add_parser('build')
+    setup_parser.add_argument('--check', action='store_true',
+                              help='Fail if the packaged Lambdas are out of date')
     setup_parser.add_argument('-d', '--debug', action='store_true',
                               help='Run in debug mode')
     args = parser.parse_args()
 
-    if args.region:
+    if getattr(args, 'region', None):
         if args.region not in SUPPORTED_REGIONS:
             raise Exception("INVALID_REGION: Region must be one of: %s"
                             % (', '.join(SUPPORTED_REGIONS)))
-        global PRIMARY_REGION
         PRIMARY_REGION = args.region
 
     if args.debug:
         logger.setLevel(logging.DEBUG)
 
+    if args.cmd == 'build':
+        try:
+            build_lambda_packages(check=args.check)
+        except Exception as e:
+            logger.error(str(e))
+            sys.exit(1)
+
     if args.cmd == 'setup':
+        if not 0 <= args.cache_ttl <= API_CACHE_MAX_TTL:
+            raise Exception("INVALID_CACHE_TTL: Cache TTL must be between 0 "
+                            "and %d seconds" % (API_CACHE_MAX_TTL))
+        set_ttl_days(args.event_ttl_days, args.indicator_ttl_days)
         try:
             generate_handler()
-            time.sleep(7)
-            generate_s3_bucket()
+            generate_s3_bucket(args.event_ttl_days is not None)
             generate_dynamodb_tables()
             generate_lambda_functions()
             generate_api_gateway()
             generate_admin_resource()
-            api_node = generate_api_resources()
+            api_node = generate_api_resources(args.cache_ttl,
+                                              args.cache_size)
         except Exception as e:
             logger.error(str(e))
             if args.rollback:
                 logger.info("[!] Rolling back deployed services")
-                remove_s3_bucket()
-                remove_dynamodb_tables()
-                remove_lambda_functions()
-                remove_api_gateway()
-                remove_handler()
+                teardown()
 
         if not args.skip_node_setup:
             email = input("[*] Blockade admin email: ")
@@ -955,11 +1624,9 @@ def main():
             print("For more documentation on other cloud node actions, see %s." % (CLOUD_NODE_DOCS))
 
     if args.cmd == 'teardown':
-        remove_s3_bucket()
-        remove_dynamodb_tables()
-        remove_lambda_functions()
-        remove_api_gateway()
-        remove_handler()
+        steps = teardown(args.s3_workers)
+        if any(x[2] for x in steps):
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,48 +1,158 @@
 #!/usr/bin/env python
 """Client to interact with blockade."""
+import calendar
+import csv
+import json
 import sys
 import os.path
+import time
 from argparse import ArgumentParser
+from blockade.common.cache import SubmissionCache
+from blockade.common.eventstore import EventStore
+from blockade.common.metrics import JsonLinesMetrics, StatsdMetrics
+from blockade.common.output import FORMATS, get_writer, open_output
+from blockade.common.retry import RetryPolicy
+from blockade.common.tracing import LatencySampler
 from blockade.libs.indicators import IndicatorClient
 from blockade.libs.events import EventsClient
 
 
-def process_ioc(args):
+def get_metrics(args):
+    """Build the metrics sink requested on the command line."""
+    if args.metrics_file:
+        return JsonLinesMetrics(args.metrics_file)
+    if args.statsd:
+        host, _, port = args.statsd.partition(':')
+        return StatsdMetrics(host, port or 8125)
+    return None
+
+
+def get_hooks(args):
+    """Build the request hooks requested on the command line."""
+    hooks = list()
+    if args.latency_profile:
+        hooks.append(LatencySampler(path=args.latency_profile))
+    return hooks
+
+
+def process_ioc(args, hooks=None):
     """Process actions related to the IOC switch."""
-    client = IndicatorClient.from_config()
+    client = IndicatorClient.from_config(metrics=get_metrics(args),
+                                         hooks=hooks,
+                                         retry=RetryPolicy(args.retries),
+                                         workers=args.workers,
+                                         cache=SubmissionCache(
+                                             ttl=args.cache_days * 86400))
     client.set_debug(True)
 
-    if args.get:
-        response = client.get_indicators()
-    elif args.single:
-        response = client.add_indicators(indicators=[args.single],
-                                         private=args.private, tags=args.tags)
-    else:
-        if not os.path.isfile(args.file):
-            raise Exception("File path isn't valid!")
-
-        indicators = list()
-        with open(args.file, 'r') as handle:
-            for line in handle:
-                line = line.strip()
-                if line == '':
-                    continue
-                indicators.append(line)
+    try:
+        if args.get:
+            response = client.get_indicators(tag=args.tag)
+        elif args.sync_cache:
+            response = client.sync_cache()
+        elif args.single:
+            response = client.add_indicators(indicators=[args.single],
+                                             private=args.private,
+                                             tags=args.tags, check=args.check,
+                                             ttl_days=args.ttl)
+        else:
+            if not os.path.isfile(args.file):
+                raise Exception("File path isn't valid!")
 
-        response = client.add_indicators(indicators=indicators,
-                                         private=args.private, tags=args.tags)
+            response = client.submit_file(args.file, private=args.private,
+                                          tags=args.tags, resume=args.resume,
+                                          check=args.check, ttl_days=args.ttl)
+    finally:
+        client.close()
 
     return response
 
 
-def process_events(args):
+def parse_time(value):
+    """Parse a time given on the command line.
+
+    Accepts seconds since the epoch, a date as YYYY-MM-DD[THH:MM[:SS]] in
+    UTC, or a duration back from now such as 30m, 12h or 7d.
+    """
+    if value is None:
+        return None
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if value[-1:] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError("Invalid time: %s" % value)
+
+
+def query_events(args):
+    """Answer a query from the local event store."""
+    since, until = parse_time(args.since), parse_time(args.until)
+    handle = open_output(args.output) if args.output else sys.stdout
+    try:
+        with EventStore() as store:
+            if args.top:
+                column = {'indicator': 'indicator', 'ip': 'source_ip'}
+                rows = store.top(column[args.top], args.limit, since, until)
+                write_counts(handle, args.format, args.top, rows)
+                count = len(rows)
+            else:
+                writer = get_writer(args.format, handle)
+                for event in store.events(args.indicator, args.ip, since,
+                                          until):
+                    writer.write(event)
+                writer.close()
+                count = writer.count
+    finally:
+        if args.output:
+            handle.close()
+    msg = ""
+    if args.output:
+        msg = "Wrote {} rows to {}".format(count, args.output)
+    return {'success': True, 'message': msg}
+
+
+def write_counts(handle, fmt, name, rows):
+    """Write (value, hits) rows in an output format."""
+    if fmt == 'jsonl':
+        for value, hits in rows:
+            handle.write(json.dumps({name: value, 'hits': hits}) + '\n')
+    elif fmt == 'csv':
+        writer = csv.writer(handle)
+        writer.writerow([name, 'hits'])
+        writer.writerows(rows)
+    else:
+        for value, hits in rows:
+            handle.write('{:>8}  {}\n'.format(hits, value))
+
+
+def process_events(args, hooks=None):
     """Process actions related to events switch."""
-    client = EventsClient.from_config()
-    client.set_debug(True)
-    if args.get:
-        response = client.get_events()
+    if args.action == 'query':
+        return query_events(args)
+    client = EventsClient.from_config(hooks=hooks)
+    # Request logs go to stdout, keep them out of streamed events
+    client.set_debug(not (args.get and not args.output))
+    if args.action == 'sync':
+        response = client.sync_events(limit=args.page_size)
+    elif args.action == 'stats':
+        response = client.get_event_stats(args.by, args.days, args.limit)
+    elif args.get and args.output:
+        with open_output(args.output) as handle:
+            response = client.get_events(handle, args.format, args.page_size)
+        response['message'] = "Wrote {} events to {}".format(
+            response['eventsCount'], args.output)
+    elif args.get:
+        response = client.get_events(sys.stdout, args.format,
+                                     args.page_size)
     elif args.flush:
-        response = client.flush_events()
+        response = client.flush_events(args.with_objects, args.segments)
     return response
 
 
@@ -62,12 +172,80 @@ def main():
                      with the indicators")
     ioc.add_argument('--get', '-g', action="store_true",
                      help="List indicators on the remote node")
+    ioc.add_argument('--tag',
+                     help="With --get, only list the IOCs submitted with \
+                     this tag")
+    ioc.add_argument('--sync-cache', action="store_true",
+                     help="Mirror the indicators of the remote node locally \
+                     so they are never sent again")
+    ioc.add_argument('--check', '-c', action="store_true",
+                     help="Ask the node which IOCs it already has and only \
+                     send the others")
+    ioc.add_argument('--ttl', type=int,
+                     help="Days the node keeps the IOCs before deleting \
+                     them, only shortens the node's own setting")
+    ioc.add_argument('--resume', '-r', action="store_true",
+                     help="Continue the last interrupted --file run, \
+                     retrying only its failed batches")
+    ioc.add_argument('--workers', '-w', type=int, default=1,
+                     help="Processes used to clean, whitelist and hash IOCs, \
+                     0 uses every core")
+    ioc.add_argument('--cache-days', type=int, default=90,
+                     help="Days before an IOC sent from this host may be \
+                     sent again, 0 never expires them")
+    ioc.add_argument('--retries', type=int, default=4,
+                     help="Attempts per request before a batch is counted \
+                     as failed")
+    ioc.add_argument('--metrics-file',
+                     help="Append stage and request metrics as JSON lines \
+                     to this file")
+    ioc.add_argument('--statsd',
+                     help="Send stage and request metrics to this statsd \
+                     HOST:PORT")
+    ioc.add_argument('--latency-profile',
+                     help="Write a per-endpoint latency profile to this file")
 
     events = subs.add_parser('events', help="Perform actions with Events")
+    events.add_argument('action', nargs='?',
+                        choices=['sync', 'query', 'stats'],
+                        help="Pull new events into the local store, query \
+                        the local store without contacting the node, or \
+                        get the counters kept by the node")
     events.add_argument('--get', '-g', action='store_true',
                         help="Get recent events")
     events.add_argument('--flush', '-f', action='store_true',
                         help="Flush all events from cloud node")
+    events.add_argument('--with-objects', action='store_true',
+                        help="flush: delete the events saved in S3 too")
+    events.add_argument('--segments', type=int,
+                        help="flush: parallel scans run by the node")
+    events.add_argument('--format', default='text',
+                        choices=sorted(FORMATS),
+                        help="Write events as text blocks, JSON lines or CSV")
+    events.add_argument('--output', '-o',
+                        help="Write events to this file instead of stdout")
+    events.add_argument('--page-size', type=int,
+                        default=EventsClient.PAGE_SIZE,
+                        help="Events requested from the node at once")
+    events.add_argument('--top', choices=['indicator', 'ip'],
+                        help="query: count hits per indicator or source IP")
+    events.add_argument('--limit', type=int, default=10,
+                        help="query, stats: rows listed with --top or --by")
+    events.add_argument('--by', default='indicator',
+                        choices=['indicator', 'ip', 'method', 'day', 'hour'],
+                        help="stats: count hits per indicator, source IP, \
+                        method, day or hour of the day")
+    events.add_argument('--days', type=int, default=7,
+                        help="stats: days counted, back from today")
+    events.add_argument('--indicator', help="query: events of an indicator")
+    events.add_argument('--ip', help="query: events from a source IP")
+    events.add_argument('--since',
+                        help="query: events seen from this time, as epoch \
+                        seconds, YYYY-MM-DD[THH:MM] or a duration like 24h")
+    events.add_argument('--until', help="query: events seen before this time")
+    events.add_argument('--latency-profile',
+                        help="Write a per-endpoint latency profile to this \
+                        file")
 
     args, unknown = parser.parse_known_args()
 
@@ -75,15 +253,18 @@ def main():
         if args.cmd == 'ioc':
             if (args.single and args.file):
                 raise Exception("Can't use single and file together!")
-            if (not args.single and not args.file and not args.get):
+            if (not args.single and not args.file and not args.get and
+                    not args.sync_cache):
                 ioc.print_help()
                 sys.exit(1)
-            response = process_ioc(args)
+            hooks = get_hooks(args)
+            response = process_ioc(args, hooks)
         elif args.cmd == 'events':
-            if (not args.get and not args.flush):
+            if (not args.action and not args.get and not args.flush):
                 events.print_help()
                 sys.exit(1)
-            response = process_events(args)
+            hooks = get_hooks(args)
+            response = process_events(args, hooks)
         else:
             parser.print_usage()
             sys.exit(1)
@@ -92,7 +273,10 @@ def main():
         sys.stderr.write('{}\n'.format(str(e)))
         sys.exit(1)
 
-    print(response.get('message', ''))
+    if response.get('message'):
+        print(response['message'])
+    for hook in hooks:
+        hook.write()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 """Init the configuration for the toolset."""
 import json
-import requests
 from blockade.config import Config
 from argparse import ArgumentParser
 from datetime import datetime
@@ -16,6 +15,7 @@ def show_config(config):
 
 def create_cloud_user(cfg, args):
     """Attempt to create the user on the cloud node."""
+    import requests
     url = cfg['api_server'] + "admin/add-user"
     params = {'user_email': args.user_email, 'user_name': args.user_name,
               'user_role': args.user_role, 'email': cfg['email'],
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Run a local emulated cloud node for offline testing."""
+import time
+from argparse import ArgumentParser
+from blockade.aws.emulator import NodeEmulator
+
+
+def main():
+    """Run the emulator until interrupted."""
+    parser = ArgumentParser(description="Blockade cloud node emulator")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Interface to listen on')
+    parser.add_argument('--port', '-p', type=int, default=8080,
+                        help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of latency added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Maximum random seconds added to the latency')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Requests per second allowed before throttling')
+    parser.add_argument('--burst', type=int, default=None,
+                        help='Requests allowed in a burst above the rate')
+    parser.add_argument('--no-compression', action='store_true',
+                        help='Do not accept or send compressed bodies')
+    parser.add_argument('--admin-email', default='admin@localhost',
+                        help='Email of the admin created at startup')
+    parser.add_argument('--admin-name', default='Emulator Admin',
+                        help='Name of the admin created at startup')
+    args = parser.parse_args()
+
+    kwargs = dict()
+    if args.no_compression:
+        kwargs['compression_size'] = None
+    emulator = NodeEmulator(latency=args.latency, jitter=args.jitter,
+                            rate=args.rate, burst=args.burst, **kwargs)
+    api_node = emulator.start(args.host, args.port)
+    admin = emulator.add_admin(args.admin_email, args.admin_name)
+    print("---------------------------------------------------------------------------")
+    print("Blockade Server: %s" % api_node)
+    print("Blockade Admin: %s" % admin['email'])
+    print("Blockade API Key: %s" % admin['api_key'])
+    print("---------------------------------------------------------------------------")
+    print("Quick Config: blockade-cfg setup %s %s --api-node=%s"
+          % (admin['email'], admin['api_key'], api_node))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
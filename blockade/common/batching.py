@@ -0,0 +1,76 @@
+"""Adaptive batching of indicators sent to the cloud node."""
+
+# JSON quoting and separator bytes added around every serialised string.
+ITEM_OVERHEAD = 4
+
+
+class AdaptiveBatcher(object):
+
+    """Size batches by payload bytes and adapt them to the node.
+
+    Batches never exceed the byte budget. Within that budget the number of
+    items grows while the node answers well under the target latency and
+    shrinks when it gets slow, throttles or fails, so each round trip
+    carries as much as the node can absorb within its timeout.
+    """
+
+    def __init__(self, max_bytes=256 * 1024, target_latency=1.5,
+                 initial_size=100, min_size=10, max_size=5000):
+        """Setup the batcher.
+
+        :param int max_bytes: Upper bound of the serialised indicators in a
+                              batch, well below the API Gateway payload limit
+        :param float target_latency: Round trip time to aim for in seconds,
+                                     half of the default Lambda timeout
+        :param int initial_size: Items in the first batch
+        :param int min_size: Smallest batch size
+        :param int max_size: Largest batch size
+        """
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(max_size, initial_size))
+
+    def batches(self, values):
+        """Slice values into batches, following the current batch size.
+
+        The size is read again for every batch, so feedback given through
+        record() applies to the next batch.
+
+        :param list values: Items to slice
+        :return: Generator of lists
+        """
+        start = 0
+        while start < len(values):
+            end = start
+            budget = self.max_bytes
+            limit = min(len(values), start + self.size)
+            while end < limit:
+                cost = len(values[end]) + ITEM_OVERHEAD
+                if cost > budget and end > start:
+                    break
+                budget -= cost
+                end += 1
+            yield values[start:end]
+            start = end
+
+    def record(self, latency, success=True, congested=False):
+        """Adapt the batch size to the outcome of a batch.
+
+        :param float latency: Round trip time of the batch in seconds
+        :param bool success: Whether the node accepted the batch
+        :param bool congested: Whether the node throttled or had to be
+                               retried while handling the batch
+        :return: New batch size
+        """
+        if congested or not success:
+            size = self.size // 2
+        elif latency < self.target_latency / 2:
+            size = int(self.size * 1.5) + 1
+        elif latency > self.target_latency:
+            size = int(self.size * self.target_latency / latency)
+        else:
+            size = self.size
+        self.size = max(self.min_size, min(self.max_size, size))
+        return self.size
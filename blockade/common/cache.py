@@ -0,0 +1,217 @@
+"""Cache of the indicators already submitted from this host."""
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from blockade.common.utils import digest_values
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CACHE_PATH = os.path.expanduser('~/.config/blockade/cache.txt')
+DEFAULT_TTL = 90 * 24 * 60 * 60
+
+
+class SubmissionCache(object):
+
+    """Append-only log of submitted indicator hashes, shared by processes.
+
+    Every line holds an MD5, the time it was sent and, for indicators the
+    node keeps for a limited time, the time they expire there. Writers
+    append under an exclusive lock and readers only parse what was appended
+    since their last read. Entries older than the TTL or expired on the
+    node are ignored, and the log is rewritten without duplicates or
+    expired entries once it grows to twice the live entries. Lines without
+    a time, from older releases, are kept and dated at the next compaction.
+
+    Locks are taken with flock on a side file. Without fcntl (Windows)
+    the cache still works but concurrent writers are not serialised.
+    """
+
+    COMPACT_MIN_LINES = 10000
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        """Setup the cache.
+
+        :param str path: Log file, ~/.config/blockade/cache.txt by default
+        :param int ttl: Seconds an entry stays valid, None keeps them forever
+        """
+        self.path = path or CACHE_PATH
+        self.lock_path = self.path + '.lock'
+        self.ttl = ttl
+        self.entries = dict()
+        self.expiry = dict()
+        self._identity = None
+        self._offset = 0
+        self._lines = 0
+        self._oldest = None
+
+    @contextmanager
+    def _lock(self, exclusive):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.lock_path, 'a') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX if exclusive
+                            else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _reset(self, identity=None):
+        self.entries = dict()
+        self.expiry = dict()
+        self._identity = identity
+        self._offset = 0
+        self._lines = 0
+        self._oldest = None
+
+    def _refresh(self):
+        """Parse the lines appended since the last read, under a lock."""
+        try:
+            handle = open(self.path, 'rb')
+        except IOError:
+            self._reset()
+            return
+        with handle:
+            stat = os.fstat(handle.fileno())
+            identity = (stat.st_ino, handle.readline())
+            if identity != self._identity or stat.st_size < self._offset:
+                # Replaced by a compaction since the last read
+                self._reset(identity)
+            handle.seek(self._offset)
+            data = handle.read()
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        now = time.time()
+        for line in data[:end].decode('utf-8').splitlines():
+            fields = line.strip().split('\t')
+            if not fields[0] or fields[0].startswith('#'):
+                continue
+            try:
+                sent = float(fields[1]) if len(fields) > 1 else now
+                expires = float(fields[2]) if len(fields) > 2 else None
+            except ValueError:
+                continue
+            self._lines += 1
+            if sent > self.entries.get(fields[0], 0):
+                self._set(fields[0], sent, expires)
+            if self._oldest is None or sent < self._oldest:
+                self._oldest = sent
+
+    def _set(self, key, sent, expires):
+        self.entries[key] = sent
+        if expires:
+            self.expiry[key] = expires
+        else:
+            self.expiry.pop(key, None)
+
+    def _fresh(self, key, now):
+        sent = self.entries.get(key)
+        if sent is None:
+            return False
+        if self.ttl and now - sent >= self.ttl:
+            return False
+        return now < self.expiry.get(key, now + 1)
+
+    def _line(self, key):
+        expires = self.expiry.get(key)
+        if expires:
+            return '%s\t%d\t%d\n' % (key, self.entries[key], expires)
+        return '%s\t%d\n' % (key, self.entries[key])
+
+    def prune(self, values, hashed=None):
+        """Remove the values that were submitted within the TTL.
+
+        :param list values: Indicators in clear or hashed
+        :param list hashed: MD5 of every value, computed if missing
+        :return: List of the values not found in the cache
+        """
+        if hashed is None:
+            hashed = digest_values(values, keep_hashed=True)['md5']
+        with self._lock(False):
+            self._refresh()
+        now = time.time()
+        return [x for x, key in zip(values, hashed)
+                if not self._fresh(key, now)]
+
+    def add(self, values, hashed=None, expires=None):
+        """Record values as submitted.
+
+        :param list values: Indicators in clear or hashed
+        :param list hashed: MD5 of every value, computed if missing
+        :param int expires: Time the node deletes the values, if it does
+        :return: Number of entries appended to the log
+        """
+        if hashed is None:
+            hashed = digest_values(values, keep_hashed=True)['md5']
+        with self._lock(True):
+            self._refresh()
+            now = time.time()
+            added = list()
+            for key in hashed:
+                if self._fresh(key, now):
+                    continue
+                self._set(key, now, expires)
+                added.append(key)
+            if added:
+                self._drop_torn_tail()
+                with open(self.path, 'a') as handle:
+                    handle.write(''.join(self._line(x) for x in added))
+                if self._identity is None:
+                    self._refresh()  # The log was just created
+                else:
+                    self._offset = os.path.getsize(self.path)
+                    self._lines += len(added)
+            if self._should_compact(now):
+                self._compact(now)
+        return len(added)
+
+    def _drop_torn_tail(self):
+        """Truncate a line left incomplete by a writer that was killed.
+
+        Only called under the write lock, after a refresh: no writer is
+        running, so anything past the last complete line is torn.
+        """
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+        except OSError:
+            return
+        with open(self.path, 'r+b') as handle:
+            handle.truncate(self._offset)
+
+    def _should_compact(self, now):
+        if self._lines < self.COMPACT_MIN_LINES:
+            return False
+        if self._lines > 2 * len(self.entries):
+            return True
+        return bool(self.ttl and self._oldest and
+                    now - self._oldest >= self.ttl)
+
+    def _compact(self, now):
+        """Rewrite the log with its live entries, under the write lock."""
+        live = [k for k in self.entries if self._fresh(k, now)]
+        partial = self.path + '.compact'
+        with open(partial, 'w') as handle:
+            handle.write('# blockade cache %s\n' % uuid.uuid4().hex)
+            for key in sorted(live, key=self.entries.get):
+                handle.write(self._line(key))
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(partial, self.path)
+        self._reset()
+        self._refresh()
+
+    def compact(self):
+        """Drop duplicate and expired entries from the log."""
+        with self._lock(True):
+            self._refresh()
+            self._compact(time.time())
+        return len(self.entries)
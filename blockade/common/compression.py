@@ -0,0 +1,62 @@
+"""Content encodings understood by the client and the cloud node."""
+import zlib
+
+# Bodies smaller than this are sent as-is, compressing them saves nothing.
+MINIMUM_COMPRESSION_SIZE = 1024
+ENCODINGS = ('gzip', 'deflate')
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def compress(data, encoding='gzip', level=6):
+    """Compress a body for the given Content-Encoding.
+
+    :param bytes data: Body to compress
+    :param str encoding: gzip or deflate
+    :param int level: zlib compression level
+    :return: Compressed bytes
+    """
+    if encoding not in _WBITS:
+        raise ValueError("Unsupported content encoding: %s" % encoding)
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding):
+    """Decompress a body sent with the given Content-Encoding.
+
+    :param bytes data: Compressed body
+    :param str encoding: gzip, deflate or identity
+    :return: Decompressed bytes
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        return data
+    if encoding not in _WBITS:
+        raise ValueError("Unsupported content encoding: %s" % encoding)
+    return zlib.decompress(data, _WBITS[encoding])
+
+
+def accepted_encoding(header):
+    """Pick the encoding to answer with from an Accept-Encoding header.
+
+    :param str header: Accept-Encoding header of the request
+    :return: gzip, deflate or None when neither is accepted
+    """
+    accepted = dict()
+    for part in (header or '').split(','):
+        fields = part.strip().split(';')
+        name = fields[0].strip().lower()
+        quality = 1.0
+        for field in fields[1:]:
+            if field.strip().startswith('q='):
+                try:
+                    quality = float(field.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
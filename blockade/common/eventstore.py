@@ -0,0 +1,206 @@
+"""Local copy of the events stored on the cloud node."""
+import json
+import os
+import sqlite3
+
+from blockade.common.output import flatten_event
+
+STORE_PATH = os.path.expanduser('~/.config/blockade/events.db')
+# Seconds of events pulled again on every sync, in case some were still
+# being written on the node during the previous one.
+SYNC_OVERLAP = 300
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS events (
+        event TEXT PRIMARY KEY,
+        indicator TEXT,
+        source_ip TEXT,
+        seen_at REAL,
+        stored_at INTEGER,
+        data TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS events_indicator ON events "
+    "(indicator, seen_at)",
+    "CREATE INDEX IF NOT EXISTS events_source_ip ON events "
+    "(source_ip, seen_at)",
+    "CREATE INDEX IF NOT EXISTS events_seen_at ON events (seen_at)",
+    """CREATE TABLE IF NOT EXISTS sync (
+        name TEXT PRIMARY KEY,
+        value INTEGER
+    )"""
+]
+
+
+def stored_time(event):
+    """Time the node stored an event, 0 for events of older releases.
+
+    :param dict event: Event as returned by the node
+    :return: Integer seconds since the epoch
+    """
+    stored = event.get('storedAt')
+    if isinstance(stored, (int, float)):
+        return int(stored)
+    return 0
+
+
+def event_time(event):
+    """Time an event was seen, in seconds since the epoch.
+
+    The time recorded by the browser is used when present, in milliseconds
+    or seconds, then the time the node stored the event.
+
+    :param dict event: Event as returned by the node
+    :return: Float or None
+    """
+    metadata = event.get('metadata')
+    if not isinstance(metadata, dict):
+        metadata = dict()
+    for value in (metadata.get('timeStamp'), event.get('storedAt')):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 1e11:
+            value /= 1000.0
+        return value
+    return None
+
+
+class EventStore(object):
+
+    """SQLite database of events, indexed by indicator, source IP and time.
+
+    Events are keyed by the hash the node gives them, so pulling the same
+    event twice stores it once.
+    """
+
+    def __init__(self, path=None):
+        """Setup the store.
+
+        :param str path: Database file, ~/.config/blockade/events.db by
+                         default
+        """
+        self.path = path or STORE_PATH
+        self.db = None
+
+    def open(self):
+        """Open the database, creating it if needed."""
+        if self.db is not None:
+            return self.db
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(self.path)
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+        return self.db
+
+    def close(self):
+        """Close the database."""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.open().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    @property
+    def last_stored(self):
+        """Latest node time of the events synced so far, 0 if none."""
+        row = self.open().execute(
+            "SELECT value FROM sync WHERE name = 'last_stored'").fetchone()
+        return row[0] if row else 0
+
+    @last_stored.setter
+    def last_stored(self, value):
+        db = self.open()
+        db.execute("INSERT OR REPLACE INTO sync VALUES ('last_stored', ?)",
+                   (value,))
+        db.commit()
+
+    def sync_since(self):
+        """Node time to ask for events from, on the next sync."""
+        last = self.last_stored
+        return max(0, last - SYNC_OVERLAP) if last else 0
+
+    def add(self, events):
+        """Store a page of events.
+
+        The sync watermark is left alone: pages of a scan come in no
+        particular order, so it can only move once the whole scan is in.
+
+        :param list events: Events as returned by the node
+        :return: Number of events that were not stored yet
+        """
+        db = self.open()
+        rows = list()
+        for event in events:
+            fields = flatten_event(event)
+            stored = event.get('storedAt')
+            data = json.dumps(event, sort_keys=True)
+            rows.append((event.get('event') or data, fields['match'] or None,
+                         fields['ip'] or None, event_time(event), stored,
+                         data))
+        before = db.total_changes
+        db.executemany('INSERT OR IGNORE INTO events '
+                       'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        added = db.total_changes - before
+        db.commit()
+        return added
+
+    def _window(self, since=None, until=None, **columns):
+        clauses, params = list(), list()
+        for name, value in sorted(columns.items()):
+            if value is not None:
+                clauses.append('%s = ?' % name)
+                params.append(value)
+        if since is not None:
+            clauses.append('seen_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('seen_at < ?')
+            params.append(until)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return where, params
+
+    def events(self, indicator=None, source_ip=None, since=None, until=None):
+        """Iterate over the stored events, oldest first.
+
+        :param str indicator: Only events matching this indicator
+        :param str source_ip: Only events sent from this address
+        :param float since: Only events seen at or after this time
+        :param float until: Only events seen before this time
+        :return: Generator of events
+        """
+        where, params = self._window(since, until, indicator=indicator,
+                                     source_ip=source_ip)
+        cursor = self.open().execute(
+            'SELECT data FROM events%s ORDER BY seen_at' % where, params)
+        for row in cursor:
+            yield json.loads(row[0])
+
+    def top(self, column, limit=10, since=None, until=None):
+        """Count the events per indicator or source IP.
+
+        :param str column: indicator or source_ip
+        :param int limit: Number of rows returned
+        :param float since: Only events seen at or after this time
+        :param float until: Only events seen before this time
+        :return: List of (value, hits) tuples, most hits first
+        """
+        if column not in ('indicator', 'source_ip'):
+            raise ValueError("Can't count events by %s" % column)
+        where, params = self._window(since, until)
+        query = ('SELECT %s, COUNT(*) AS hits FROM events%s GROUP BY %s '
+                 'ORDER BY hits DESC, %s LIMIT ?' % (column, where, column,
+                                                    column))
+        return self.open().execute(query, params + [limit]).fetchall()
@@ -0,0 +1,141 @@
+"""Checkpoint journal allowing long submissions to be resumed."""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+JOURNAL_PATH = os.path.expanduser('~/.config/blockade/journals')
+
+
+class SubmissionJournal(object):
+
+    """Append-only record of the progress of a file submission.
+
+    The journal stores the offset of the input that has been fully processed
+    and the outcome of every batch. Failed batches keep their payload so a
+    resumed run can re-queue them without reading the input again.
+    """
+
+    def __init__(self, source, path=None):
+        """Setup the journal for an input file.
+
+        :param str source: Path of the file being submitted
+        :param str path: Journal file, derived from the source by default
+        """
+        self.source = os.path.abspath(source)
+        if not path:
+            name = hashlib.sha1(self.source.encode('utf-8')).hexdigest()
+            path = os.path.join(JOURNAL_PATH, '%s.jsonl' % name)
+        self.path = path
+        self.offset = 0
+        self.next_batch = 0
+        self.pending = OrderedDict()
+        self.handle = None
+
+    def _fingerprint(self):
+        stat = os.stat(self.source)
+        return {'source': self.source, 'size': stat.st_size,
+                'mtime': int(stat.st_mtime)}
+
+    def _write(self, record):
+        self.handle.write(json.dumps(record, sort_keys=True) + "\n")
+        self.handle.flush()
+
+    def load(self):
+        """Load the state of a previous run of the same, unchanged input.
+
+        :return: True if the previous run can be resumed
+        """
+        if not os.path.isfile(self.path):
+            return False
+        with open(self.path, 'rb') as handle:
+            data = handle.read()
+        records = list()
+        complete = 0
+        for line in data.splitlines(True):
+            if not line.endswith(b'\n'):
+                break  # Torn write from an interrupted run
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                break
+            complete += len(line)
+        if not records or records[0].get('type') != 'start':
+            return False
+        header = dict(records[0])
+        header.pop('type')
+        if header != self._fingerprint():
+            return False
+        for record in records[1:]:
+            if record['type'] == 'checkpoint':
+                self.offset = record['offset']
+            elif record['type'] == 'batch':
+                self.next_batch = max(self.next_batch, record['id'] + 1)
+                if record['status'] == 'failure':
+                    self.pending[record['id']] = record
+                else:
+                    self.pending.pop(record['id'], None)
+        if complete < len(data):
+            self._drop_torn_tail(complete)
+        self.handle = open(self.path, 'a')
+        return True
+
+    def _drop_torn_tail(self, size):
+        """Truncate the journal to its last complete record.
+
+        Records appended after a torn line would be lost on the next load.
+
+        :param int size: Bytes of the complete records
+        """
+        with open(self.path, 'r+b') as handle:
+            handle.truncate(size)
+
+    def start(self):
+        """Start a new journal, discarding any previous run."""
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        self.offset = 0
+        self.next_batch = 0
+        self.pending = OrderedDict()
+        self.handle = open(self.path, 'w')
+        record = {'type': 'start'}
+        record.update(self._fingerprint())
+        self._write(record)
+
+    def record_batch(self, indicators, tags, success, batch_id=None):
+        """Record the outcome of a batch.
+
+        :param list indicators: Indicators sent in the batch
+        :param list tags: Tags sent with the batch
+        :param bool success: Whether the node accepted the batch
+        :param int batch_id: ID of a re-queued batch, new batches get one
+        :return: ID of the batch
+        """
+        if batch_id is None:
+            batch_id = self.next_batch
+            self.next_batch += 1
+        record = {'type': 'batch', 'id': batch_id,
+                  'status': 'success' if success else 'failure'}
+        if success:
+            self.pending.pop(batch_id, None)
+        else:
+            record.update({'indicators': indicators, 'tags': tags})
+            self.pending[batch_id] = record
+        self._write(record)
+        return batch_id
+
+    def checkpoint(self, offset):
+        """Record that the input was fully processed up to an offset.
+
+        :param int offset: Offset in the input file
+        """
+        self.offset = offset
+        self._write({'type': 'checkpoint', 'offset': offset})
+
+    def close(self):
+        """Close the journal, removing it once nothing is left to retry."""
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+        if not self.pending and os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,174 @@
+"""Metric sinks used to instrument the clients."""
+import json
+import socket
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(object):
+
+    """Sink that drops every metric; subclasses send them somewhere."""
+
+    def timing(self, name, seconds):
+        """Record a duration in seconds."""
+        pass
+
+    def incr(self, name, count=1):
+        """Increment a counter."""
+        pass
+
+    def gauge(self, name, value):
+        """Record the current value of something."""
+        pass
+
+
+class JsonLinesMetrics(Metrics):
+
+    """Sink writing every metric as a JSON line."""
+
+    def __init__(self, stream):
+        """Setup the sink.
+
+        :param stream: File path or file-like object to write to
+        """
+        if not hasattr(stream, 'write'):
+            stream = open(stream, 'a')
+        self.stream = stream
+
+    def _emit(self, kind, name, value):
+        line = {'time': time.time(), 'type': kind, 'metric': name,
+                'value': value}
+        self.stream.write(json.dumps(line, sort_keys=True) + "\n")
+        self.stream.flush()
+
+    def timing(self, name, seconds):
+        """Record a duration in seconds."""
+        self._emit('timing', name, seconds)
+
+    def incr(self, name, count=1):
+        """Increment a counter."""
+        self._emit('counter', name, count)
+
+    def gauge(self, name, value):
+        """Record the current value of something."""
+        self._emit('gauge', name, value)
+
+
+class StatsdMetrics(Metrics):
+
+    """Sink sending metrics to a statsd daemon over UDP."""
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='blockade'):
+        """Setup the sink.
+
+        :param str host: Hostname of the statsd daemon
+        :param int port: Port of the statsd daemon
+        :param str prefix: Prefix added to every metric name
+        """
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, name, value, kind):
+        data = "%s.%s:%s|%s" % (self.prefix, name, value, kind)
+        try:
+            self.sock.sendto(data.encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+    def timing(self, name, seconds):
+        """Record a duration in seconds."""
+        self._send(name, int(round(seconds * 1000)), 'ms')
+
+    def incr(self, name, count=1):
+        """Increment a counter."""
+        self._send(name, count, 'c')
+
+    def gauge(self, name, value):
+        """Record the current value of something."""
+        self._send(name, value, 'g')
+
+
+class MetricsRecorder(Metrics):
+
+    """Aggregate metrics locally while forwarding them to a sink."""
+
+    def __init__(self, sink=None):
+        """Setup the recorder.
+
+        :param sink: Metrics sink to forward to, defaults to a no-op sink
+        """
+        self.sink = sink or Metrics()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.timings = dict()
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+
+    def timing(self, name, seconds):
+        """Record a duration in seconds."""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.sink.timing(name, seconds)
+
+    def incr(self, name, count=1):
+        """Increment a counter."""
+        self.counters[name] = self.counters.get(name, 0) + count
+        self.sink.incr(name, count)
+
+    def gauge(self, name, value):
+        """Record the current value of something."""
+        self.gauges[name] = value
+        self.sink.gauge(name, value)
+
+    def observe(self, name, seconds):
+        """Record a duration into a latency histogram.
+
+        :param str name: Metric name
+        :param float seconds: Observed duration
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.histograms[name] = histogram
+        idx = 0
+        while idx < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[idx]:
+            idx += 1
+        histogram[idx] += 1
+        self.timing(name, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as a pipeline stage.
+
+        :param str name: Stage name, recorded as ``stage.<name>``
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timing('stage.%s' % name, time.time() - start)
+
+    def stage_timings(self):
+        """Get the duration of every recorded stage.
+
+        :return: Dict of stage name to seconds
+        """
+        return dict((k[6:], round(v, 6)) for k, v in self.timings.items()
+                    if k.startswith('stage.'))
+
+    def histogram(self, name):
+        """Get a latency histogram keyed by bucket label.
+
+        :param str name: Metric name
+        :return: Dict of bucket label to count
+        """
+        counts = self.histograms.get(name, [0] * (len(LATENCY_BUCKETS) + 1))
+        labels = ['<=%gs' % x for x in LATENCY_BUCKETS]
+        labels.append('>%gs' % LATENCY_BUCKETS[-1])
+        return dict(zip(labels, counts))
@@ -0,0 +1,155 @@
+"""Local mirror of the indicators stored on the cloud node."""
+import binascii
+import bisect
+import os
+import struct
+import time
+
+from blockade.common.utils import digest_values
+
+MIRROR_PATH = os.path.expanduser('~/.config/blockade/indicators.idx')
+MAGIC = b'BLOCKADE-IDX2\n'
+# Time of the sync, the digests follow
+HEADER = struct.Struct('>Q')
+HEADER_SIZE = len(MAGIC) + HEADER.size
+EMPTY = MAGIC + HEADER.pack(0)
+DIGEST_SIZE = 16
+MAX_AGE = 7 * 24 * 60 * 60
+
+
+class _DigestView(object):
+
+    """Sequence view over packed digests, so bisect can search them."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return (len(self.data) - HEADER_SIZE) // DIGEST_SIZE
+
+    def __getitem__(self, idx):
+        start = HEADER_SIZE + idx * DIGEST_SIZE
+        return self.data[start:start + DIGEST_SIZE]
+
+
+def digests(values):
+    """Binary MD5 digests of indicators, as the node stores them.
+
+    :param values: Iterable of indicators in clear or hashed
+    :return: List of 16 bytes digests
+    """
+    return digest_values(values, binary=True, keep_hashed=True)['md5']
+
+
+class IndicatorMirror(object):
+
+    """Sorted array of the MD5 digests of every indicator on the node.
+
+    Each indicator takes 16 bytes and lookups are a binary search, so a
+    million indicators fit in 16MB and are checked without false positives.
+
+    Indicators expire on the node, so a mirror is only used for max_age
+    seconds after its sync, and the sync leaves out the indicators that
+    expire before then.
+    """
+
+    def __init__(self, path=None, max_age=MAX_AGE):
+        """Setup the mirror.
+
+        :param str path: Mirror file, ~/.config/blockade/indicators.idx by
+                         default
+        :param int max_age: Seconds a sync stays valid
+        """
+        self.path = path or MIRROR_PATH
+        self.max_age = max_age
+        self.digests = _DigestView(EMPTY)
+        self.synced = 0
+        self.mtime = None
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __contains__(self, value):
+        return self._contains(digests([value])[0])
+
+    def _contains(self, key):
+        idx = bisect.bisect_left(self.digests, key)
+        return idx < len(self.digests) and self.digests[idx] == key
+
+    @property
+    def expires(self):
+        """Time after which the mirror must be synced again."""
+        return self.synced + self.max_age
+
+    def _clear(self):
+        self.digests, self.synced, self.mtime = _DigestView(EMPTY), 0, None
+
+    def load(self):
+        """Load the mirror file, unless it is already loaded and unchanged.
+
+        Mirrors older than max_age, or written by an older release, are
+        ignored until the next sync.
+
+        :return: True if a current mirror is available
+        """
+        if not os.path.isfile(self.path):
+            self._clear()
+            return False
+        mtime = os.path.getmtime(self.path)
+        if mtime != self.mtime:
+            with open(self.path, 'rb') as handle:
+                data = handle.read()
+            if not data.startswith(MAGIC):
+                self._clear()
+                if data.startswith(MAGIC[:-2]):
+                    return False
+                raise ValueError("%s is not an indicator mirror" % self.path)
+            self.synced = HEADER.unpack_from(data, len(MAGIC))[0]
+            self.digests, self.mtime = _DigestView(data), mtime
+        if time.time() >= self.expires:
+            self._clear()
+            return False
+        return True
+
+    def save(self, indicators, synced=None):
+        """Replace the mirror with a new set of indicators.
+
+        The file is written next to the old one and renamed over it, so an
+        interrupted sync leaves the previous mirror intact.
+
+        :param indicators: Iterable of indicators in clear or hashed
+        :param int synced: Time the node was read, now by default
+        :return: Number of distinct indicators saved
+        """
+        if synced is None:
+            synced = time.time()
+        packed = sorted(set(digests(indicators)))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        partial = self.path + '.partial'
+        with open(partial, 'wb') as handle:
+            handle.write(MAGIC)
+            handle.write(HEADER.pack(int(synced)))
+            handle.write(b''.join(packed))
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(partial, self.path)
+        self.mtime = None
+        self.load()
+        return len(packed)
+
+    def prune(self, values, hashed=None):
+        """Remove the values already present on the node.
+
+        :param list values: Indicators in clear or hashed
+        :param list hashed: Hex MD5 of every value, computed if missing
+        :return: List of the values missing from the mirror
+        """
+        if not len(self.digests):
+            return values
+        if hashed is None:
+            keys = digests(values)
+        else:
+            keys = [binascii.unhexlify(x) for x in hashed]
+        return [x for x, key in zip(values, keys) if not self._contains(key)]
@@ -0,0 +1,139 @@
+"""Streamed writers for events pulled from the cloud node."""
+import abc
+import csv
+import io
+import json
+import sys
+
+# Columns shown for every event, with their label in the text format.
+EVENT_FIELDS = [('ip', 'Source IP'), ('time', 'Datetime'),
+                ('match', 'Indicator'), ('method', 'Method'), ('url', 'URL'),
+                ('type', 'Request Type'), ('userAgent', 'User-Agent'),
+                ('contact', 'Contact')]
+
+# Attributes the node stores under a different name than the column.
+STORED_NAMES = {'ip': 'sourceIp', 'time': 'analysisTime',
+                'match': 'indicatorMatch'}
+
+
+def flatten_event(event):
+    """Map a stored event to the columns of EVENT_FIELDS.
+
+    Values are looked up on the event first, then under the name the node
+    stores them with and finally in the event metadata.
+
+    :param dict event: Event as returned by the node
+    :return: Dict of column to value, empty for missing values
+    """
+    metadata = event.get('metadata')
+    if not isinstance(metadata, dict):
+        metadata = dict()
+    output = dict()
+    for name, _ in EVENT_FIELDS:
+        value = event.get(name)
+        if value is None and name in STORED_NAMES:
+            value = event.get(STORED_NAMES[name])
+        if value is None:
+            value = metadata.get(name)
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, sort_keys=True)
+        output[name] = '' if value is None else value
+    return output
+
+
+# Base class with ABCMeta as metaclass, under Python 2 and 3 alike.
+_Abstract = abc.ABCMeta('_Abstract', (object,), {})
+
+
+class EventWriter(_Abstract):
+
+    """Write events to a file object one at a time.
+
+    Nothing is buffered besides what the file object itself keeps, so any
+    number of events is written in constant memory. Formats subclass it
+    and implement _write.
+    """
+
+    def __init__(self, handle):
+        """Setup the writer.
+
+        :param handle: File object opened for writing text
+        """
+        self.handle = handle
+        self.count = 0
+
+    def write(self, event):
+        """Write a single event."""
+        self._write(event)
+        self.count += 1
+
+    @abc.abstractmethod
+    def _write(self, event):
+        """Format a single event into the file object."""
+
+    def close(self):
+        """Flush the output, the file object is left open."""
+        self.handle.flush()
+
+
+class TextWriter(EventWriter):
+
+    """Human readable blocks, one line per field."""
+
+    TEMPLATE = ''.join('%s: {%s}\n' % (label, name)
+                       for name, label in EVENT_FIELDS) + '\n'
+
+    def _write(self, event):
+        self.handle.write(self.TEMPLATE.format(**flatten_event(event)))
+
+
+class JsonLinesWriter(EventWriter):
+
+    """Complete events as JSON, one per line."""
+
+    def _write(self, event):
+        self.handle.write(json.dumps(event, sort_keys=True, default=str))
+        self.handle.write('\n')
+
+
+class CsvWriter(EventWriter):
+
+    """CSV with a header row and the columns of EVENT_FIELDS."""
+
+    def __init__(self, handle):
+        super(CsvWriter, self).__init__(handle)
+        self.writer = csv.DictWriter(handle, [x[0] for x in EVENT_FIELDS])
+        self.writer.writeheader()
+
+    def _write(self, event):
+        self.writer.writerow(flatten_event(event))
+
+
+FORMATS = {'text': TextWriter, 'jsonl': JsonLinesWriter, 'csv': CsvWriter}
+
+
+def get_writer(fmt, handle):
+    """Build the writer for an output format.
+
+    :param str fmt: One of text, jsonl or csv
+    :param handle: File object opened for writing text
+    :return: EventWriter instance
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Unknown output format %s, use one of %s"
+                         % (fmt, ', '.join(sorted(FORMATS))))
+    return FORMATS[fmt](handle)
+
+
+def open_output(path):
+    """Open a file the writers can write to, CSV included.
+
+    The csv module handles line endings itself, so the file is opened
+    without newline translation.
+
+    :param str path: File to create or overwrite
+    :return: File object opened for writing text
+    """
+    if sys.version_info[0] < 3:
+        return open(path, 'wb')
+    return io.open(path, 'w', newline='')
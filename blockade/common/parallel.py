@@ -0,0 +1,118 @@
+"""Multi-core preprocessing of large indicator feeds."""
+import multiprocessing
+from collections import OrderedDict
+
+from blockade.common.utils import (clean_indicator, digest_values,
+                                   load_whitelists)
+
+# Reference data installed in every worker by _init_worker.
+_WORKER = dict()
+
+
+def _init_worker(whitelisted, extract):
+    """Install the whitelist and suffix data in a worker.
+
+    With the fork start method these are inherited from the parent without
+    being copied or loaded again.
+    """
+    _WORKER['whitelisted'] = whitelisted
+    _WORKER['extract'] = extract
+
+
+def process_shard(values, whitelisted=None, extract=None):
+    """Clean, whitelist and hash a shard of the input.
+
+    :param list values: Raw indicators
+    :param whitelisted: Set of whitelisted registered domains
+    :param extract: tldextract.TLDExtract instance
+    :return: List of (indicator, md5) tuples, in input order and without
+             duplicates
+    """
+    if whitelisted is None:
+        whitelisted = _WORKER['whitelisted']
+    if extract is None:
+        extract = _WORKER['extract']
+    seen = set()
+    output = list()
+    for value in values:
+        indicator = clean_indicator(value)
+        if indicator in seen:
+            continue
+        seen.add(indicator)
+        if extract(indicator).registered_domain in whitelisted:
+            continue
+        output.append(indicator)
+    hashed = digest_values(output, keep_hashed=True)['md5']
+    return list(zip(output, hashed))
+
+
+class Preprocessor(object):
+
+    """Shard indicators across worker processes and merge the results.
+
+    The whitelist and the public suffix list are loaded once in the parent
+    and shared with the workers. Results are merged in input order and
+    deduplicated across shards, so the output does not depend on the number
+    of workers.
+    """
+
+    def __init__(self, workers=None, whitelisted=None, shard_size=None):
+        """Setup the preprocessor.
+
+        :param int workers: Worker processes, one per core by default
+        :param whitelisted: Set of whitelisted registered domains, loaded
+                            from the configuration directory by default
+        :param int shard_size: Indicators per shard, derived from the input
+                               size by default
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.whitelisted = whitelisted
+        self.shard_size = shard_size
+        self.extract = None
+        self.pool = None
+
+    def _start(self):
+        import tldextract
+        if self.whitelisted is None:
+            self.whitelisted = load_whitelists()
+        extract = tldextract.TLDExtract()
+        extract('example.com')  # Load the suffix list before forking
+        self.extract = extract
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(
+                self.workers, _init_worker, (self.whitelisted, extract))
+
+    def run(self, values):
+        """Clean, whitelist and hash indicators.
+
+        :param list values: Raw indicators
+        :return: OrderedDict mapping each kept indicator to its MD5
+        """
+        if self.extract is None:
+            self._start()
+        output = OrderedDict()
+        if self.pool is None:
+            output.update(process_shard(values, self.whitelisted,
+                                        self.extract))
+            return output
+        size = self.shard_size or max(1000, len(values) // (self.workers * 4))
+        shards = (values[x:x + size] for x in range(0, len(values), size))
+        for shard in self.pool.imap(process_shard, shards):
+            for indicator, hashed in shard:
+                if indicator not in output:
+                    output[indicator] = hashed
+        return output
+
+    def close(self):
+        """Stop the worker processes."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
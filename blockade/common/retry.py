@@ -0,0 +1,124 @@
+"""Retry policy for requests made to the cloud node."""
+import random
+
+# Lambda errors come back from API Gateway as a 200 carrying these fields.
+LAMBDA_ERROR_MARKER = b'"errorMessage"'
+
+
+def never_sent(error):
+    """Check if a connection error happened before the request was sent.
+
+    Refused connections and failed DNS lookups surface from urllib3 as a
+    NewConnectionError, wrapped in the error raised by requests.
+
+    :param error: Exception raised by requests
+    :return: Boolean
+    """
+    from urllib3.exceptions import NewConnectionError
+    seen = list()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or any(current is x for x in seen):
+            continue
+        seen.append(current)
+        if isinstance(current, NewConnectionError):
+            return True
+        pending.extend(x for x in getattr(current, 'args', ())
+                       if isinstance(x, BaseException))
+        pending.extend([getattr(current, 'reason', None),
+                        getattr(current, '__cause__', None),
+                        getattr(current, '__context__', None)])
+    return False
+
+
+class RetryPolicy(object):
+
+    """Decide whether and when a failed request is sent again.
+
+    Requests rejected before reaching the Lambda (throttling, connections
+    that could not be opened) are always safe to retry. Failures that may
+    have happened after the Lambda started working (timeouts, dropped
+    connections, gateway and Lambda errors) are only retried for idempotent
+    requests.
+    """
+
+    SAFE_STATUSES = (429,)
+    IDEMPOTENT_STATUSES = (500, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, attempts=4, backoff=0.5, max_backoff=20.0,
+                 jitter=True):
+        """Setup the policy.
+
+        :param int attempts: Total attempts per request, 1 disables retries
+        :param float backoff: Delay before the first retry in seconds
+        :param float max_backoff: Upper bound of any delay in seconds
+        :param bool jitter: Randomise delays to spread out retrying clients
+        """
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """Seconds to wait before the next attempt.
+
+        Uses exponential backoff with full jitter.
+
+        :param int attempt: Number of the attempt that failed, from 0
+        :return: Delay in seconds
+        """
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def is_idempotent(self, method, endpoint, idempotent_endpoints=()):
+        """Check if sending a request twice has the same effect as once.
+
+        :param str method: HTTP method of the request
+        :param str endpoint: Endpoint path, e.g. admin/add-indicators
+        :param idempotent_endpoints: Endpoints known to be idempotent
+        :return: Boolean
+        """
+        return (method.upper() in self.IDEMPOTENT_METHODS or
+                endpoint in idempotent_endpoints)
+
+    def retry_error(self, attempt, error, idempotent):
+        """Check if a request that raised should be retried.
+
+        :param int attempt: Number of the attempt that failed, from 0
+        :param error: Exception raised by requests
+        :param bool idempotent: Whether the request is idempotent
+        :return: Boolean
+        """
+        import requests
+        if attempt + 1 >= self.attempts:
+            return False
+        if (isinstance(error, requests.exceptions.ConnectTimeout) or
+                never_sent(error)):
+            return True
+        if isinstance(error, (requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout)):
+            return idempotent
+        return False
+
+    def retry_response(self, attempt, response, idempotent):
+        """Check if a request that got a response should be retried.
+
+        :param int attempt: Number of the attempt that failed, from 0
+        :param response: Response from the server
+        :param bool idempotent: Whether the request is idempotent
+        :return: Boolean
+        """
+        if attempt + 1 >= self.attempts:
+            return False
+        status = response.status_code
+        if status in self.SAFE_STATUSES:
+            return True
+        if not idempotent:
+            return False
+        if status in self.IDEMPOTENT_STATUSES:
+            return True
+        return status == 200 and LAMBDA_ERROR_MARKER in response.content
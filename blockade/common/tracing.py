@@ -0,0 +1,110 @@
+"""Request tracing hooks for the API clients."""
+import json
+import random
+
+
+class RequestTrace(object):
+
+    """Details of a single request, shared by every hook."""
+
+    __slots__ = ('method', 'endpoint', 'bytes_sent', 'status', 'latency',
+                 'bytes_received', 'context')
+
+    def __init__(self, method, endpoint, bytes_sent):
+        """Setup the trace.
+
+        :param str method: HTTP method of the request
+        :param str endpoint: Endpoint path, e.g. admin/add-indicators
+        :param int bytes_sent: Size of the request body
+        """
+        self.method = method
+        self.endpoint = endpoint
+        self.bytes_sent = bytes_sent
+        self.status = None
+        self.latency = None
+        self.bytes_received = None
+        self.context = dict()
+
+
+class RequestHook(object):
+
+    """Base class for hooks observing every request of a client.
+
+    Hooks are only invoked when registered, so unused tracing costs nothing.
+    """
+
+    def before_request(self, trace):
+        """Called before the request is sent.
+
+        :param trace: RequestTrace with method, endpoint and bytes_sent set
+        """
+        pass
+
+    def after_response(self, trace):
+        """Called once the response arrived.
+
+        :param trace: RequestTrace with status, latency and bytes_received
+                      set as well
+        """
+        pass
+
+
+class LatencySampler(RequestHook):
+
+    """Hook sampling request latencies into a per-endpoint profile."""
+
+    def __init__(self, sample_rate=1.0, path=None):
+        """Setup the sampler.
+
+        :param float sample_rate: Fraction of requests to record
+        :param str path: File the profile is written to by write()
+        """
+        self.sample_rate = sample_rate
+        self.path = path
+        self.samples = dict()
+
+    def after_response(self, trace):
+        """Record the latency of a sampled request."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        key = (trace.method, trace.endpoint)
+        if key not in self.samples:
+            self.samples[key] = {'latency': list(), 'bytes_sent': 0,
+                                 'bytes_received': 0, 'errors': 0}
+        sample = self.samples[key]
+        sample['latency'].append(trace.latency)
+        sample['bytes_sent'] += trace.bytes_sent
+        sample['bytes_received'] += trace.bytes_received or 0
+        if not trace.status or trace.status >= 400:
+            sample['errors'] += 1
+
+    def profile(self):
+        """Summarise the sampled latencies, slowest endpoint first.
+
+        :return: List of dicts with latency percentiles per endpoint
+        """
+        output = list()
+        for (method, endpoint), sample in self.samples.items():
+            latency = sorted(sample['latency'])
+            count = len(latency)
+            output.append({
+                'method': method, 'endpoint': endpoint, 'count': count,
+                'mean': sum(latency) / count,
+                'p50': latency[int(count * 0.50)],
+                'p95': latency[min(count - 1, int(count * 0.95))],
+                'max': latency[-1], 'errors': sample['errors'],
+                'bytes_sent': sample['bytes_sent'],
+                'bytes_received': sample['bytes_received']
+            })
+        return sorted(output, key=lambda x: x['p95'], reverse=True)
+
+    def write(self, path=None):
+        """Write the latency profile as JSON.
+
+        :param str path: Output file, defaults to the path given at setup
+        :return: Path of the written file
+        """
+        path = path or self.path
+        with open(path, 'w') as handle:
+            json.dump(self.profile(), handle, indent=4, sort_keys=True)
+        return path
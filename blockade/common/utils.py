@@ -1,18 +1,23 @@
 """Common utilities shared across all libraries."""
 
 
+def clean_indicator(indicator):
+    """Remove any extra details from a single indicator."""
+    strip = ['http://', 'https://']
+    for item in strip:
+        indicator = indicator.replace(item, '')
+    indicator = indicator.strip('.').strip()
+    parts = indicator.split('/')
+    if len(parts) > 0:
+        indicator = parts.pop(0)
+    return indicator
+
+
 def clean_indicators(indicators):
     """Remove any extra details from indicators."""
     output = list()
     for indicator in indicators:
-        strip = ['http://', 'https://']
-        for item in strip:
-            indicator = indicator.replace(item, '')
-        indicator = indicator.strip('.').strip()
-        parts = indicator.split('/')
-        if len(parts) > 0:
-            indicator = parts.pop(0)
-        output.append(indicator)
+        output.append(clean_indicator(indicator))
     output = list(set(output))
     return output
 
@@ -23,31 +28,70 @@ def is_hashed(value):
     return re.search(r"^([a-fA-F\d]{32})$", value)
 
 
-def hash_values(values, alg="md5"):
-    """Hash a list of values."""
+def digest_values(values, algs=('md5',), binary=False, keep_hashed=False):
+    """Hash values with one or more algorithms in a single pass.
+
+    Each value is encoded once and fed to every requested algorithm.
+
+    :param values: Iterable of values
+    :param algs: Algorithm name or list of names (md5, sha1, sha256)
+    :param bool binary: Return raw digests instead of hex strings
+    :param bool keep_hashed: Keep values that already look like MD5 hashes
+                             as their MD5 digest instead of hashing them
+    :return: Dict mapping each algorithm to the digests in input order
+    """
+    import binascii
     import hashlib
-    if alg not in ['md5', 'sha1', 'sha256']:
-        raise Exception("Invalid hashing algorithm!")
-
-    hasher = getattr(hashlib, alg)
-    if type(values) == str:
-        output = hasher(values).hexdigest()
-    elif type(values) == list:
-        output = list()
-        for item in values:
-            output.append(hasher(item).hexdigest())
+    if hasattr(algs, 'encode'):
+        algs = [algs]
+    hashers = list()
+    output = dict()
+    for alg in algs:
+        if alg not in ['md5', 'sha1', 'sha256']:
+            raise Exception("Invalid hashing algorithm!")
+        output[alg] = list()
+        hashers.append((alg == 'md5', getattr(hashlib, alg),
+                        output[alg].append))
+    for value in values:
+        if keep_hashed and len(value) == 32 and is_hashed(value):
+            known = binascii.unhexlify(value) if binary else value.lower()
+        else:
+            known = None
+        data = value if isinstance(value, bytes) else value.encode('utf-8')
+        for md5, hasher, append in hashers:
+            if md5 and known is not None:
+                append(known)
+            elif binary:
+                append(hasher(data).digest())
+            else:
+                append(hasher(data).hexdigest())
     return output
 
 
-def check_whitelist(values):
-    """Check the indicators against known whitelists."""
+def hash_values(values, alg="md5"):
+    """Hash a single value or an iterable of values."""
+    if hasattr(values, 'encode'):
+        return digest_values([values], alg)[alg][0]
+    return digest_values(values, alg)[alg]
+
+
+def load_whitelists():
+    """Load the known whitelists from the configuration directory."""
     import os
-    import tldextract
-    whitelisted = list()
+    whitelisted = set()
     for name in ['alexa.txt', 'cisco.txt']:
         config_path = os.path.expanduser('~/.config/blockade')
         file_path = os.path.join(config_path, name)
-        whitelisted += [x.strip() for x in open(file_path, 'r').readlines()]
+        with open(file_path, 'r') as handle:
+            whitelisted.update(x.strip() for x in handle)
+    return whitelisted
+
+
+def check_whitelist(values, whitelisted=None):
+    """Check the indicators against known whitelists."""
+    import tldextract
+    if whitelisted is None:
+        whitelisted = load_whitelists()
     output = list()
     for item in values:
         ext = tldextract.extract(item)
@@ -59,43 +103,19 @@ def check_whitelist(values):
 
 def cache_items(values):
     """Cache indicators that were successfully sent to avoid dups."""
-    import os
-    config_path = os.path.expanduser('~/.config/blockade')
-    file_path = os.path.join(config_path, 'cache.txt')
-    if not os.path.isfile(file_path):
-        file(file_path, 'w').close()
-    written = [x.strip() for x in open(file_path, 'r').readlines()]
-    handle = open(file_path, 'a')
-    for item in values:
-        # Because of the option to submit in clear or hashed, we need to make
-        # sure we're not re-hashing before adding.
-        if is_hashed(item):
-            hashed = item
-        else:
-            hashed = hash_values(item)
-
-        if hashed in written:
-            continue
-        handle.write(hashed + "\n")
-    handle.close()
+    from blockade.common.cache import SubmissionCache
+    SubmissionCache().add(values)
     return True
 
 
-def prune_cached(values):
-    """Remove the items that have already been cached."""
-    import os
-    config_path = os.path.expanduser('~/.config/blockade')
-    file_path = os.path.join(config_path, 'cache.txt')
-    if not os.path.isfile(file_path):
-        return values
-    cached = [x.strip() for x in open(file_path, 'r').readlines()]
-    output = list()
-    for item in values:
-        hashed = hash_values(item)
-        if hashed in cached:
-            continue
-        output.append(item)
-    return output
+def prune_cached(values, hashed=None):
+    """Remove the items that have already been cached.
+
+    :param list values: Indicators in clear or hashed
+    :param list hashed: MD5 of every value, computed if missing
+    """
+    from blockade.common.cache import SubmissionCache
+    return SubmissionCache().prune(values, hashed)
 
 
 def get_logger(name):
@@ -114,13 +134,38 @@ def get_logger(name):
     return logger
 
 
-def process_whitelists():
-    """Download approved top 1M lists."""
+def download_whitelist(url, name):
+    """Download a top 1M list and store its domains in the config directory.
+
+    :param str url: Location of the zipped top-1m.csv
+    :param str name: File name to store the domains under
+    :return: Path of the written file
+    """
     import csv
-    import grequests
+    import io
     import os
-    import StringIO
+    import requests
     import zipfile
+    response = requests.get(url, timeout=120)
+    response.raise_for_status()
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    data = archive.read('top-1m.csv').decode('utf-8')
+    reader = csv.reader(data.splitlines(), delimiter=',',
+                        quoting=csv.QUOTE_MINIMAL)
+    config_path = os.path.expanduser('~/.config/blockade')
+    file_path = os.path.join(config_path, name)
+    with open(file_path, 'w') as handle:
+        for row in reader:
+            item = row[1].strip()
+            if item.count('.') == 0:
+                continue
+            handle.write(item + "\n")
+    return file_path
+
+
+def process_whitelists():
+    """Download approved top 1M lists."""
+    from concurrent.futures import ThreadPoolExecutor
     mapping = {
         'http://s3.amazonaws.com/alexa-static/top-1m.csv.zip': {
             'name': 'alexa.txt'
@@ -128,21 +173,9 @@ def process_whitelists():
             'name': 'cisco.txt'
         }
     }
-    rs = (grequests.get(u) for u in mapping.keys())
-    responses = grequests.map(rs)
-    for r in responses:
-        data = zipfile.ZipFile(StringIO.StringIO(r.content)).read('top-1m.csv')
-        stream = StringIO.StringIO(data)
-        reader = csv.reader(stream, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-        items = [row[1].strip() for row in reader]
-        stream.close()
-
-        config_path = os.path.expanduser('~/.config/blockade')
-        file_path = os.path.join(config_path, mapping[r.url]['name'])
-        handle = open(file_path, 'w')
-        for item in items:
-            if item.count('.') == 0:
-                continue
-            handle.write(item + "\n")
-        handle.close()
+    with ThreadPoolExecutor(max_workers=len(mapping)) as executor:
+        futures = [executor.submit(download_whitelist, url, item['name'])
+                   for url, item in mapping.items()]
+        for future in futures:
+            future.result()
     return True
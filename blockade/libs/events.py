@@ -4,45 +4,157 @@
 __author__ = 'Claudio Guarnieri'
 __version__ = '1.0.0'
 
+from io import StringIO
+
 from blockade.api import Client
+from blockade.common.eventstore import EventStore, stored_time
+from blockade.common.output import get_writer
 
 
 class EventsClient(Client):
 
     """Client to interface with events for blockade."""
 
+    IDEMPOTENT_ENDPOINTS = ('admin/get-events', 'admin/get-event-stats')
+    PAGE_SIZE = 1000
+
     def __init__(self, *args, **kwargs):
         """Setup the primary client instance."""
         super(EventsClient, self).__init__(*args, **kwargs)
 
-    def get_events(self):
-        """Get events from the cloud node."""
-        to_send = {'limit': 50}
-        response = self._send_data('POST', 'admin', 'get-events', to_send)
-
-        output = {'message': ""}
-        for event in response['events']:
-            desc = "Source IP: {ip}\n"
-            desc += "Datetime: {time}\n"
-            desc += "Indicator: {match}\n"
-            desc += "Method: {method}\n"
-            desc += "URL: {url}\n"
-            desc += "Request Type: {type}\n"
-            desc += "User-Agent: {userAgent}\n"
-            desc += "Contact: {contact}\n"
-            desc += "\n"
-            output['message'] += desc.format(**event)
+    def iter_events(self, limit=None, since=None):
+        """Page through the events stored on the cloud node.
 
-        return output
+        :param int limit: Items scanned per page, the node decides by default
+        :param int since: Only events the node stored after this time
+        :return: Generator of lists of events
+        """
+        to_send = dict()
+        if limit:
+            to_send['limit'] = limit
+        if since:
+            to_send['since'] = int(since)
+        while True:
+            response = self._send_data('POST', 'admin', 'get-events', to_send)
+            if not response.get('success', False):
+                raise Exception(response.get('message', "Get events failed"))
+            yield response.get('events', list())
+            if not response.get('lastKey'):
+                break
+            to_send['lastKey'] = response['lastKey']
 
-    def flush_events(self):
-        """Flush events from the cloud node."""
-        response = self._send_data('DELETE', 'admin', 'flush-events', {})
+    def get_events(self, handle=None, fmt='text', limit=None):
+        """Get events from the cloud node.
 
-        if response['success']:
-            msg = "Events flushed"
-        else:
-            msg = "Flushing of events failed"
-        output = {'message': msg}
+        Without a file object the events are rendered into the message, as
+        text. Otherwise each page is written out as soon as it arrives and
+        the events are never held in memory.
 
+        :param handle: File object the events are streamed to
+        :param str fmt: Output format, one of text, jsonl or csv
+        :param int limit: Events requested per page
+        :return: Dict with the number of events and a message
+        """
+        stream = handle
+        if stream is None:
+            stream = StringIO()
+        writer = get_writer(fmt, stream)
+        for page in self.iter_events(limit or self.PAGE_SIZE):
+            for event in page:
+                writer.write(event)
+        writer.close()
+        output = {'success': True, 'eventsCount': writer.count}
+        if handle is None:
+            output['message'] = stream.getvalue()
+        else:
+            output['message'] = ""
         return output
+
+    def sync_events(self, store=None, limit=None):
+        """Pull the events stored since the last sync into a local store.
+
+        The store only records how far it got once every page is in, so an
+        interrupted sync is pulled again from the same point next time.
+
+        :param store: EventStore to update, the default one if missing
+        :param int limit: Events requested per page
+        :return: Dict with the number of new events and a message
+        """
+        if store is None:
+            store = EventStore()
+        added = 0
+        with self.metrics.stage('sync'):
+            with store:
+                since = store.sync_since()
+                last = store.last_stored
+                for page in self.iter_events(limit or self.PAGE_SIZE, since):
+                    added += store.add(page)
+                    for event in page:
+                        last = max(last, stored_time(event))
+                store.last_stored = last
+                total = len(store)
+        msg = "Synced {} new events into {}, {} stored locally"
+        return {'success': True, 'eventsCount': added,
+                'message': msg.format(added, store.path, total)}
+
+    def get_event_stats(self, dimension='indicator', days=7, top=None):
+        """Get event counts aggregated by the cloud node.
+
+        The node keeps counters per day for every indicator, source IP,
+        method and hour, so this reads one item per group and day.
+
+        :param str dimension: indicator, ip, method, day or hour
+        :param int days: Number of days counted, back from today (UTC)
+        :param int top: Only return the groups with the most hits
+        :return: Dict with the stats, most hits first, and a message
+        """
+        to_send = {'dimension': dimension, 'days': days}
+        if top:
+            to_send['top'] = top
+        response = self._send_data('POST', 'admin', 'get-event-stats',
+                                   to_send)
+        if not response.get('success', False):
+            return response
+        lines = ["{} hits in {} groups by {} since {}".format(
+            response['hits'], response['groupCount'], dimension,
+            response['since'])]
+        for stat in response['stats']:
+            lines.append("{:>8}  {}".format(stat['hits'], stat['group']))
+        response['message'] = "\n".join(lines)
+        return response
+
+    def flush_events(self, delete_objects=False, segments=None):
+        """Flush events from the cloud node.
+
+        Every call deletes events for as long as API Gateway allows and
+        returns a continuation token, so the flush is repeated until the
+        node reports that the table is empty.
+
+        :param bool delete_objects: Delete the events saved in S3 as well
+        :param int segments: Parallel scans used by the node
+        :return: Dict with the number of events deleted and a message
+        """
+        to_send = {'deleteObjects': delete_objects}
+        if segments:
+            to_send['segments'] = segments
+        deleted, objects = 0, 0
+        while True:
+            response = self._send_data('DELETE', 'admin', 'flush-events',
+                                       to_send)
+            deleted += response.get('deleted', 0)
+            objects += response.get('objectsDeleted', 0)
+            self.logger.info("Flushed %d events so far", deleted)
+            if not response.get('success', False):
+                msg = "Flushing of events failed after {} events: {}"
+                return {'success': False, 'deleted': deleted,
+                        'message': msg.format(deleted,
+                                              response.get('message'))}
+            if response.get('done') or not response.get('continuation'):
+                break
+            to_send['continuation'] = response['continuation']
+
+        msg = "Events flushed: {} deleted".format(deleted)
+        if delete_objects:
+            msg += ", {} S3 objects deleted".format(objects)
+        return {'success': True, 'deleted': deleted,
+                'objectsDeleted': objects, 'message': msg}
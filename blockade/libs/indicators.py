@@ -4,75 +4,405 @@
 __author__ = 'Brandon Dixon'
 __version__ = '1.0.0'
 
-import math
+import multiprocessing
 import time
 from blockade.api import Client
-from blockade.common.utils import (cache_items, check_whitelist,
-                                   clean_indicators, hash_values, prune_cached)
+from blockade.common.batching import AdaptiveBatcher
+from blockade.common.cache import SubmissionCache
+from blockade.common.journal import SubmissionJournal
+from blockade.common.mirror import IndicatorMirror
+from blockade.common.parallel import Preprocessor
+from blockade.common.utils import (check_whitelist, clean_indicators,
+                                   digest_values, load_whitelists)
 
 
 class IndicatorClient(Client):
 
     """Client to interface with indicators for blockade."""
 
+    BATCH_INTERVAL = 3
+    CHECK_SIZE = 1000
+    CHUNK_SIZE = 10000
+    IDEMPOTENT_ENDPOINTS = ('admin/add-indicators', 'admin/check-indicators')
+    STAT_COUNTERS = ['success', 'failure', 'requests', 'written', 'retries',
+                     'throttled', 'bytes_sent']
+
     def __init__(self, *args, **kwargs):
-        """Setup the primary client instance."""
+        """Setup the primary client instance.
+
+        :param batcher: AdaptiveBatcher sizing the batches (optional)
+        :param mirror: IndicatorMirror of the node's indicators (optional)
+        :param cache: SubmissionCache of the indicators sent from this host
+                      (optional)
+        :param int workers: Processes used to clean, whitelist and hash
+                            indicators, 0 uses every core
+        """
+        batcher = kwargs.pop('batcher', None)
+        mirror = kwargs.pop('mirror', None)
+        cache = kwargs.pop('cache', None)
+        self.workers = kwargs.pop('workers', 1) or multiprocessing.cpu_count()
         super(IndicatorClient, self).__init__(*args, **kwargs)
+        # An empty mirror is falsy, so only replace missing arguments
+        if batcher is None:
+            batcher = AdaptiveBatcher()
+        if mirror is None:
+            mirror = IndicatorMirror()
+        if cache is None:
+            cache = SubmissionCache()
+        self.batcher = batcher
+        self.mirror = mirror
+        self.cache = cache
+        self.preprocessor = None
+        self._last_batch = 0
+        self._flush_pending = False
+
+    def _pace(self):
+        """Space out batches to ensure we never trip the limit."""
+        wait = self.BATCH_INTERVAL - (time.time() - self._last_batch)
+        if wait > 0:
+            self.logger.debug("Waiting %.1f seconds before next request.",
+                              wait)
+            time.sleep(wait)
+        self._last_batch = time.time()
+
+    def _send_batch(self, indicators, tags, stats, journal=None,
+                    batch_id=None, ttl_days=None):
+        """Send a single batch of indicators and account for the outcome.
+
+        :param list indicators: Indicators to send
+        :param list tags: Tags to store with the indicators
+        :param dict stats: Stats updated with the outcome
+        :param journal: SubmissionJournal recording the outcome (optional)
+        :param int batch_id: ID of a batch re-queued from the journal
+        :param int ttl_days: Days the node keeps the indicators
+        :return: Boolean if the node accepted the batch
+        """
+        import requests
+        self._pace()
+        # The stage cache is flushed once, at the end of the submission
+        to_send = {'indicators': indicators, 'tags': tags, 'deferFlush': True}
+        if ttl_days is not None:
+            to_send['ttlDays'] = ttl_days
+        stats['requests'] += 1
+        retries = self.metrics.counters.get('request.retries', 0)
+        start = time.time()
+        try:
+            with self.metrics.stage('send'):
+                r = self._send_data('POST', 'admin', 'add-indicators',
+                                    to_send)
+            success = bool(r and r.get('success'))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger.error("Batch failed after retries: %s", e)
+            success = False
+        congested = self.metrics.counters.get('request.retries', 0) > retries
+        size = self.batcher.record(time.time() - start, success, congested)
+        self.metrics.gauge('batch.size', size)
+        if journal:
+            journal.record_batch(indicators, tags, success, batch_id)
+        if not success:
+            stats['failure'] += 1
+            return False
+        stats['success'] += 1
+        stats['written'] += r['writeCount']
+        if r.get('flushPending'):
+            self._flush_pending = True
+        with self.metrics.stage('cache_write'):
+            self.cache.add(indicators, expires=r.get('expires'))
+        return True
+
+    def _collect_stats(self, stats):
+        """Add the recorded timings and request counters to the stats."""
+        stats['timings'] = self.metrics.stage_timings()
+        stats['latency'] = self.metrics.histogram('request.latency')
+        for key in ['retries', 'throttled', 'bytes_sent']:
+            stats[key] = self.metrics.counters.get('request.%s' % key, 0)
+        return stats
+
+    def _merge_stats(self, total, stats):
+        """Merge the stats of a partial submission into the totals."""
+        for key in self.STAT_COUNTERS:
+            total[key] = total.get(key, 0) + stats.get(key, 0)
+        for group in ['timings', 'latency']:
+            merged = total.setdefault(group, dict())
+            for key, value in stats.get(group, dict()).items():
+                merged[key] = merged.get(key, 0) + value
+        return total
+
+    def add_indicators(self, indicators=list(), private=False, tags=list(),
+                       journal=None, check=False, ttl_days=None, flush=True):
+        """Add indicators to the remote instance.
+
+        Besides the request counts, the returned stats include the duration
+        of every stage in ``timings``, a request ``latency`` histogram and the
+        ``retries``, ``throttled`` and ``bytes_sent`` counters.
 
-    def add_indicators(self, indicators=list(), private=False, tags=list()):
-        """Add indicators to the remote instance."""
+        Indicators sent with tags skip the cache, the mirror and the check:
+        the node must see the known ones too to record their new tags.
+
+        :param journal: SubmissionJournal recording every batch (optional)
+        :param bool check: Ask the node which indicators it already has and
+                           only send the others
+        :param int ttl_days: Days the node keeps the indicators, the node's
+                             setting if missing or longer
+        :param bool flush: Flush the node's stage cache after the last batch
+        """
         if len(indicators) == 0:
             raise Exception("No indicators were identified.")
+        if type(tags) == str:
+            tags = [t.strip().lower() for t in tags.split(',')]
+        metrics = self.metrics
+        metrics.reset()
         self.logger.debug("Checking {} indicators".format(len(indicators)))
-        cleaned = clean_indicators(indicators)
-        self.logger.debug("Cleaned {} indicators".format(len(cleaned)))
-        whitelisted = check_whitelist(cleaned)
+        digests = None
+        if self.workers > 1:
+            if self.preprocessor is None:
+                self.preprocessor = Preprocessor(self.workers)
+            with metrics.stage('preprocess'):
+                digests = self.preprocessor.run(indicators)
+            whitelisted = list(digests.keys())
+        else:
+            with metrics.stage('clean'):
+                cleaned = clean_indicators(indicators)
+            self.logger.debug("Cleaned {} indicators".format(len(cleaned)))
+            with metrics.stage('whitelist_load'):
+                whitelist = load_whitelists()
+            with metrics.stage('whitelist'):
+                whitelisted = check_whitelist(cleaned, whitelist)
         self.logger.debug("Non-whitelisted {} indicators".format(len(whitelisted)))
-        indicators = prune_cached(whitelisted)
-        hashed = hash_values(indicators)
+        if digests is None:
+            with metrics.stage('hash'):
+                hashed = digest_values(whitelisted, keep_hashed=True)['md5']
+                digests = dict(zip(whitelisted, hashed))
+        indicators = whitelisted
+        if tags:
+            self.logger.debug("Sending known indicators again for their tags")
+        else:
+            with metrics.stage('cache'):
+                indicators = self.cache.prune(
+                    indicators, [digests[x] for x in indicators])
+        with metrics.stage('mirror'):
+            if not tags and self.mirror.load():
+                count = len(indicators)
+                indicators = self.mirror.prune(
+                    indicators, [digests[x] for x in indicators])
+                self.logger.debug("Skipped {} indicators already on the node"
+                                  .format(count - len(indicators)))
+        if check and indicators and not tags:
+            with metrics.stage('check'):
+                indicators = self.check_indicators(
+                    indicators, [digests[x] for x in indicators])['missing']
         self.logger.debug("Non-cached {} indicators".format(len(indicators)))
         self.logger.debug("Processing {} indicators".format(len(indicators)))
-        request_count = int(math.ceil(len(indicators)/100.0))
-        if request_count == 0:
+        if len(indicators) == 0:
             mesg = "[!] No indicators were left to process after "
-            mesg += "cleaning, whitelisting and checking the cache."
-            return {'message': mesg}
-        stats = {'success': 0, 'failure': 0, 'requests': request_count,
-                 'written': 0}
-        mesg = "{} indicators found, making {} requests"
-        self.logger.debug(mesg.format(len(indicators), request_count))
+            mesg += "cleaning, whitelisting and checking the cache and "
+            mesg += "the node mirror."
+            return {'message': mesg, 'timings': metrics.stage_timings()}
+        stats = {'success': 0, 'failure': 0, 'requests': 0, 'written': 0}
+        mesg = "{} indicators found, starting with batches of {}"
+        self.logger.debug(mesg.format(len(indicators), self.batcher.size))
 
         if private:
-            indicators = hashed
+            indicators = [digests[x] for x in indicators]
+
+        for batch in self.batcher.batches(indicators):
+            self._send_batch(batch, tags, stats, journal, ttl_days=ttl_days)
+        if flush:
+            self.flush_cache()
+        self._collect_stats(stats)
+        self.logger.debug("Stage timings: {}".format(stats['timings']))
+        msg = ""
+        msg += "{written} indicators written using {requests} requests: "
+        msg += "{success} success, {failure} failure"
+        stats['message'] = msg.format(**stats)
+        return stats
+
+    def submit_file(self, path, private=False, tags=list(), resume=False,
+                    chunk_size=None, check=False, ttl_days=None):
+        """Add the indicators listed in a file, one per line.
+
+        The file is processed in chunks and progress is checkpointed in a
+        SubmissionJournal. With ``resume``, a previous run of the same file
+        continues from its last checkpoint and only its failed batches are
+        sent again.
 
+        :param str path: File listing the indicators
+        :param bool private: Submit the indicators hashed
+        :param tags: Tags to store with the indicators
+        :param bool resume: Continue the previous run of this file
+        :param int chunk_size: Lines to process per chunk, CHUNK_SIZE per
+                               worker by default
+        :param bool check: Only send the indicators the node does not have
+        :param int ttl_days: Days the node keeps the indicators
+        :return: Stats of the submission
+        """
         if type(tags) == str:
             tags = [t.strip().lower() for t in tags.split(',')]
+        if not chunk_size:
+            chunk_size = self.CHUNK_SIZE * self.workers
+        journal = SubmissionJournal(path)
+        if resume and journal.load():
+            self.logger.debug("Resuming at offset %d with %d failed batches",
+                              journal.offset, len(journal.pending))
+        else:
+            journal.start()
+
+        self.metrics.reset()
+        requeued = dict((k, 0) for k in self.STAT_COUNTERS)
+        for batch_id, batch in list(journal.pending.items()):
+            self._send_batch(batch['indicators'], batch['tags'], requeued,
+                             journal, batch_id, ttl_days)
+        total = self._merge_stats(dict(), self._collect_stats(requeued))
+
+        with open(path, 'r') as handle:
+            handle.seek(journal.offset)
+            while True:
+                chunk = list()
+                line = handle.readline()
+                while line:
+                    line = line.strip()
+                    if line != '':
+                        chunk.append(line)
+                    if len(chunk) >= chunk_size:
+                        break
+                    line = handle.readline()
+                if chunk:
+                    stats = self.add_indicators(chunk, private, tags, journal,
+                                                check, ttl_days, flush=False)
+                    self._merge_stats(total, stats)
+                journal.checkpoint(handle.tell())
+                if not line:
+                    break
+        journal.close()
+        self.flush_cache()
 
-        start, end = (0, 100)
-        for i, idx in enumerate(range(0, request_count)):
-            if idx > 0:
-                time.sleep(3)  # Ensure we never trip the limit
-                self.logger.debug("Waiting 3 seconds before next request.")
-            to_send = {'indicators': indicators[start:end], 'tags': tags}
-            r = self._send_data('POST', 'admin', 'add-indicators', to_send)
-            start, end = (end, end + 100)
-            if not r['success']:
-                stats['failure'] += 1
-                continue
-            stats['success'] += 1
-            stats['written'] += r['writeCount']
-            cache_items(to_send['indicators'])
+        if journal.pending:
+            self.logger.info("[!] %d batches failed, rerun with --resume to "
+                             "retry them", len(journal.pending))
         msg = ""
         msg += "{written} indicators written using {requests} requests: "
         msg += "{success} success, {failure} failure"
-        stats['message'] = msg.format(**stats)
-        return stats
+        total['message'] = msg.format(**total)
+        return total
+
+    def flush_cache(self):
+        """Flush the node's stage cache, if batches were written since.
+
+        Batches ask the node to defer the flush, so a submission flushes
+        once however many batches it sends.
+
+        :return: Boolean if the cache was flushed
+        """
+        import requests
+        if not self._flush_pending:
+            return False
+        try:
+            response = self._send_data('POST', 'admin', 'add-indicators',
+                                       {'indicators': list(),
+                                        'flushCache': True})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger.error("Flushing the stage cache failed: %s", e)
+            return False
+        if not response.get('success'):
+            self.logger.error("Flushing the stage cache failed: %s",
+                              response.get('message'))
+            return False
+        self._flush_pending = False
+        return True
 
-    def get_indicators(self):
-        """List indicators available on the remote instance."""
-        response = self._get('', 'get-indicators')
+    def close(self):
+        """Stop the preprocessing workers, if any were started."""
+        if self.preprocessor is not None:
+            self.preprocessor.close()
+            self.preprocessor = None
+
+    def check_indicators(self, indicators, hashed=None):
+        """Split indicators by whether the remote instance already has them.
+
+        Indicators are hashed before they are sent, so clear values never
+        leave the client.
+
+        :param list indicators: Indicators in clear or hashed
+        :param list hashed: MD5 of every indicator, computed if missing
+        :return: Dict with the ``existing`` and ``missing`` indicators
+        """
+        keys = hashed
+        if keys is None:
+            keys = digest_values(indicators, keep_hashed=True)['md5']
+        hashed = dict()
+        for value, key in zip(indicators, keys):
+            hashed.setdefault(key, list()).append(value)
+        keys = list(hashed.keys())
+        existing = set()
+        for start in range(0, len(keys), self.CHECK_SIZE):
+            response = self._send_data(
+                'POST', 'admin', 'check-indicators',
+                {'indicators': keys[start:start + self.CHECK_SIZE]})
+            if not response.get('success'):
+                raise Exception(response.get('message',
+                                             "Check of indicators failed"))
+            existing.update(response['existing'])
+        output = {'success': True, 'existing': list(), 'missing': list()}
+        for key in keys:
+            group = 'existing' if key in existing else 'missing'
+            output[group].extend(hashed[key])
+        msg = "{} of {} indicators are already on the node"
+        output['message'] = msg.format(len(output['existing']),
+                                       len(indicators))
+        return output
+
+    def iter_indicators(self, limit=None, tag=None, until=None):
+        """Page through the indicators available on the remote instance.
+
+        :param int limit: Items scanned per page, the node decides by default
+        :param str tag: Only the indicators submitted with this tag
+        :param int until: Only the indicators the node keeps until this time
+        :return: Generator of lists of indicators
+        """
+        params = dict()
+        if limit:
+            params['limit'] = limit
+        if tag:
+            params['tag'] = tag.strip().lower()
+        if until:
+            params['until'] = int(until)
+        while True:
+            response = self._get('', 'get-indicators', **params)
+            yield response.get('indicators', list())
+            if not response.get('lastKey'):
+                break
+            params['lastKey'] = response['lastKey']
+
+    def get_indicators(self, tag=None):
+        """List indicators available on the remote instance.
+
+        :param str tag: Only the indicators submitted with this tag
+        """
+        indicators = set()
+        for page in self.iter_indicators(tag=tag):
+            indicators.update(page)
+        response = {'success': True, 'indicators': list(indicators),
+                    'indicatorCount': len(indicators)}
         response['message'] = "%i indicators:\n%s" % (
             len(response['indicators']),
             "\n".join(response['indicators'])
         )
         return response
+
+    def sync_cache(self):
+        """Mirror the indicators of the remote instance locally.
+
+        Once synced, add_indicators skips anything already on the node,
+        until the mirror is too old. Indicators the node deletes before
+        then are left out, so they are sent again.
+        """
+        with self.metrics.stage('sync'):
+            synced = int(time.time())
+            indicators = set()
+            for page in self.iter_indicators(
+                    until=synced + self.mirror.max_age):
+                indicators.update(page)
+            count = self.mirror.save(indicators, synced)
+        msg = "Synced {} indicators from the node into {}"
+        return {'success': True, 'indicatorCount': count,
+                'message': msg.format(count, self.mirror.path)}
@@ -11,8 +11,8 @@ setup(
     author_email="info@blockade.io",
     license="GPLv2",
     packages=find_packages(),
-    install_requires=['requests', 'ez_setup', 'future', 'grequests',
-                      'tldextract', 'boto3'],
+    install_requires=['requests', 'ez_setup', 'future', 'tldextract', 'boto3',
+                      'futures; python_version < "3"'],
     long_description="Blockade brings antivirus-like capabilities to users who run the Chrome browser. Built as an extension, Blockade blocks malicious resources from being viewed or loaded inside of the browser.",
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -26,7 +26,8 @@ setup(
         'console_scripts': [
             'blockade-cfg = blockade.cli.config:main',
             'blockade-aws-deploy = blockade.cli.aws_serverless:main',
-            'blockade = blockade.cli.client:main'
+            'blockade = blockade.cli.client:main',
+            'blockade-emulator = blockade.cli.emulator:main'
         ],
     },
     package_data={
@@ -0,0 +1,99 @@
+"""Fixtures shared by the tests, built on the local cloud node emulator."""
+import json
+
+import pytest
+
+from blockade.aws.emulator import NodeEmulator
+from blockade.common.batching import AdaptiveBatcher
+from blockade.common.cache import SubmissionCache
+from blockade.common.mirror import IndicatorMirror
+from blockade.common.retry import RetryPolicy
+from blockade.libs import indicators
+from blockade.libs.indicators import IndicatorClient
+
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    """Configuration directory in a temporary home, with empty whitelists."""
+    monkeypatch.setenv('HOME', str(tmpdir))
+    config = tmpdir.mkdir('.config').mkdir('blockade')
+    for name in ('alexa.txt', 'cisco.txt'):
+        config.join(name).write('')
+    monkeypatch.setattr('blockade.common.journal.JOURNAL_PATH',
+                        str(config.join('journals')))
+    # tldextract downloads the suffix list, whitelists are empty anyway
+    monkeypatch.setattr(indicators, 'check_whitelist',
+                        lambda values, whitelist=None: list(values))
+    return config
+
+
+@pytest.fixture
+def node():
+    """Running emulated node with an admin user."""
+    emulator = NodeEmulator()
+    emulator.start()
+    emulator.admin = emulator.add_admin('admin@example.com')
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def send_event():
+    """Send an event to an emulated node, the way browser extensions do."""
+
+    def send(emulator, indicator, method='GET', source_ip='10.0.0.1',
+             ttl_days=None):
+        event = {'indicatorMatch': indicator, 'analysisValue': indicator,
+                 'analysisTime': '2024-05-01T10:00:00',
+                 'metadata': {'timeStamp': 1500000000000,
+                              'type': 'main_frame', 'method': method}}
+        body = {'events': [event]}
+        if ttl_days is not None:
+            body['ttlDays'] = ttl_days
+        status, response = emulator.invoke('POST', 'send-events',
+                                           json.dumps(body),
+                                           source_ip=source_ip)
+        assert response['success']
+
+    return send
+
+
+@pytest.fixture
+def fail_call():
+    """Make the nth request of an emulated node to a path fail."""
+
+    def install(emulator, number, path='admin/add-indicators'):
+        invoke = emulator.invoke
+        calls = {'count': 0}
+
+        def failing(method, request_path, *args, **kwargs):
+            if request_path.strip('/').endswith(path):
+                calls['count'] += 1
+                if calls['count'] == number:
+                    return 502, {'message': 'Bad Gateway'}
+            return invoke(method, request_path, *args, **kwargs)
+
+        emulator.invoke = failing
+
+    return install
+
+
+@pytest.fixture
+def make_client(home, monkeypatch):
+    """Build indicator clients talking to an emulated node."""
+    monkeypatch.setattr(IndicatorClient, 'BATCH_INTERVAL', 0)
+
+    def build(emulator, batch_size=100, **kwargs):
+        kwargs.setdefault('cache', SubmissionCache(
+            str(home.join('cache.txt'))))
+        kwargs.setdefault('mirror', IndicatorMirror(
+            str(home.join('indicators.idx'))))
+        kwargs.setdefault('retry', RetryPolicy(attempts=1))
+        kwargs.setdefault('batcher', AdaptiveBatcher(
+            initial_size=batch_size, min_size=batch_size,
+            max_size=batch_size))
+        return IndicatorClient(emulator.admin['email'],
+                               emulator.admin['api_key'],
+                               server=emulator.url, **kwargs)
+
+    return build
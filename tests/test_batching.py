@@ -0,0 +1,40 @@
+"""Tests of the adaptive sizing of indicator batches."""
+from blockade.common.batching import ITEM_OVERHEAD, AdaptiveBatcher
+
+
+def test_batches_follow_the_size():
+    batcher = AdaptiveBatcher(initial_size=4, min_size=1)
+    values = ['%d' % x for x in range(10)]
+    assert [len(x) for x in batcher.batches(values)] == [4, 4, 2]
+
+
+def test_batches_stay_within_the_byte_budget():
+    value = 'x' * 96
+    batcher = AdaptiveBatcher(max_bytes=10 * (96 + ITEM_OVERHEAD),
+                              initial_size=100)
+    sizes = [len(x) for x in batcher.batches([value] * 25)]
+    assert sizes == [10, 10, 5]
+    # A single item larger than the budget still gets a batch of its own
+    big = AdaptiveBatcher(max_bytes=10)
+    assert list(big.batches(['x' * 50, 'y'])) == [['x' * 50], ['y']]
+
+
+def test_feedback_applies_to_the_next_batch():
+    batcher = AdaptiveBatcher(initial_size=2, min_size=1)
+    sizes = list()
+    for batch in batcher.batches(['x'] * 20):
+        sizes.append(len(batch))
+        batcher.record(0.1)
+    assert sizes[:3] == [2, 4, 7]
+
+
+def test_size_adapts_to_latency_and_failures():
+    batcher = AdaptiveBatcher(target_latency=1.0, initial_size=100,
+                              min_size=10, max_size=200)
+    assert batcher.record(0.1) == 151
+    assert batcher.record(0.1) == 200
+    assert batcher.record(0.8) == 200
+    assert batcher.record(4.0) == 50
+    assert batcher.record(0.7, congested=True) == 25
+    assert batcher.record(0.1, success=False) == 12
+    assert batcher.record(0.1, success=False) == 10
@@ -0,0 +1,131 @@
+"""Tests of the shared log of submitted indicators."""
+import pytest
+
+from blockade.common import cache as cache_module
+from blockade.common.cache import SubmissionCache
+
+KEYS = ['%032x' % x for x in range(6)]
+
+
+class Clock(object):
+
+    """Clock standing still until moved by the test."""
+
+    def __init__(self):
+        self.now = 1500000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('cache.txt'))
+
+
+def lines(path):
+    with open(path) as handle:
+        return handle.read().splitlines()
+
+
+def test_entries_expire_after_the_ttl(path, clock):
+    cache = SubmissionCache(path, ttl=60)
+    assert cache.add(KEYS[:3], KEYS[:3]) == 3
+    assert cache.prune(KEYS[:4], KEYS[:4]) == [KEYS[3]]
+    # Entries still fresh are not logged twice
+    assert cache.add(KEYS[:3], KEYS[:3]) == 0
+
+    clock.now += 61
+    reader = SubmissionCache(path, ttl=60)
+    assert reader.prune(KEYS[:4], KEYS[:4]) == KEYS[:4]
+    assert cache.add(KEYS[:1], KEYS[:1]) == 1
+    assert reader.prune(KEYS[:2], KEYS[:2]) == [KEYS[1]]
+
+
+def test_without_ttl_entries_never_expire(path, clock):
+    cache = SubmissionCache(path, ttl=None)
+    cache.add(KEYS[:2], KEYS[:2])
+    clock.now += 10 ** 9
+    assert SubmissionCache(path, ttl=None).prune(KEYS[:3], KEYS[:3]) == \
+        [KEYS[2]]
+
+
+def test_compaction_drops_expired_entries(path, clock):
+    cache = SubmissionCache(path, ttl=60)
+    cache.COMPACT_MIN_LINES = 4
+    cache.add(KEYS[:4], KEYS[:4])
+    assert len(lines(path)) == 4
+
+    reader = SubmissionCache(path, ttl=60)
+    assert reader.prune(KEYS, KEYS) == KEYS[4:]
+
+    clock.now += 61
+    cache.add(KEYS[4:5], KEYS[4:5])
+    content = lines(path)
+    assert content[0].startswith('# blockade cache ')
+    assert [x.split('\t')[0] for x in content[1:]] == [KEYS[4]]
+    # A reader of the replaced log starts over instead of skipping lines
+    assert reader.prune(KEYS, KEYS) == KEYS[:4] + KEYS[5:]
+
+
+def test_explicit_compaction_removes_duplicates(path, clock):
+    with open(path, 'w') as handle:
+        for key in KEYS[:2] * 3:
+            handle.write('%s\t%d\n' % (key, clock.now))
+    cache = SubmissionCache(path, ttl=60)
+    assert cache.compact() == 2
+    assert len(lines(path)) == 3
+
+
+def test_torn_line_is_dropped_before_appending(path, clock):
+    cache = SubmissionCache(path, ttl=60)
+    cache.add(KEYS[:1], KEYS[:1])
+    with open(path, 'a') as handle:
+        handle.write(KEYS[1][:20])  # Writer killed mid-line
+
+    writer = SubmissionCache(path, ttl=60)
+    assert writer.add(KEYS[2:3], KEYS[2:3]) == 1
+    assert [x.split('\t')[0] for x in lines(path)] == [KEYS[0], KEYS[2]]
+    reader = SubmissionCache(path, ttl=60)
+    assert reader.prune(KEYS[:3], KEYS[:3]) == [KEYS[1]]
+
+
+def test_entries_expired_on_the_node_are_sent_again(path, clock):
+    cache = SubmissionCache(path, ttl=60)
+    cache.add(KEYS[:2], KEYS[:2], expires=clock.now + 10)
+    cache.add(KEYS[2:3], KEYS[2:3])
+    clock.now += 11
+    reader = SubmissionCache(path, ttl=60)
+    assert reader.prune(KEYS[:3], KEYS[:3]) == KEYS[:2]
+    assert cache.add(KEYS[:3], KEYS[:3]) == 2
+
+
+def append_keys(path, start):
+    cache = SubmissionCache(path)
+    cache.COMPACT_MIN_LINES = 50
+    for idx in range(start, start + 100, 10):
+        keys = ['%032x' % x for x in range(idx, idx + 10)]
+        cache.add(keys, keys)
+
+
+def test_concurrent_writers_lose_nothing(path):
+    import multiprocessing
+    workers = [multiprocessing.Process(target=append_keys,
+                                       args=(path, x * 100))
+               for x in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(x.exitcode == 0 for x in workers)
+    keys = ['%032x' % x for x in range(400)]
+    assert SubmissionCache(path).prune(keys, keys) == []
+    assert all(len(x.split('\t')) == 2 for x in lines(path)
+               if not x.startswith('#'))
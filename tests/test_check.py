@@ -0,0 +1,55 @@
+"""Tests of the check-indicators endpoint and client."""
+import hashlib
+import time
+
+from blockade.common.cache import SubmissionCache
+
+FEED = ['evil%d.example.com' % x for x in range(8)]
+
+
+def put(emulator, indicator, creator, expires=None):
+    item = {'indicator': indicator, 'creator': creator}
+    if expires:
+        item['expires'] = int(expires)
+    emulator.store.table('blockade_indicators').put_item(Item=item)
+
+
+def test_check_splits_known_and_missing(node, make_client):
+    client = make_client(node)
+    client.add_indicators(FEED[:3])
+    result = client.check_indicators(FEED)
+    assert sorted(result['existing']) == FEED[:3]
+    assert sorted(result['missing']) == FEED[3:]
+
+
+def test_check_only_sends_missing_indicators(node, make_client, tmpdir):
+    make_client(node).add_indicators(FEED[:5])
+    # Another host, with an empty cache
+    client = make_client(node, cache=SubmissionCache(
+        str(tmpdir.join('other.txt'))))
+    result = client.add_indicators(FEED, check=True)
+    assert result['written'] == 3
+
+
+def test_indicator_alive_for_another_creator_is_known(node, make_client,
+                                                       monkeypatch):
+    hexed = hashlib.md5(FEED[0].encode('utf-8')).hexdigest()
+    put(node, hexed, 'a@example.com', time.time() - 60)
+    put(node, hexed, 'b@example.com')
+    put(node, '%032x' % 1, 'a@example.com', time.time() - 60)
+
+    table = node.store.table('blockade_indicators')
+    query = table.query
+    calls = list()
+
+    def recording(**kwargs):
+        calls.append(kwargs)
+        return query(**kwargs)
+
+    monkeypatch.setattr(table, 'query', recording)
+    result = make_client(node).check_indicators([FEED[0], '%032x' % 1])
+    assert result['existing'] == [FEED[0]]
+    assert all(x['Limit'] == 1 for x in calls)
+    assert all(x['ProjectionExpression'] == '#i, expires' for x in calls)
+    # The expired item of the first creator is skipped with a second read
+    assert len(calls) == 3
@@ -0,0 +1,77 @@
+"""Tests of the compressed bodies exchanged with the node."""
+import json
+
+import pytest
+
+from blockade.aws.emulator import NodeEmulator
+from blockade.common.compression import (accepted_encoding, compress,
+                                         decompress)
+
+
+def stored(emulator):
+    return len(emulator.store.table('blockade_indicators').items)
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_bodies_round_trip(encoding):
+    data = b'{"indicators": ["%s"]}' % (b'a' * 2000)
+    packed = compress(data, encoding)
+    assert len(packed) < len(data) / 10
+    assert decompress(packed, encoding.upper()) == data
+    assert decompress(data, None) == data
+    with pytest.raises(ValueError):
+        compress(data, 'br')
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('deflate', 'deflate'),
+    ('gzip;q=0, deflate;q=0.5', 'deflate'),
+    ('*', 'gzip'),
+    ('br', None),
+    (None, None),
+])
+def test_accepted_encoding(header, expected):
+    assert accepted_encoding(header) == expected
+
+
+def test_large_responses_come_back_compressed(node, make_client):
+    client = make_client(node)
+    client.add_indicators(['evil%d.example.com' % x for x in range(500)])
+    received = client.metrics.counters.get('request.bytes_received', 0)
+    indicators = client.get_indicators()['indicators']
+    assert len(indicators) == 500
+    received = client.metrics.counters['request.bytes_received'] - received
+    assert received < len(json.dumps(indicators)) * 0.75
+
+
+def test_rejected_gzip_is_sent_again_uncompressed(home, make_client):
+    emulator = NodeEmulator(compression_size=None)
+    emulator.start()
+    try:
+        emulator.admin = emulator.add_admin('admin@example.com')
+        client = make_client(emulator)
+        indicators = ['evil%d.example.com' % x for x in range(150)]
+        result = client.add_indicators(indicators[:100])
+        assert (result['success'], result['failure']) == (1, 0)
+        assert client.compression_size is None
+        assert client.metrics.counters['request.compression_rejected'] == 1
+
+        requests = emulator.stats['requests']
+        result = client.add_indicators(indicators[100:])
+        assert result['success'] == 1
+        assert emulator.stats['requests'] - requests == 1
+        assert stored(emulator) == 150
+    finally:
+        emulator.stop()
+
+
+def test_gzip_is_kept_when_the_node_accepts_it(node, make_client):
+    client = make_client(node)
+    size = client.compression_size
+    result = client.add_indicators(['evil%d.example.com' % x
+                                    for x in range(100)])
+    assert result['success'] == 1
+    assert client.compression_size == size
+    assert 'request.compression_rejected' not in client.metrics.counters
+    assert stored(node) == 100
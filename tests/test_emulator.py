@@ -0,0 +1,42 @@
+"""Tests of the in-memory DynamoDB fakes of the emulator."""
+import pytest
+
+from blockade.aws.emulator import FakeTable, evaluate_filter
+
+
+def make_table(count):
+    table = FakeTable('things', [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+    for idx in range(count):
+        table.put_item(Item={'id': 'item%03d' % idx, 'size': idx})
+    return table
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('#s > :small AND #s < :big', True),
+    ('NOT #s > :small', False),
+    ('NOT (#s < :small OR #c = :red)', True),
+    ('(#s < :small OR #c = :red) AND attribute_exists(#s)', False),
+    ('NOT (NOT attribute_not_exists(missing))', True),
+    ('#c = :blue AND (attribute_exists(missing) OR #s >= :small)', True),
+])
+def test_evaluate_filter(expression, expected):
+    item = {'size': 5, 'colour': 'blue'}
+    names = {'#s': 'size', '#c': 'colour'}
+    values = {':small': 1, ':big': 10, ':red': 'red', ':blue': 'blue'}
+    assert evaluate_filter(expression, item, names, values) is expected
+
+
+def test_evaluate_filter_rejects_unbalanced_parentheses():
+    with pytest.raises(Exception):
+        evaluate_filter('(#s > :small', {'size': 5}, {'#s': 'size'},
+                        {':small': 1})
+
+
+def test_scan_filters_after_limit():
+    table = make_table(10)
+    results = table.scan(Limit=4, FilterExpression='#s >= :min',
+                         ExpressionAttributeNames={'#s': 'size'},
+                         ExpressionAttributeValues={':min': 2})
+    assert results['ScannedCount'] == 4
+    assert [x['id'] for x in results['Items']] == ['item002', 'item003']
+    assert results['LastEvaluatedKey'] == {'id': 'item003'}
@@ -0,0 +1,59 @@
+"""Tests of the local event store and its sync with the node."""
+import pytest
+
+from blockade.common.eventstore import EventStore
+from blockade.common.retry import RetryPolicy
+from blockade.libs.events import EventsClient
+
+
+def put_events(emulator, stored_times):
+    table = emulator.store.table('blockade_events')
+    for idx, stored in enumerate(stored_times):
+        table.put_item(Item={'event': 'event%03d' % idx, 'storedAt': stored,
+                             'indicatorMatch': 'evil%d.com' % (idx % 3),
+                             'analysisValue': 'evil%d.com' % (idx % 3)})
+
+
+@pytest.fixture
+def client(node):
+    return EventsClient(node.admin['email'], node.admin['api_key'],
+                        server=node.url, retry=RetryPolicy(attempts=1))
+
+
+def test_empty_store_passed_in_is_used(node, client, tmpdir):
+    put_events(node, [1000, 1001])
+    store = EventStore(str(tmpdir.join('events.db')))
+    result = client.sync_events(store)
+    assert result['eventsCount'] == 2
+    assert len(store) == 2
+    assert store.last_stored == 1001
+
+
+def test_interrupted_sync_is_pulled_again(node, client, fail_call, tmpdir):
+    # Scan pages are unordered: the newest events come first
+    put_events(node, [5000 + x for x in range(5)] + [1000 + x
+                                                     for x in range(5)])
+    store = EventStore(str(tmpdir.join('events.db')))
+    fail_call(node, 2, 'admin/get-events')
+    with pytest.raises(Exception):
+        client.sync_events(store, limit=5)
+    assert len(store) == 5
+    assert store.last_stored == 0
+
+    result = client.sync_events(store, limit=5)
+    assert result['eventsCount'] == 5
+    assert len(store) == 10
+    assert store.last_stored == 5004
+    assert store.sync_since() == 5004 - 300
+
+
+def test_queries_use_the_stored_events(tmpdir):
+    store = EventStore(str(tmpdir.join('events.db')))
+    store.add([{'event': 'a', 'indicatorMatch': 'evil.com',
+                'storedAt': 100, 'metadata': {'timeStamp': 50}},
+               {'event': 'b', 'indicatorMatch': 'evil.com', 'storedAt': 200},
+               {'event': 'c', 'indicatorMatch': 'bad.com', 'storedAt': 300}])
+    assert store.top('indicator') == [('evil.com', 2), ('bad.com', 1)]
+    assert [x['event'] for x in store.events(indicator='evil.com')] == \
+        ['a', 'b']
+    assert [x['event'] for x in store.events(since=150)] == ['b', 'c']
@@ -0,0 +1,115 @@
+"""Tests of the parallel segmented flush of events."""
+import json
+import threading
+
+from blockade.aws.emulator import FakeTable
+from blockade.libs.events import EventsClient
+
+
+def make_table(count):
+    table = FakeTable('things', [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+    for idx in range(count):
+        table.put_item(Item={'id': 'item%03d' % idx, 'size': idx})
+    return table
+
+
+def scan_all(table, **kwargs):
+    """Read a whole table a page at a time, return the ids in order."""
+    seen = list()
+    while True:
+        results = table.scan(**kwargs)
+        seen.extend(x['id'] for x in results['Items'])
+        if 'LastEvaluatedKey' not in results:
+            return seen
+        kwargs['ExclusiveStartKey'] = results['LastEvaluatedKey']
+
+
+def test_scan_segments_split_the_table():
+    table = make_table(200)
+    segments = [scan_all(table, Limit=7, Segment=x, TotalSegments=4)
+                for x in range(4)]
+    found = [x for segment in segments for x in segment]
+    assert sorted(found) == sorted(x[0] for x in table.items)
+    assert len(found) == len(set(found))
+    assert all(segments)
+
+
+def test_scan_resumes_after_deleting_the_page():
+    table = make_table(25)
+    seen = list()
+    kwargs = {'Limit': 10}
+    while True:
+        results = table.scan(**kwargs)
+        for item in results['Items']:
+            seen.append(item['id'])
+            table.delete_item(Key={'id': item['id']})
+        if 'LastEvaluatedKey' not in results:
+            break
+        kwargs['ExclusiveStartKey'] = results['LastEvaluatedKey']
+    assert seen == ['item%03d' % x for x in range(25)]
+    assert not table.items
+
+
+class StepClock(object):
+
+    """Clock moving one second forward every time it is read."""
+
+    def __init__(self):
+        self.now = 1000000000.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        with self.lock:
+            self.now += 1
+            return self.now
+
+    def sleep(self, seconds):
+        pass
+
+
+def test_flush_continues_until_the_table_is_empty(node, home, monkeypatch):
+    events = node.store.table('blockade_events')
+    for idx in range(60):
+        events.put_item(Item={'indicatorMatch': 'ioc%d' % (idx % 7),
+                              'event': 'event%03d' % idx})
+    flush = node.routes['admin/flush-events']['module']
+    # Every call runs out of time after a single page
+    monkeypatch.setattr(flush, 'time', StepClock())
+    monkeypatch.setattr(flush, 'TIME_BUDGET', 2)
+    monkeypatch.setattr(flush, 'PAGE_SIZE', 5)
+
+    body = {'email': node.admin['email'], 'api_key': node.admin['api_key'],
+            'segments': 3}
+    status, first = node.invoke('DELETE', 'admin/flush-events',
+                                json.dumps(body))
+    assert status == 200 and first['success']
+    assert not first['done'] and first['continuation']
+    assert 0 < first['deleted'] < 60
+
+    body['continuation'] = first['continuation']
+    status, second = node.invoke('DELETE', 'admin/flush-events',
+                                 json.dumps(body))
+    assert second['success'] and second['deleted'] > 0
+
+    client = EventsClient(node.admin['email'], node.admin['api_key'],
+                          server=node.url)
+    requests = node.stats['requests']
+    result = client.flush_events(segments=3)
+    assert result['success']
+    assert first['deleted'] + second['deleted'] + result['deleted'] == 60
+    assert node.stats['requests'] - requests > 1
+    assert not events.items
+
+
+def test_flush_deletes_the_stored_objects(node, send_event):
+    for idx in range(12):
+        send_event(node, 'evil%d.com' % idx)
+    bucket = node.store.bucket(
+        node.routes['admin/flush-events']['module'].os.environ['s3_bucket'])
+    assert len(bucket.objects) == 12
+    client = EventsClient(node.admin['email'], node.admin['api_key'],
+                          server=node.url)
+    result = client.flush_events(delete_objects=True, segments=4)
+    assert (result['deleted'], result['objectsDeleted']) == (12, 12)
+    assert not bucket.objects
+    assert not node.store.table('blockade_events').items
@@ -0,0 +1,199 @@
+"""Tests of the IAM bootstrap of a cloud node."""
+import json
+import threading
+
+import boto3
+import pytest
+
+from blockade.cli import aws_serverless
+
+ACCOUNT = '123456789012'
+
+
+class Clock(object):
+
+    """Clock only moved by the sleeps of the code under test."""
+
+    def __init__(self):
+        self.now = 1500000000.0
+        self.sleeps = list()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class EntityAlreadyExistsException(Exception):
+    pass
+
+
+class NoSuchEntityException(Exception):
+    pass
+
+
+class FakeIAM(object):
+
+    """IAM client where new entities take a few reads to become visible."""
+
+    class exceptions(object):
+        EntityAlreadyExistsException = EntityAlreadyExistsException
+        NoSuchEntityException = NoSuchEntityException
+
+    def __init__(self, existing=(), attached=(), hidden_reads=2,
+                 service='lambda.amazonaws.com'):
+        self.existing = set(existing)
+        self.attached = {'role': set(x for k, x in attached if k == 'role'),
+                         'group': set(x for k, x in attached
+                                      if k == 'group')}
+        self.hidden_reads = hidden_reads
+        self.service = service
+        self.reads = dict()
+        self.calls = list()
+        self.lock = threading.Lock()
+
+    def _record(self, operation, **kwargs):
+        with self.lock:
+            self.calls.append((operation, kwargs))
+
+    def _create(self, kind, name, **kwargs):
+        self._record('create_' + kind, **kwargs)
+        if name in self.existing:
+            raise EntityAlreadyExistsException(name)
+        self.existing.add(name)
+
+    def create_user(self, **kwargs):
+        self._create('user', kwargs['UserName'], **kwargs)
+
+    def create_role(self, **kwargs):
+        self._create('role', kwargs['RoleName'], **kwargs)
+
+    def create_group(self, **kwargs):
+        self._create('group', kwargs['GroupName'], **kwargs)
+
+    def create_policy(self, **kwargs):
+        self._create('policy', kwargs['PolicyName'], **kwargs)
+
+    def _visible(self, name):
+        with self.lock:
+            self.reads[name] = self.reads.get(name, 0) + 1
+            return self.reads[name] > self.hidden_reads
+
+    def get_policy(self, PolicyArn):
+        if not self._visible(PolicyArn):
+            raise NoSuchEntityException(PolicyArn)
+        return {'Policy': {'Arn': PolicyArn}}
+
+    def get_role(self, RoleName):
+        if not self._visible(RoleName):
+            raise NoSuchEntityException(RoleName)
+        document = {'Statement': [{'Effect': 'Allow',
+                                   'Principal': {'Service': self.service},
+                                   'Action': 'sts:AssumeRole'}]}
+        return {'Role': {'RoleName': RoleName,
+                         'AssumeRolePolicyDocument': document}}
+
+    def get_paginator(self, operation):
+        kind = 'role' if operation == 'list_attached_role_policies' \
+            else 'group'
+        arns = sorted(self.attached[kind])
+        paginator = type('Paginator', (object,), dict())()
+        paginator.paginate = lambda **kwargs: iter([
+            {'AttachedPolicies': [{'PolicyArn': x} for x in arns[:1]]},
+            {'AttachedPolicies': [{'PolicyArn': x} for x in arns[1:]]}
+        ])
+        return paginator
+
+    def attach_role_policy(self, **kwargs):
+        self._record('attach_role_policy', **kwargs)
+
+    def attach_group_policy(self, **kwargs):
+        self._record('attach_group_policy', **kwargs)
+
+    def add_user_to_group(self, **kwargs):
+        self._record('add_user_to_group', **kwargs)
+
+    def operations(self, name):
+        return [kwargs for operation, kwargs in self.calls
+                if operation == name]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aws_serverless, 'time', clock)
+    return clock
+
+
+def use_client(monkeypatch, client):
+    user = type('User', (object,), {
+        'arn': 'arn:aws:iam::%s:user/analyst' % ACCOUNT})
+    resource = type('Resource', (object,), {'CurrentUser': lambda s: user})
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: client)
+    monkeypatch.setattr(boto3, 'resource', lambda *args, **kwargs: resource())
+
+
+def test_bootstrap_creates_everything_once(monkeypatch, clock):
+    client = FakeIAM()
+    use_client(monkeypatch, client)
+    assert aws_serverless.generate_handler() is True
+
+    created = [x for x, _ in client.calls if x.startswith('create_')]
+    assert sorted(created) == sorted(
+        ['create_user', 'create_role', 'create_group'] +
+        ['create_policy'] * len(aws_serverless.BLOCKADE_POLICIES))
+    role = client.operations('create_role')[0]
+    assert json.loads(role['AssumeRolePolicyDocument'])
+    arns = aws_serverless.policy_arns(ACCOUNT)
+    expected = sorted(arns.values())
+    assert sorted(x['PolicyArn'] for x in
+                  client.operations('attach_role_policy')) == expected
+    assert sorted(x['PolicyArn'] for x in
+                  client.operations('attach_group_policy')) == expected
+    assert client.operations('add_user_to_group') == [
+        {'GroupName': aws_serverless.BLOCKADE_GROUP,
+         'UserName': aws_serverless.BLOCKADE_USER}]
+    # Policies and the role were polled until IAM made them visible
+    assert all(client.reads[x] == 3 for x in
+               [arns[x] for x in aws_serverless.BLOCKADE_POLICIES])
+    assert client.reads[aws_serverless.BLOCKADE_ROLE] == 3
+
+
+def test_bootstrap_only_attaches_missing_policies(monkeypatch, clock):
+    arns = aws_serverless.policy_arns(ACCOUNT)
+    attached = [('role', arns[x]) for x in arns] + \
+        [('group', arns['PushToCloud']), ('group', arns['Blockade_S3'])]
+    names = [aws_serverless.BLOCKADE_USER, aws_serverless.BLOCKADE_ROLE,
+             aws_serverless.BLOCKADE_GROUP] + aws_serverless.BLOCKADE_POLICIES
+    client = FakeIAM(existing=names, attached=attached, hidden_reads=0)
+    use_client(monkeypatch, client)
+    assert aws_serverless.generate_handler() is True
+
+    assert client.operations('attach_role_policy') == list()
+    assert sorted(x['PolicyArn'] for x in
+                  client.operations('attach_group_policy')) == sorted(
+        x for label, x in arns.items()
+        if label not in ('PushToCloud', 'Blockade_S3'))
+    assert clock.sleeps == list()
+
+
+def test_wait_for_role_backs_off_until_ready(clock):
+    client = FakeIAM(hidden_reads=5)
+    assert aws_serverless.wait_for_role(client, timeout=60) is True
+    assert client.reads[aws_serverless.BLOCKADE_ROLE] == 6
+    assert clock.sleeps == [0.5, 1, 2, 4, 5]
+
+
+def test_wait_for_role_needs_the_lambda_trust_policy(clock):
+    client = FakeIAM(hidden_reads=0, service=['ec2.amazonaws.com'])
+    assert aws_serverless.wait_for_role(client, timeout=10) is False
+    assert sum(clock.sleeps) <= 10
+
+
+def test_wait_for_policy_raises_on_timeout(clock):
+    client = FakeIAM(hidden_reads=100)
+    with pytest.raises(Exception) as error:
+        aws_serverless.wait_for_policy(client, 'arn:policy', timeout=5)
+    assert 'arn:policy' in str(error.value)
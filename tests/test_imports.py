@@ -0,0 +1,20 @@
+"""Tests keeping heavy dependencies out of the command line imports."""
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = ['boto3', 'botocore', 'requests', 'tldextract', 'gevent',
+         'grequests']
+PROBE = ("import json, sys; __import__(%r); "
+         "print(json.dumps([x for x in %r if x in sys.modules]))")
+
+
+@pytest.mark.parametrize('module', ['blockade.cli.client',
+                                    'blockade.cli.config',
+                                    'blockade.cli.aws_serverless'])
+def test_entry_points_import_no_heavy_dependency(module):
+    output = subprocess.check_output([sys.executable, '-c',
+                                      PROBE % (module, HEAVY)])
+    assert json.loads(output.decode('utf-8').splitlines()[-1]) == []
@@ -0,0 +1,108 @@
+"""Tests of the checkpoint journal of file submissions."""
+import os
+
+import pytest
+
+from blockade.common.journal import SubmissionJournal
+
+
+@pytest.fixture
+def source(tmpdir):
+    path = tmpdir.join('feed.txt')
+    path.write('evil.example.com\n')
+    return str(path)
+
+
+def stored(emulator):
+    return len(emulator.store.table('blockade_indicators').items)
+
+
+def write_feed(tmpdir, count):
+    path = tmpdir.join('feed.txt')
+    path.write(''.join('evil%d.example.com\n' % x for x in range(count)))
+    return str(path)
+
+
+def journal(source, tmpdir):
+    return SubmissionJournal(source, str(tmpdir.join('journal.jsonl')))
+
+
+def test_failed_batches_are_pending_after_load(source, tmpdir):
+    first = journal(source, tmpdir)
+    first.start()
+    first.record_batch(['a'], [], False)
+    first.record_batch(['b'], [], True)
+    first.checkpoint(17)
+    first.close()
+
+    resumed = journal(source, tmpdir)
+    assert resumed.load()
+    assert resumed.offset == 17
+    assert list(resumed.pending) == [0]
+    assert resumed.pending[0]['indicators'] == ['a']
+    assert resumed.next_batch == 2
+
+
+def test_torn_record_is_dropped_before_appending(source, tmpdir):
+    first = journal(source, tmpdir)
+    first.start()
+    first.record_batch(['a'], [], False)
+    first.handle.write('{"type": "batch", "id": 1, "sta')  # Killed mid-line
+    first.handle.close()
+
+    resumed = journal(source, tmpdir)
+    assert resumed.load()
+    resumed.record_batch(['c'], [], False)
+    resumed.checkpoint(17)
+    resumed.handle.close()
+
+    again = journal(source, tmpdir)
+    assert again.load()
+    assert list(again.pending) == [0, 1]
+    assert again.pending[1]['indicators'] == ['c']
+    assert again.offset == 17
+
+
+def test_changed_source_is_not_resumed(source, tmpdir):
+    first = journal(source, tmpdir)
+    first.start()
+    first.record_batch(['a'], [], False)
+    first.close()
+    with open(source, 'a') as handle:
+        handle.write('bad.example.com\n')
+    assert not journal(source, tmpdir).load()
+
+
+def test_resume_only_resends_failed_batches(node, make_client, fail_call,
+                                            tmpdir):
+    source = write_feed(tmpdir, 30)
+    fail_call(node, 2)
+    client = make_client(node, batch_size=10)
+    result = client.submit_file(source)
+    assert (result['success'], result['failure']) == (2, 1)
+    assert stored(node) == 20
+
+    client = make_client(node, batch_size=10)
+    requests = node.stats['requests']
+    result = client.submit_file(source, resume=True)
+    assert (result['success'], result['failure']) == (1, 0)
+    assert result['written'] == 10
+    assert node.stats['requests'] - requests == 1
+    assert stored(node) == 30
+    # Nothing is left to retry, so the journal is gone
+    journals = str(tmpdir.join('.config', 'blockade', 'journals'))
+    assert not os.listdir(journals)
+
+
+def test_resume_of_a_changed_file_starts_over(node, make_client, fail_call,
+                                              tmpdir):
+    source = write_feed(tmpdir, 20)
+    fail_call(node, 1)
+    make_client(node, batch_size=10).submit_file(source)
+    assert stored(node) == 10
+
+    write_feed(tmpdir, 25)
+    result = make_client(node, batch_size=10).submit_file(source,
+                                                          resume=True)
+    assert result['failure'] == 0
+    assert stored(node) == 25
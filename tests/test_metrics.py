@@ -0,0 +1,61 @@
+"""Tests of the metrics recorded by the clients."""
+import io
+import json
+import socket
+
+from blockade.common.metrics import (JsonLinesMetrics, MetricsRecorder,
+                                     StatsdMetrics)
+
+
+def test_recorder_aggregates_and_forwards():
+    stream = io.StringIO()
+    recorder = MetricsRecorder(JsonLinesMetrics(stream))
+    recorder.incr('request.count')
+    recorder.incr('request.count', 2)
+    recorder.gauge('batch.size', 500)
+    for seconds in (0.01, 0.2, 30):
+        recorder.observe('request.latency', seconds)
+    with recorder.stage('hash'):
+        pass
+
+    assert recorder.counters['request.count'] == 3
+    assert recorder.gauges['batch.size'] == 500
+    histogram = recorder.histogram('request.latency')
+    assert histogram['<=0.05s'] == 1
+    assert histogram['<=0.25s'] == 1
+    assert histogram['>10s'] == 1
+    assert list(recorder.stage_timings()) == ['hash']
+
+    lines = [json.loads(x) for x in stream.getvalue().splitlines()]
+    assert [x['type'] for x in lines[:3]] == ['counter', 'counter', 'gauge']
+    assert lines[-1]['metric'] == 'stage.hash'
+
+    recorder.reset()
+    assert not recorder.counters and not recorder.timings
+
+
+def test_statsd_sends_datagrams():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    try:
+        sink = StatsdMetrics(port=server.getsockname()[1], prefix='test')
+        sink.timing('request.latency', 0.25)
+        sink.incr('request.count')
+        received = [server.recv(100) for _ in range(2)]
+    finally:
+        server.close()
+    assert received == [b'test.request.latency:250|ms',
+                        b'test.request.count:1|c']
+
+
+def test_submissions_report_stages_and_requests(node, make_client):
+    client = make_client(node, batch_size=10)
+    result = client.add_indicators(['evil%d.example.com' % x
+                                    for x in range(25)])
+    assert result['requests'] == 3
+    for stage in ('clean', 'whitelist', 'hash', 'cache', 'send'):
+        assert stage in result['timings']
+    assert sum(result['latency'].values()) == 3
+    assert result['bytes_sent'] > 0
+    assert result['retries'] == 0
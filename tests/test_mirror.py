@@ -0,0 +1,60 @@
+"""Tests of the local mirror of the node's indicators."""
+import time
+
+from blockade.common import mirror as mirror_module
+from blockade.common.cache import SubmissionCache
+from blockade.common.mirror import IndicatorMirror
+
+FEED = ['evil%d.example.com' % x for x in range(10)]
+
+
+def test_mirror_passed_in_is_used(node, make_client, home):
+    mirror = IndicatorMirror(str(home.join('other.idx')))
+    client = make_client(node, mirror=mirror)
+    assert client.mirror is mirror
+    client.add_indicators(FEED[:5])
+    client.sync_cache()
+    assert home.join('other.idx').check()
+
+
+def test_known_indicators_are_skipped(node, make_client, home, tmpdir):
+    make_client(node).add_indicators(FEED[:5])
+    # Another host, with an empty cache
+    client = make_client(node, cache=SubmissionCache(
+        str(tmpdir.join('other.txt'))))
+    assert client.sync_cache()['indicatorCount'] == 5
+    result = client.add_indicators(FEED)
+    assert result['written'] == 5
+
+
+def test_old_mirror_is_ignored(tmpdir):
+    mirror = IndicatorMirror(str(tmpdir.join('indicators.idx')), max_age=60)
+    mirror.save(FEED[:5], synced=time.time() - 61)
+    assert not mirror.load()
+    assert mirror.prune(FEED) == FEED
+
+    mirror.save(FEED[:5])
+    assert mirror.load()
+    assert mirror.prune(FEED) == FEED[5:]
+
+
+def test_mirror_of_an_older_release_is_ignored(tmpdir):
+    path = tmpdir.join('indicators.idx')
+    path.write_binary(b'BLOCKADE-IDX1\n' + b'\0' * 32)
+    assert not IndicatorMirror(str(path)).load()
+
+
+def test_sync_leaves_out_indicators_expiring_soon(node, make_client):
+    now = int(time.time())
+    table = node.store.table('blockade_indicators')
+    for idx, expires in enumerate([None, now + mirror_module.MAX_AGE + 3600,
+                                   now + 60]):
+        item = {'indicator': '%032x' % idx, 'creator': 'admin@example.com'}
+        if expires:
+            item['expires'] = expires
+        table.put_item(Item=item)
+    client = make_client(node)
+    assert client.sync_cache()['indicatorCount'] == 2
+    assert client.mirror.load()
+    assert '%032x' % 2 not in client.mirror
+    assert '%032x' % 1 in client.mirror
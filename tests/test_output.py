@@ -0,0 +1,63 @@
+"""Tests of the streamed event writers."""
+import csv
+import io
+import json
+
+import pytest
+
+from blockade.common.output import (EventWriter, flatten_event, get_writer,
+                                    open_output)
+
+EVENTS = [{'event': 'e%d' % x, 'sourceIp': '10.0.0.%d' % x,
+           'indicatorMatch': 'evil%d.com' % x,
+           'metadata': {'method': 'GET', 'url': 'http://evil%d.com/' % x}}
+          for x in range(3)]
+
+
+def test_writers_must_implement_a_format():
+    with pytest.raises(TypeError):
+        EventWriter(io.StringIO())
+
+
+def test_flatten_uses_stored_names_and_metadata():
+    fields = flatten_event(EVENTS[0])
+    assert fields['ip'] == '10.0.0.0'
+    assert fields['match'] == 'evil0.com'
+    assert fields['method'] == 'GET'
+    assert fields['contact'] == ''
+
+
+@pytest.mark.parametrize('fmt', ['text', 'jsonl', 'csv'])
+def test_every_event_is_written(fmt):
+    stream = io.StringIO()
+    writer = get_writer(fmt, stream)
+    for event in EVENTS:
+        writer.write(event)
+    writer.close()
+    assert writer.count == 3
+    output = stream.getvalue()
+    assert all('evil%d.com' % x in output for x in range(3))
+
+
+def test_jsonl_keeps_complete_events():
+    stream = io.StringIO()
+    writer = get_writer('jsonl', stream)
+    writer.write(EVENTS[1])
+    assert json.loads(stream.getvalue()) == EVENTS[1]
+
+
+def test_csv_file_has_no_blank_rows(tmpdir):
+    path = str(tmpdir.join('events.csv'))
+    with open_output(path) as handle:
+        writer = get_writer('csv', handle)
+        for event in EVENTS:
+            writer.write(event)
+    with open(path) as handle:
+        rows = list(csv.reader(handle))
+    assert len(rows) == 4
+    assert all(rows)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        get_writer('xml', io.StringIO())
@@ -0,0 +1,49 @@
+"""Tests of the multi-core preprocessing of indicator feeds."""
+import functools
+
+import pytest
+
+from blockade.common.parallel import Preprocessor
+from blockade.common.utils import digest_values
+
+
+@pytest.fixture(autouse=True)
+def offline_suffixes(monkeypatch):
+    """Use the public suffix list bundled with tldextract."""
+    import tldextract
+    monkeypatch.setattr(tldextract, 'TLDExtract', functools.partial(
+        tldextract.TLDExtract, suffix_list_urls=(), cache_dir=None))
+
+
+FEED = (['http://evil%d.example.com/path' % x for x in range(50)] +
+        ['www.google.com', 'mail.google.com', 'evil3.example.com'] +
+        ['evil%d.example.net' % x for x in range(50)])
+
+
+def expected():
+    kept = list()
+    for value in FEED:
+        value = value.replace('http://', '').split('/')[0]
+        if value not in kept and not value.endswith('google.com'):
+            kept.append(value)
+    return kept
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_output_does_not_depend_on_the_workers(workers):
+    with Preprocessor(workers, whitelisted={'google.com'},
+                      shard_size=7) as preprocessor:
+        output = preprocessor.run(FEED)
+    kept = expected()
+    assert list(output) == kept
+    assert list(output.values()) == digest_values(kept)['md5']
+
+
+def test_client_submits_through_the_workers(node, make_client):
+    client = make_client(node, workers=2)
+    try:
+        result = client.add_indicators(FEED)
+    finally:
+        client.close()
+    assert result['written'] == len(expected()) + 2
+    assert 'preprocess' in result['timings']
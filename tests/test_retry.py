@@ -0,0 +1,79 @@
+"""Tests of the retry policy of requests to the node."""
+import socket
+
+import pytest
+import requests
+
+from blockade.common.retry import RetryPolicy, never_sent
+
+
+class Response(object):
+
+    def __init__(self, status_code, content=b'{}'):
+        self.status_code = status_code
+        self.content = content
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_delays_grow_exponentially_up_to_the_bound():
+    policy = RetryPolicy(backoff=0.5, max_backoff=3, jitter=False)
+    assert [policy.delay(x) for x in range(5)] == [0.5, 1, 2, 3, 3]
+    jittered = RetryPolicy(backoff=0.5, max_backoff=3)
+    assert all(0 <= jittered.delay(3) <= 3 for _ in range(20))
+
+
+def test_refused_connection_was_never_sent():
+    with pytest.raises(requests.exceptions.ConnectionError) as error:
+        requests.post('http://127.0.0.1:%d/' % closed_port(), timeout=5)
+    assert never_sent(error.value)
+    assert not never_sent(requests.exceptions.ConnectionError('reset'))
+
+
+@pytest.mark.parametrize('error, idempotent, expected', [
+    (requests.exceptions.ConnectTimeout(), False, True),
+    (requests.exceptions.ReadTimeout(), False, False),
+    (requests.exceptions.ReadTimeout(), True, True),
+    (requests.exceptions.ConnectionError('reset'), False, False),
+    (requests.exceptions.ConnectionError('reset'), True, True),
+    (requests.exceptions.InvalidURL(), True, False),
+])
+def test_errors_are_retried_when_safe(error, idempotent, expected):
+    assert RetryPolicy().retry_error(0, error, idempotent) is expected
+
+
+@pytest.mark.parametrize('response, idempotent, expected', [
+    (Response(429), False, True),
+    (Response(502), False, False),
+    (Response(502), True, True),
+    (Response(400), True, False),
+    (Response(200, b'{"errorMessage": "Task timed out"}'), True, True),
+    (Response(200, b'{"errorMessage": "Task timed out"}'), False, False),
+    (Response(200, b'{"success": true}'), True, False),
+])
+def test_responses_are_retried_when_safe(response, idempotent, expected):
+    assert RetryPolicy().retry_response(0, response, idempotent) is expected
+
+
+def test_last_attempt_is_never_retried():
+    policy = RetryPolicy(attempts=2)
+    assert policy.retry_response(0, Response(429), False)
+    assert not policy.retry_response(1, Response(429), False)
+    assert not policy.retry_error(1, requests.exceptions.ConnectTimeout(),
+                                  True)
+
+
+def test_failed_batch_is_sent_again(node, make_client, fail_call):
+    fail_call(node, 1)
+    client = make_client(node, retry=RetryPolicy(attempts=3, backoff=0))
+    result = client.add_indicators(['evil%d.example.com' % x
+                                    for x in range(10)])
+    assert (result['success'], result['failure']) == (1, 0)
+    assert result['retries'] == 1
+    assert len(node.store.table('blockade_indicators').items) == 10
@@ -0,0 +1,131 @@
+"""Tests of the flushes of the API stage cache by indicator submissions."""
+import copy
+import json
+
+import boto3
+import pytest
+
+from blockade.cli import aws_serverless
+
+
+@pytest.fixture
+def flushes(node, monkeypatch):
+    """Count the flushes of a node whose stage caches get-indicators."""
+    module = node.routes['admin/add-indicators']['module']
+    monkeypatch.setitem(module.os.environ, 'rest_api_id', 'a1b2c3')
+    calls = list()
+
+    def flush_cache():
+        calls.append(True)
+        return True
+
+    monkeypatch.setattr(module, 'flush_cache', flush_cache)
+    return calls
+
+
+def write_feed(tmpdir, count):
+    path = tmpdir.join('feed.txt')
+    path.write(''.join('evil%d.example.com\n' % x for x in range(count)))
+    return str(path)
+
+
+def test_submission_flushes_once(node, make_client, flushes, tmpdir):
+    client = make_client(node, batch_size=10)
+    result = client.submit_file(write_feed(tmpdir, 45), chunk_size=20)
+    assert result['success'] == 5
+    assert len(flushes) == 1
+
+    client.add_indicators(['other%d.example.com' % x for x in range(25)])
+    assert len(flushes) == 2
+    # Nothing left to write, nothing to flush
+    client.add_indicators(['other%d.example.com' % x for x in range(25)])
+    assert len(flushes) == 2
+
+
+def test_node_without_cache_gets_no_flush_request(node, make_client):
+    client = make_client(node, batch_size=10)
+    requests = node.stats['requests']
+    client.add_indicators(['evil%d.example.com' % x for x in range(30)])
+    assert node.stats['requests'] - requests == 3
+
+
+def test_older_clients_flush_every_write(node, flushes):
+    body = {'email': node.admin['email'], 'api_key': node.admin['api_key'],
+            'indicators': ['evil.example.com']}
+    for _ in range(2):
+        status, response = node.invoke('POST', 'admin/add-indicators',
+                                       json.dumps(body))
+        assert response['success']
+    assert len(flushes) == 2
+
+
+class FakeGateway(object):
+
+    """API Gateway and Lambda client recording the stage and env updates."""
+
+    def __init__(self):
+        self.calls = list()
+
+    def update_stage(self, **kwargs):
+        self.calls.append(('update_stage', kwargs))
+
+    def get_function_configuration(self, FunctionName):
+        return {'State': 'Active', 'LastUpdateStatus': 'Successful'}
+
+    def update_function_configuration(self, **kwargs):
+        self.calls.append(('update_function_configuration', kwargs))
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    client = FakeGateway()
+    monkeypatch.setattr(aws_serverless, 'LAMBDA_SCHEMA',
+                        copy.deepcopy(aws_serverless.LAMBDA_SCHEMA))
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: client)
+    return client
+
+
+def patches(client):
+    update = [x for name, x in client.calls if name == 'update_stage'][0]
+    assert update['stageName'] == aws_serverless.API_STAGE
+    return dict((x['path'], x['value']) for x in update['patchOperations'])
+
+
+def environment(client):
+    update = [x for name, x in client.calls
+              if name == 'update_function_configuration'][0]
+    assert update['FunctionName'] == 'Blockade-Add-Indicators'
+    return update['Environment']['Variables']
+
+
+def test_stage_caches_get_responses(gateway):
+    aws_serverless.configure_stage_cache(gateway, 'a1b2c3', 300, '1.6')
+    operations = patches(gateway)
+    assert operations['/cacheClusterEnabled'] == 'true'
+    assert operations['/cacheClusterSize'] == '1.6'
+    caching = '/~1get-indicators/GET/caching'
+    assert operations[caching + '/enabled'] == 'true'
+    assert operations[caching + '/ttlInSeconds'] == '300'
+    # Only GET methods are cached
+    assert not [x for x in operations if '~1add-indicators' in x]
+    variables = environment(gateway)
+    assert variables['rest_api_id'] == 'a1b2c3'
+    assert variables['stage'] == aws_serverless.API_STAGE
+
+
+def test_disabled_cache_stops_the_flushes(gateway):
+    aws_serverless.configure_stage_cache(gateway, 'a1b2c3', 0)
+    operations = patches(gateway)
+    assert operations['/cacheClusterEnabled'] == 'false'
+    assert '/cacheClusterSize' not in operations
+    assert operations['/~1get-indicators/GET/caching/enabled'] == 'false'
+    assert not [x for x in operations if x.endswith('/ttlInSeconds')]
+    assert environment(gateway)['rest_api_id'] == ''
+
+
+def test_cached_responses_vary_on_the_query_string():
+    schema = aws_serverless.API_GATEWAY_RESOURCE_SCHEMA[
+        'Blockade-Get-Indicators']
+    assert aws_serverless.cache_key_parameters(schema) == [
+        'method.request.querystring.' + x
+        for x in ['limit', 'lastKey', 'tag', 'until']]
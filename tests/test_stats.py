@@ -0,0 +1,46 @@
+"""Tests of the event counters kept by the node."""
+import datetime
+
+import pytest
+
+from blockade.libs.events import EventsClient
+
+
+@pytest.fixture
+def client(node):
+    return EventsClient(node.admin['email'], node.admin['api_key'],
+                        server=node.url)
+
+
+def test_counters_are_aggregated_per_dimension(node, client, send_event):
+    for indicator, method in [('evil.com', 'GET'), ('evil.com', 'POST'),
+                              ('bad.com', 'GET')]:
+        send_event(node, indicator, method)
+    result = client.get_event_stats('indicator', days=1)
+    assert result['hits'] == 3
+    assert result['stats'] == [{'group': 'evil.com', 'hits': 2},
+                               {'group': 'bad.com', 'hits': 1}]
+    assert client.get_event_stats('method')['stats'][0] == \
+        {'group': 'get', 'hits': 2}
+    assert client.get_event_stats('ip')['groupCount'] == 1
+    top = client.get_event_stats('indicator', top=1)
+    assert [x['group'] for x in top['stats']] == ['evil.com']
+    assert top['groupCount'] == 2
+
+
+def test_only_the_requested_days_are_read(node, client, send_event):
+    send_event(node, 'evil.com')
+    old = datetime.datetime.utcnow().date() - datetime.timedelta(days=10)
+    node.store.table('blockade_event_stats').put_item(Item={
+        'stat': 'indicator#%s' % old.isoformat(), 'group': 'old.com',
+        'hits': 5})
+    assert client.get_event_stats(days=7)['hits'] == 1
+    result = client.get_event_stats(days=90)
+    assert result['hits'] == 6
+    assert result['since'] == (datetime.datetime.utcnow().date() -
+                               datetime.timedelta(days=89)).isoformat()
+
+
+def test_invalid_requests_are_rejected(client):
+    assert not client.get_event_stats(days=91)['success']
+    assert not client.get_event_stats('country')['success']
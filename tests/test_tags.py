@@ -0,0 +1,24 @@
+"""Tests of the tags stored with indicators."""
+FEED = ['evil%d.example.com' % x for x in range(6)]
+
+
+def test_tags_are_indexed(node, make_client):
+    client = make_client(node)
+    client.add_indicators(FEED[:3], tags='Phishing, apt1')
+    assert client.get_indicators(tag='phishing')['indicatorCount'] == 3
+    assert client.get_indicators(tag='APT1')['indicatorCount'] == 3
+    assert client.get_indicators(tag='other')['indicatorCount'] == 0
+
+
+def test_known_indicators_get_new_tags(node, make_client):
+    client = make_client(node)
+    client.add_indicators(FEED)
+    client.sync_cache()
+    # Without tags, the cache, mirror and check leave nothing to send
+    assert 'written' not in client.add_indicators(FEED, check=True)
+
+    result = client.add_indicators(FEED[:4], tags=['phishing'], check=True)
+    assert result['written'] == 4
+    assert client.get_indicators(tag='phishing')['indicatorCount'] == 4
+    index = node.store.table('blockade_tags').items
+    assert len(index) == 4
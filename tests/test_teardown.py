@@ -0,0 +1,222 @@
+"""Tests of the removal of a cloud node's resources."""
+import threading
+import time
+
+import boto3
+
+from blockade.cli import aws_serverless
+
+
+class FakePaginator(object):
+
+    """Paginator listing a bucket's objects in pages of 1000."""
+
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, Bucket):
+        keys = sorted(self.client.objects)
+        for idx in range(0, len(keys), 1000):
+            page = keys[idx:idx + 1000]
+            if self.operation == 'list_objects_v2':
+                yield {'Contents': [{'Key': x} for x in page]}
+            else:
+                yield {'Versions': [{'Key': x, 'VersionId': 'v1'}
+                                    for x in page],
+                       'DeleteMarkers': [{'Key': x, 'VersionId': 'v2'}
+                                         for x in page[:1]]}
+
+
+class FakeS3(object):
+
+    """S3 client deleting objects of a single bucket, slowly."""
+
+    def __init__(self, count, versioned=False, failing=()):
+        self.objects = set('records/%05d.json' % x for x in range(count))
+        self.versioned = versioned
+        self.failing = set(failing)
+        self.requests = list()
+        self.running = 0
+        self.concurrency = 0
+        self.lock = threading.Lock()
+
+    def get_bucket_versioning(self, Bucket):
+        return {'Status': 'Enabled'} if self.versioned else dict()
+
+    def get_paginator(self, operation):
+        return FakePaginator(self, operation)
+
+    def delete_objects(self, Bucket, Delete):
+        with self.lock:
+            self.running += 1
+            self.concurrency = max(self.concurrency, self.running)
+            self.requests.append(Delete['Objects'])
+        time.sleep(0.01)
+        errors = [{'Key': x['Key'], 'Message': 'Access Denied'}
+                  for x in Delete['Objects'] if x['Key'] in self.failing]
+        with self.lock:
+            self.running -= 1
+        return {'Errors': errors} if errors else dict()
+
+
+def test_bucket_is_emptied_a_page_per_request():
+    client = FakeS3(4500)
+    assert aws_serverless.empty_s3_bucket(client, 'bucket', workers=4) == \
+        (4500, 0)
+    assert sorted(len(x) for x in client.requests) == \
+        [500, 1000, 1000, 1000, 1000]
+    assert all('VersionId' not in x for x in client.requests[0])
+    assert client.concurrency > 1
+
+
+def test_versions_and_delete_markers_are_deleted():
+    client = FakeS3(1500, versioned=True)
+    assert aws_serverless.empty_s3_bucket(client, 'bucket', workers=2) == \
+        (1502, 0)
+    deleted = [x for page in client.requests for x in page]
+    assert all(x['VersionId'] for x in deleted)
+
+
+def test_failed_deletions_are_counted():
+    client = FakeS3(2000, failing=['records/00003.json',
+                                   'records/01500.json'])
+    assert aws_serverless.empty_s3_bucket(client, 'bucket', workers=2) == \
+        (1998, 2)
+
+
+def test_empty_bucket_sends_no_request():
+    client = FakeS3(0)
+    assert aws_serverless.empty_s3_bucket(client, 'bucket') == (0, 0)
+    assert client.requests == list()
+
+
+class ResourceNotFoundException(Exception):
+    pass
+
+
+class FakeService(object):
+
+    """DynamoDB or Lambda client where some resources are already gone."""
+
+    class exceptions(object):
+        ResourceNotFoundException = ResourceNotFoundException
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.deleted = list()
+        self.waited = list()
+
+    def _delete(self, name):
+        if name in self.missing:
+            raise ResourceNotFoundException(name)
+        self.deleted.append(name)
+        return {'name': name}
+
+    def delete_table(self, TableName):
+        return self._delete(TableName)
+
+    def delete_function(self, FunctionName):
+        return self._delete(FunctionName)
+
+    def get_waiter(self, name):
+        waiter = type('Waiter', (object,), dict())()
+        waiter.wait = lambda **kwargs: self.waited.append((name, kwargs))
+        return waiter
+
+
+def test_tables_already_removed_are_skipped(monkeypatch):
+    client = FakeService(missing=['blockade_tags'])
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: client)
+    responses = aws_serverless.remove_dynamodb_tables()
+    tables = [x for x in aws_serverless.DYNAMODB_TABLES
+              if x != 'blockade_tags']
+    assert sorted(x['name'] for x in responses) == sorted(tables)
+    assert sorted(x[1]['TableName'] for x in client.waited) == sorted(tables)
+    assert set(x[0] for x in client.waited) == set(['table_not_exists'])
+
+
+def test_functions_already_removed_are_skipped(monkeypatch):
+    client = FakeService(missing=['Blockade-Add-User'])
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: client)
+    responses = aws_serverless.remove_lambda_functions()
+    assert sorted(client.deleted) == sorted(
+        x for x in aws_serverless.LAMBDA_FUNCTIONS
+        if x != 'Blockade-Add-User')
+    assert len(responses) == len(aws_serverless.LAMBDA_FUNCTIONS) - 1
+
+
+class FakeAccount(FakeS3):
+
+    """S3 client of an account holding a Blockade bucket."""
+
+    bucket = aws_serverless.S3_BUCKET_NAME + '-1234567890'
+
+    def __init__(self, count):
+        super(FakeAccount, self).__init__(count)
+        self.calls = list()
+
+    def list_buckets(self):
+        return {'Buckets': [{'Name': 'other'}, {'Name': self.bucket}]}
+
+    def delete_bucket(self, Bucket):
+        self.calls.append(('delete_bucket', Bucket))
+        return {'deleted': Bucket}
+
+    def get_waiter(self, name):
+        waiter = type('Waiter', (object,), dict())()
+        waiter.wait = lambda Bucket: self.calls.append((name, Bucket))
+        return waiter
+
+
+def test_bucket_is_emptied_then_deleted(monkeypatch):
+    client = FakeAccount(1200)
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: client)
+    assert aws_serverless.remove_s3_bucket(workers=2) == \
+        {'deleted': client.bucket}
+    assert sum(len(x) for x in client.requests) == 1200
+    assert client.calls == [('delete_bucket', client.bucket),
+                            ('bucket_not_exists', client.bucket)]
+
+
+def test_teardown_removes_iam_last_and_reports_failures(monkeypatch):
+    lock = threading.Lock()
+    state = {'running': 0, 'concurrency': 0, 'finished': list()}
+
+    def step(label, fail=False):
+        def remove(*args):
+            with lock:
+                state['running'] += 1
+                state['concurrency'] = max(state['concurrency'],
+                                           state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+                state['finished'].append(label)
+            if fail:
+                raise Exception('%s is busy' % label)
+        return remove
+
+    def remove_handler():
+        assert len(state['finished']) == 4
+        state['finished'].append('IAM')
+
+    monkeypatch.setattr(aws_serverless, 'remove_s3_bucket', step('S3'))
+    monkeypatch.setattr(aws_serverless, 'remove_dynamodb_tables',
+                        step('DynamoDB', fail=True))
+    monkeypatch.setattr(aws_serverless, 'remove_lambda_functions',
+                        step('Lambda'))
+    monkeypatch.setattr(aws_serverless, 'remove_api_gateway',
+                        step('API Gateway'))
+    monkeypatch.setattr(aws_serverless, 'remove_handler', remove_handler)
+
+    steps = aws_serverless.teardown()
+    assert [x[0] for x in steps] == ['S3 bucket', 'DynamoDB tables',
+                                     'Lambda functions', 'API Gateway',
+                                     'IAM']
+    assert state['finished'][-1] == 'IAM'
+    assert state['concurrency'] > 1
+    errors = dict((label, error) for label, _, error in steps)
+    assert errors['DynamoDB tables'] == 'DynamoDB is busy'
+    assert [x for x in errors if errors[x]] == ['DynamoDB tables']
+    assert all(seconds >= 0 for _, seconds, _ in steps)
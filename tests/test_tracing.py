@@ -0,0 +1,62 @@
+"""Tests of the request tracing hooks."""
+import json
+
+from blockade.common.tracing import LatencySampler, RequestHook, RequestTrace
+
+
+class Recorder(RequestHook):
+
+    """Hook keeping what it saw of every request."""
+
+    def __init__(self):
+        self.seen = list()
+
+    def before_request(self, trace):
+        trace.context['started'] = True
+        self.seen.append(('before', trace.endpoint, trace.status))
+
+    def after_response(self, trace):
+        assert trace.context['started']
+        self.seen.append(('after', trace.endpoint, trace.status))
+
+
+def trace(endpoint, latency, status=200):
+    result = RequestTrace('POST', endpoint, 100)
+    result.latency, result.status, result.bytes_received = latency, status, 10
+    return result
+
+
+def test_hooks_see_every_request(node, make_client):
+    hook = Recorder()
+    client = make_client(node, batch_size=10, hooks=[hook])
+    client.add_indicators(['evil%d.example.com' % x for x in range(15)])
+    assert hook.seen == [('before', 'admin/add-indicators', None),
+                         ('after', 'admin/add-indicators', 200)] * 2
+
+
+def test_sampler_profiles_the_slowest_endpoint_first(tmpdir):
+    sampler = LatencySampler()
+    for idx in range(10):
+        sampler.after_response(trace('get-indicators', 0.01 * (idx + 1)))
+    sampler.after_response(trace('admin/add-indicators', 2.0, 502))
+    profile = sampler.profile()
+    assert [x['endpoint'] for x in profile] == ['admin/add-indicators',
+                                               'get-indicators']
+    assert profile[0]['errors'] == 1
+    assert profile[1]['count'] == 10
+    assert profile[1]['max'] == 0.1
+    assert profile[1]['bytes_sent'] == 1000
+
+    path = sampler.write(str(tmpdir.join('profile.json')))
+    with open(path) as handle:
+        assert json.load(handle) == profile
+
+
+def test_sampler_skips_unsampled_requests(monkeypatch):
+    sampler = LatencySampler(sample_rate=0.5)
+    values = iter([0.2, 0.7, 0.4])
+    monkeypatch.setattr('blockade.common.tracing.random.random',
+                        lambda: next(values))
+    for _ in range(3):
+        sampler.after_response(trace('get-indicators', 0.1))
+    assert sampler.profile()[0]['count'] == 2
@@ -0,0 +1,74 @@
+"""Tests of the expiry of indicators and events on the node."""
+import json
+import time
+
+import pytest
+
+DAY = 86400
+
+
+def set_node_ttl(emulator, monkeypatch, route, days):
+    module = emulator.routes[route]['module']
+    monkeypatch.setitem(module.os.environ, 'ttl_days', str(days))
+
+
+def expiry_days(emulator, table):
+    """Days left before every item of a table expires, None if it never."""
+    now = time.time()
+    return sorted(set(
+        round((x[1]['expires'] - now) / DAY) if 'expires' in x[1] else None
+        for x in emulator.store.table(table).items.items()))
+
+
+@pytest.mark.parametrize('node_days, requested, expected', [
+    (30, None, 30),
+    (30, 5, 5),
+    (30, 365, 30),
+    (30, 0, 30),
+    (0, 5, 5),
+    (0, None, None),
+])
+def test_requests_only_shorten_the_indicator_ttl(node, make_client,
+                                                 monkeypatch, node_days,
+                                                 requested, expected):
+    set_node_ttl(node, monkeypatch, 'admin/add-indicators', node_days)
+    client = make_client(node)
+    client.add_indicators(['evil.example.com'], ttl_days=requested)
+    assert expiry_days(node, 'blockade_indicators') == [expected]
+
+
+def test_requests_only_shorten_the_event_ttl(node, monkeypatch):
+    set_node_ttl(node, monkeypatch, 'send-events', 10)
+    for requested in (100, 3):
+        event = {'indicatorMatch': 'evil%d.com' % requested,
+                 'analysisValue': 'evil%d.com' % requested,
+                 'analysisTime': '2024-05-01T10:00:00',
+                 'metadata': {'timeStamp': 1500000000000, 'type': 'main_frame',
+                              'method': 'GET'}}
+        body = {'events': [event], 'ttlDays': requested}
+        status, response = node.invoke('POST', 'send-events',
+                                       json.dumps(body))
+        assert response['success']
+    assert expiry_days(node, 'blockade_events') == [3, 10]
+
+
+def test_expired_indicators_are_hidden(node, make_client):
+    table = node.store.table('blockade_indicators')
+    for idx, expires in enumerate([time.time() - 60, time.time() + 60]):
+        table.put_item(Item={'indicator': '%032x' % idx,
+                             'creator': 'admin@example.com',
+                             'expires': int(expires)})
+    client = make_client(node)
+    assert client.get_indicators()['indicators'] == ['%032x' % 1]
+    result = client.check_indicators(['%032x' % 0, '%032x' % 1])
+    assert result['missing'] == ['%032x' % 0]
+
+
+def test_cache_keeps_the_expiry_set_by_the_node(node, make_client,
+                                                monkeypatch):
+    set_node_ttl(node, monkeypatch, 'admin/add-indicators', 2)
+    client = make_client(node)
+    client.add_indicators(['evil.example.com'])
+    expiry = list(client.cache.expiry.values())
+    assert len(expiry) == 1
+    assert abs(expiry[0] - time.time() - 2 * DAY) < 60
@@ -0,0 +1,53 @@
+"""Tests of the hashing helpers."""
+import binascii
+import hashlib
+
+import pytest
+
+from blockade.common.utils import digest_values, hash_values
+
+VALUES = ['evil.example.com', u'évil.example.com', b'bytes.example.com']
+
+
+def reference(alg, value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return getattr(hashlib, alg)(value).hexdigest()
+
+
+def test_every_algorithm_in_one_pass():
+    output = digest_values(VALUES, ['md5', 'sha1', 'sha256'])
+    for alg in ('md5', 'sha1', 'sha256'):
+        assert output[alg] == [reference(alg, x) for x in VALUES]
+
+
+def test_binary_digests():
+    output = digest_values(VALUES, 'sha256', binary=True)
+    assert [binascii.hexlify(x).decode('ascii')
+            for x in output['sha256']] == [reference('sha256', x)
+                                           for x in VALUES]
+
+
+def test_hashed_values_are_kept_as_their_md5():
+    known = 'D41D8CD98F00B204E9800998ECF8427E'
+    output = digest_values([known, 'evil.example.com'], ['md5', 'sha1'],
+                           keep_hashed=True)
+    assert output['md5'] == [known.lower(),
+                             reference('md5', 'evil.example.com')]
+    # Other algorithms hash the value itself
+    assert output['sha1'][0] == reference('sha1', known)
+    binary = digest_values([known], binary=True, keep_hashed=True)
+    assert binary['md5'] == [binascii.unhexlify(known)]
+    assert digest_values([known])['md5'] == [reference('md5', known)]
+
+
+def test_hash_values_keeps_its_interface():
+    assert hash_values('evil.example.com') == \
+        reference('md5', 'evil.example.com')
+    assert hash_values(VALUES[:2], 'sha1') == [reference('sha1', x)
+                                               for x in VALUES[:2]]
+
+
+def test_unknown_algorithm_is_rejected():
+    with pytest.raises(Exception):
+        digest_values(VALUES, 'crc32')